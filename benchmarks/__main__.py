@@ -0,0 +1,383 @@
+"""Concurrent load test against a fake CHUNITHM-NET.
+
+Simulates users running the bot's CHUNITHM-NET backed commands against
+`benchmarks.fake_chunithm_net`, through the same rate limiter and request
+coalescing as the bot, and reports throughput, latency percentiles and peak
+memory usage:
+
+    python -m benchmarks --users 50 --duration 30 --max-latency 0.2
+
+By default, users drive bare ChuniNet clients the way each command would.
+With `--cogs`, they invoke the commands themselves on a bot that is not
+connected to Discord (see `benchmarks.commands`), so that record hydration,
+the page cache, rating engines and rendering replies are measured too:
+
+    python -m benchmarks --cogs --users 50 --duration 30
+"""
+import argparse
+import asyncio
+import contextlib
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from http.cookiejar import LWPCookieJar
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from chunithm_net import ChuniNet
+from chunithm_net.limiter import Priority, RateLimiter, set_default_limiter
+from chunithm_net.models.record import PlaylogMarker
+
+from .commands import BENCHMARK_USER_ID, BenchmarkContext, benchmark_bot
+from .fake_chunithm_net import (
+    FakeChuniNet,
+    FakeChuniNetOptions,
+    RewritingTransport,
+    clal_cookie_jar,
+)
+
+if TYPE_CHECKING:
+    from bot import ChuniBot
+
+
+@dataclass
+class SimulatedUser:
+    id: int
+    jar: LWPCookieJar
+    # Kamaitachi sync state, see `Cookie.kamaitachi_marker`.
+    marker: Optional[PlaylogMarker] = None
+
+
+@dataclass
+class Results:
+    # key: scenario name
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    # key: (scenario name, exception type)
+    errors: dict[tuple[str, str], int] = field(default_factory=lambda: defaultdict(int))
+
+
+# (name, weight, scenario)
+Scenario = tuple[str, int, Callable[[SimulatedUser], Awaitable[object]]]
+
+
+# Scenarios mirror what the bot does with a ChuniNet client for each command.
+async def scenario_best30(client: ChuniNet, user: SimulatedUser) -> None:
+    await client.best30()
+
+
+async def scenario_recent10(client: ChuniNet, user: SimulatedUser) -> None:
+    await client.recent10()
+
+
+async def scenario_profile(client: ChuniNet, user: SimulatedUser) -> None:
+    await client.player_data()
+
+
+async def scenario_recent(client: ChuniNet, user: SimulatedUser) -> None:
+    records = await client.recent_record()
+    if len(records) > 0:
+        await client.detailed_recent_record(records[0])
+
+
+async def scenario_scores(client: ChuniNet, user: SimulatedUser) -> None:
+    await client.music_record(random.randint(0, 3000))
+
+
+async def scenario_kamaitachi_sync(client: ChuniNet, user: SimulatedUser) -> None:
+    _, user.marker = await client.recent_record_since(user.marker)
+
+
+# (name, weight, scenario, priority)
+CLIENT_SCENARIOS: list[
+    tuple[str, int, Callable[[ChuniNet, SimulatedUser], Awaitable[None]], Priority]
+] = [
+    ("best30", 30, scenario_best30, Priority.INTERACTIVE),
+    ("recent10", 10, scenario_recent10, Priority.INTERACTIVE),
+    ("profile", 20, scenario_profile, Priority.INTERACTIVE),
+    ("recent", 25, scenario_recent, Priority.INTERACTIVE),
+    ("scores", 10, scenario_scores, Priority.INTERACTIVE),
+    ("kamaitachi_sync", 5, scenario_kamaitachi_sync, Priority.BULK),
+]
+
+
+def client_scenarios(server: FakeChuniNet) -> list[Scenario]:
+    def with_client(
+        scenario: Callable[[ChuniNet, SimulatedUser], Awaitable[None]],
+        priority: Priority,
+    ):
+        async def run(user: SimulatedUser):
+            async with ChuniNet(
+                user.jar,
+                priority=priority,
+                user_key=user.id,
+                transport=RewritingTransport(server.url),
+            ) as client:
+                await scenario(client, user)
+
+        return run
+
+    return [
+        (name, weight, with_client(scenario, priority))
+        for name, weight, scenario, priority in CLIENT_SCENARIOS
+    ]
+
+
+def cog_scenarios(bot: "ChuniBot", titles: list[str]) -> list[Scenario]:
+    """The same mix as `CLIENT_SCENARIOS`, through the bot's commands."""
+    from cogs.botutils import UtilsCog
+
+    utils = bot.get_cog("Utils")
+    assert isinstance(utils, UtilsCog)
+
+    def invoke(command_name: str, *args, flags: Optional[str] = None, **kwargs):
+        command = bot.get_command(command_name)
+        assert command is not None
+
+        async def run(user: SimulatedUser):
+            ctx = BenchmarkContext(bot, user.id)
+            ctx.command = command
+            if flags is not None:
+                # Parsed like the end of a prefix command's message.
+                converter = command.clean_params["flags"].converter
+                await command(
+                    ctx, *args, **kwargs, flags=await converter.convert(ctx, flags)
+                )
+            else:
+                # What `ctx.invoke` does.
+                await command(ctx, *args, **kwargs)
+            return ctx.replies
+
+        return run
+
+    async def recent(user: SimulatedUser):
+        replies = await invoke("recent")(user)
+        view = replies[0]["view"]
+
+        try:
+            return await view.get_detailed_record(0)
+        finally:
+            await view.on_timeout()
+
+    async def kamaitachi_sync(user: SimulatedUser):
+        # Kamaitachi itself is out of scope, but its sync feeds the rating engine.
+        async with utils.chuninet(user.id, priority=Priority.BULK) as client:
+            playlog = await client.recent_record()
+        await utils.sync_rating(user.id, playlog)
+
+    return [
+        ("best30", 30, invoke("best30", flags="")),
+        ("recent10", 10, invoke("recent10")),
+        ("profile", 20, invoke("chunithm")),
+        ("recent", 25, recent),
+        # Fixture songs are first in the catalog, so they have records to hydrate.
+        ("scores", 10, invoke("scores", None, query=titles[0])),
+        ("kamaitachi_sync", 5, kamaitachi_sync),
+    ]
+
+
+async def run_user(
+    user: SimulatedUser,
+    scenarios: list[Scenario],
+    results: Results,
+    *,
+    deadline: float,
+    think_time: float,
+) -> None:
+    weights = [x[1] for x in scenarios]
+
+    while time.perf_counter() < deadline:
+        name, _, scenario = random.choices(scenarios, weights)[0]
+
+        start = time.perf_counter()
+        try:
+            await scenario(user)
+        except Exception as e:  # noqa: BLE001
+            results.errors[(name, type(e).__name__)] += 1
+        else:
+            results.latencies[name].append(time.perf_counter() - start)
+
+        if think_time > 0:
+            await asyncio.sleep(random.uniform(0, think_time))
+
+
+def _percentile(values: list[float], p: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def _peak_rss_mib() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def report(
+    results: Results, scenarios: list[Scenario], elapsed: float, server: FakeChuniNet
+) -> None:
+    rows = [("scenario", "count", "rps", "p50 ms", "p99 ms", "max ms")]
+    everything = []
+
+    for name, *_ in scenarios:
+        latencies = results.latencies.get(name, [])
+        everything.extend(latencies)
+
+        if len(latencies) == 0:
+            rows.append((name, "0", "-", "-", "-", "-"))
+            continue
+
+        rows.append(
+            (
+                name,
+                str(len(latencies)),
+                f"{len(latencies) / elapsed:.1f}",
+                f"{_percentile(latencies, 50) * 1000:.1f}",
+                f"{_percentile(latencies, 99) * 1000:.1f}",
+                f"{max(latencies) * 1000:.1f}",
+            )
+        )
+
+    if len(everything) > 0:
+        rows.append(
+            (
+                "total",
+                str(len(everything)),
+                f"{len(everything) / elapsed:.1f}",
+                f"{_percentile(everything, 50) * 1000:.1f}",
+                f"{_percentile(everything, 99) * 1000:.1f}",
+                f"{max(everything) * 1000:.1f}",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    ]
+
+    lines.append("")
+    lines.append(f"Elapsed: {elapsed:.1f}s")
+    lines.append(f"Upstream requests: {server.requests}")
+
+    for (name, error), count in sorted(results.errors.items()):
+        lines.append(f"Errors ({name}, {error}): {count}")
+
+    if (rss := _peak_rss_mib()) is not None:
+        lines.append(f"Peak RSS: {rss:.1f} MiB")
+
+    print("\n".join(lines))
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Load tests the CHUNITHM-NET client against a fake server."
+    )
+    parser.add_argument("--users", type=int, default=20, help="Concurrent users")
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Test duration, in seconds"
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="Maximum time each user waits between commands, in seconds",
+    )
+    parser.add_argument("--min-latency", type=float, default=0.0)
+    parser.add_argument("--max-latency", type=float, default=0.0)
+    parser.add_argument("--session-expiry-rate", type=float, default=0.0)
+    parser.add_argument("--maintenance-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Rate limit for upstream requests per second. Unlimited by default.",
+    )
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--cogs",
+        action="store_true",
+        help="Invoke the bot's commands instead of driving ChuniNet clients",
+    )
+    parser.add_argument(
+        "--songs",
+        type=int,
+        default=1500,
+        help="Number of songs in the catalog, with --cogs",
+    )
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.rate is not None:
+        set_default_limiter(RateLimiter(rate=args.rate, burst=args.burst))
+    else:
+        set_default_limiter(RateLimiter(rate=1_000_000, burst=1_000_000))
+
+    options = FakeChuniNetOptions(
+        min_latency=args.min_latency,
+        max_latency=args.max_latency,
+        session_expiry_rate=args.session_expiry_rate,
+        maintenance_rate=args.maintenance_rate,
+    )
+    users = [
+        SimulatedUser(id=BENCHMARK_USER_ID + i, jar=clal_cookie_jar())
+        for i in range(args.users)
+    ]
+    results = Results()
+
+    async with contextlib.AsyncExitStack() as stack:
+        if args.cogs:
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            bot, titles, server = await stack.enter_async_context(
+                benchmark_bot(
+                    Path(directory),
+                    songs=args.songs,
+                    rng=random.Random(args.seed),
+                    user_ids=[user.id for user in users],
+                    options=options,
+                )
+            )
+            scenarios = cog_scenarios(bot, titles)
+        else:
+            server = await stack.enter_async_context(FakeChuniNet(options))
+            scenarios = client_scenarios(server)
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+
+        await asyncio.gather(
+            *[
+                run_user(
+                    user,
+                    scenarios,
+                    results,
+                    deadline=deadline,
+                    think_time=args.think_time,
+                )
+                for user in users
+            ]
+        )
+
+        elapsed = time.perf_counter() - start
+
+    report(results, scenarios, elapsed, server)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
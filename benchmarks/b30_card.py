@@ -0,0 +1,114 @@
+"""Benchmark for the b30 image card renderer.
+
+Renders a card with 30 best and 10 recent scores and synthetic jackets, and
+checks it against the 150 ms target:
+
+    python -m benchmarks.b30_card --iterations 50
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from PIL import Image
+
+from chunithm_net.consts import KEY_INTERNAL_LEVEL, KEY_PLAY_RATING
+from chunithm_net.models.enums import ClearType, ComboType, Difficulty, Rank
+from chunithm_net.models.record import Record
+from utils.b30_card import AssetCache, jacket_key, render_b30_card
+
+TARGET = 0.150
+
+
+def make_records(rng: random.Random, count: int) -> list[Record]:
+    records = []
+
+    for i in range(count):
+        score = rng.randint(990_000, 1_010_000)
+        record = Record(
+            title=f"Song {i} {'ウソラセラ' * rng.randint(1, 4)}",
+            difficulty=rng.choice(
+                [Difficulty.EXPERT, Difficulty.MASTER, Difficulty.ULTIMA]
+            ),
+            score=score,
+            rank=Rank.from_score(score),
+            clear_lamp=rng.choice(list(ClearType)),
+            combo_lamp=rng.choice(list(ComboType)),
+            jacket=f"https://chunithm-net-eng.com/mobile/img/{i}.jpg",
+        )
+        record.extras[KEY_INTERNAL_LEVEL] = rng.choice([14.5, 14.8, 15.0, 15.4])
+        record.extras[KEY_PLAY_RATING] = Decimal(rng.randint(1600, 1760)) / 100
+        records.append(record)
+
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the b30 image card.")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--font", type=Path, default=None, help="Font to render with, like the bot"
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Save the card here")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = make_records(rng, 40)
+
+    with tempfile.TemporaryDirectory() as directory:
+        assets = AssetCache(Path(directory), font=args.font)
+        assets.jacket_directory.mkdir()
+
+        for record in records:
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new("RGB", (300, 300), color).save(
+                assets.jacket_directory / str(jacket_key(record.jacket))
+            )
+
+        # Includes reading jackets from disk and rasterizing glyphs, which
+        # later cards mostly get from memory.
+        start = time.perf_counter()
+        jackets = assets.load_jackets(jacket_key(r.jacket) for r in records)
+        fonts = assets.fonts()
+        card = render_b30_card(
+            records[:30], records[30:], title="Benchmark", jackets=jackets, fonts=fonts
+        )
+        cold = time.perf_counter() - start
+
+        timings = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            jackets = assets.load_jackets(jacket_key(r.jacket) for r in records)
+            card = render_b30_card(
+                records[:30],
+                records[30:],
+                title="Benchmark",
+                jackets=jackets,
+                fonts=fonts,
+            )
+            timings.append(time.perf_counter() - start)
+
+    if args.output is not None:
+        args.output.write_bytes(card)
+
+    p50 = statistics.median(timings)
+    lines = [
+        f"Cold: {cold * 1000:.1f} ms",
+        f"p50: {p50 * 1000:.1f} ms",
+        f"max: {max(timings) * 1000:.1f} ms",
+        f"Size: {len(card) / 1024:.0f} KiB",
+        f"Target: {TARGET * 1000:.0f} ms ({'met' if p50 <= TARGET else 'missed'})",
+    ]
+    print("\n".join(lines))
+
+    if p50 > TARGET:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
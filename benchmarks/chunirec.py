@@ -0,0 +1,202 @@
+"""Benchmark for matching songs in the chunirec importer.
+
+Builds synthetic chunirec, CHUNITHM, maimai and zetaraku song lists about the
+size of the real ones, and times `dbutils.chunirec.match_songs` on them:
+
+    python -m benchmarks.chunirec --songs 2000 --iterations 5
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .commands import WORDS, write_config
+
+if TYPE_CHECKING:
+    from dbutils.chunirec import (
+        ChunirecData,
+        ChunirecDifficulty,
+        ChunirecSong,
+        ZetarakuChunithmData,
+        ZetarakuSong,
+    )
+
+CATEGORIES = [
+    "POPS & ANIME",
+    "niconico",
+    "東方Project",
+    "VARIETY",
+    "イロドリミドリ",
+    "ゲキマイ",
+    "ORIGINAL",
+]
+WE_KANJI = ["狂", "招", "嘘", "弾", "改", "蔵", "光", "覚", "戻", "割"]
+
+
+def _chart(rng: random.Random, level: float) -> "ChunirecDifficulty":
+    return {
+        "level": level,
+        "const": level + rng.choice([0, 0.1, 0.2, 0.3, 0.4]),
+        "maxcombo": rng.randrange(300, 4000),
+        "is_const_unknown": 0,
+    }
+
+
+def make_sources(
+    rng: random.Random, count: int
+) -> tuple[
+    "list[ChunirecSong]",
+    list[dict[str, str]],
+    list[dict[str, str]],
+    "ZetarakuChunithmData",
+]:
+    """Returns (chunirec songs, CHUNITHM songs, maimai songs, zetaraku data),
+    where most songs appear in every source, some with titles written
+    differently, like the real ones."""
+    songs: "list[ChunirecSong]" = []
+    chuni_songs: list[dict[str, str]] = []
+    maimai_songs: list[dict[str, str]] = []
+    zetaraku_songs: "list[ZetarakuSong]" = []
+
+    for i in range(count):
+        title = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+        if rng.random() < 0.2:
+            title += "　“Remix”"
+        artist = f"{rng.choice(WORDS)} feat. {rng.choice(WORDS)}"
+        category = rng.choice(CATEGORIES)
+        image = f"{rng.getrandbits(64):016x}.jpg"
+
+        we = rng.random() < 0.08
+        we_kanji = rng.choice(WE_KANJI) if we else ""
+
+        chuni_songs.append(
+            {
+                "id": str(i if not we else 8000 + i),
+                "catname": category,
+                "title": title.replace("“", '"').replace("”", '"'),
+                "artist": artist,
+                "we_kanji": we_kanji,
+                "we_star": str(rng.randrange(1, 10, 2)) if we else "",
+                "image": image,
+            }
+        )
+
+        data: "ChunirecData"
+        if we:
+            data = {
+                "WE": {
+                    "level": 0,
+                    "const": 0,
+                    "maxcombo": rng.randrange(300, 4000),
+                    "is_const_unknown": 1,
+                }
+            }
+        else:
+            data = {
+                "BAS": _chart(rng, 3.0),
+                "ADV": _chart(rng, 7.0),
+                "EXP": _chart(rng, 11.0),
+                "MAS": _chart(rng, 13.5),
+            }
+
+        songs.append(
+            {
+                "meta": {
+                    "id": f"{rng.getrandbits(64):016x}",
+                    "title": f"{title}【{we_kanji}】" if we else title,
+                    "genre": category,
+                    "artist": artist,
+                    "release": "2023-05-11",
+                    "bpm": rng.randrange(120, 240),
+                },
+                "data": data,
+            }
+        )
+
+        if not we:
+            zetaraku_songs.append(
+                {
+                    "title": title,
+                    "category": category,
+                    "imageName": image,
+                    "version": "SUN",
+                    "bpm": None,
+                    "sheets": [
+                        {
+                            "difficulty": difficulty,
+                            "level": "13+",
+                            "levelValue": 13.5,
+                            "internalLevel": None,
+                            "internalLevelValue": 13.5,
+                            "noteDesigner": "-",
+                            "noteCounts": {
+                                "tap": 500,
+                                "hold": 100,
+                                "slide": 100,
+                                "air": 50,
+                                "flick": None,
+                                "total": 750,
+                            },
+                            "regions": {"jp": True, "intl": True},
+                        }
+                        for difficulty in ("basic", "advanced", "expert", "master")
+                    ],
+                }
+            )
+
+        if rng.random() < 0.1:
+            maimai_songs.append({"title": title, "image_url": image})
+
+    # Real lists aren't in the same order.
+    rng.shuffle(chuni_songs)
+    rng.shuffle(zetaraku_songs)
+
+    return songs, chuni_songs, maimai_songs, {"songs": zetaraku_songs}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks song matching in the chunirec importer."
+    )
+    parser.add_argument("--songs", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.iterations < 1:
+        parser.error("--iterations must be at least 1")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # dbutils reads the configuration on import.
+        os.environ["CHUNINEWBOT_CONFIG"] = str(write_config(Path(directory)))
+
+        from dbutils.chunirec import match_songs
+
+    logger = logging.getLogger("chuninewbot.benchmarks.chunirec")
+    logger.disabled = True
+
+    sources = make_sources(random.Random(args.seed), args.songs)
+
+    matched = 0
+    timings = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        inserted_songs, _, _ = match_songs(logger, *sources)
+        timings.append(time.perf_counter() - start)
+        matched = len(inserted_songs)
+
+    lines = [
+        f"Matched: {matched}/{args.songs}",
+        f"p50: {statistics.median(timings) * 1000:.1f} ms",
+        f"max: {max(timings) * 1000:.1f} ms",
+    ]
+    print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""Offline end-to-end command benchmarks.
+
+Builds a `ChuniBot` against a throwaway SQLite database seeded with a
+synthetic song catalog, points its CHUNITHM-NET clients at the fake
+CHUNITHM-NET, and invokes command callbacks with a stub context that records
+replies instead of sending them. Nothing talks to Discord or the internet.
+
+Wall time is measured over `--iterations` runs of each command, and
+allocations over one extra run with tracemalloc enabled (tracemalloc slows
+everything down, so it is kept out of the timed runs):
+
+    python -m benchmarks.commands --iterations 50 --songs 1500
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Optional
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from chunithm_net.consts import KEY_SONG_ID
+from chunithm_net.parser import parse_html, parse_music_for_rating
+
+from .fake_chunithm_net import (
+    ASSETS_DIR,
+    FakeChuniNet,
+    FakeChuniNetOptions,
+    RewritingTransport,
+    clal_cookie_jar,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from bot import ChuniBot
+
+BENCHMARK_USER_ID = 1
+
+GENRES = [
+    "POPS & ANIME",
+    "niconico",
+    "東方Project",
+    "VARIETY",
+    "イロドリミドリ",
+    "ゲキマイ",
+    "ORIGINAL",
+]
+WORDS = [
+    "Aether", "Blaze", "Crystal", "Dawn", "Echo", "Flare", "Gravity", "Halo",
+    "Infinity", "Jade", "Karma", "Lumina", "Mirage", "Nova", "Orbit", "Prism",
+    "Quasar", "Radiance", "Spectrum", "Tempest", "Umbra", "Vortex", "Wish",
+    "Xenon", "Yearning", "Zenith",
+]  # fmt: skip
+# (difficulty, lowest constant, highest constant)
+CHART_RANGES = [
+    ("BAS", 1.0, 3.0),
+    ("ADV", 4.0, 8.5),
+    ("EXP", 7.0, 12.9),
+    ("MAS", 10.0, 15.2),
+]
+
+
+def _level(const: float) -> str:
+    return f"{int(const)}+" if const % 1 >= 0.5 else str(int(const))
+
+
+def _fixture_songs() -> dict[int, str]:
+    """Songs that appear in the fake CHUNITHM-NET's pages, so that records
+    served by it can be hydrated."""
+    songs = {}
+
+    for name in ("best30", "recent10", "music_record_by_level_folder"):
+        soup = parse_html((ASSETS_DIR / f"{name}.html").read_text(encoding="utf-8"))
+
+        for record in parse_music_for_rating(soup):
+            songs[record.extras[KEY_SONG_ID]] = record.title
+
+    return songs
+
+
+async def seed_catalog(
+    session: "AsyncSession", *, songs: int, rng: random.Random
+) -> list[str]:
+    """Fills the database with songs, charts and aliases.
+
+    Returns the titles of the songs that were added.
+    """
+    from database.models import Alias, Chart, Song
+
+    catalog = _fixture_songs()
+    titles = (
+        f"{a} {b}" if i == 0 else f"{a} {b} {i + 1}"
+        for i in itertools.count()
+        for a, b in itertools.permutations(WORDS, 2)
+    )
+    id = 3000
+    # Aliases are unique per guild.
+    aliases = set()
+
+    while len(catalog) < songs:
+        id += 1
+        catalog[id] = next(titles)
+
+    for id, title in catalog.items():
+        song = Song(
+            id=id,
+            title=title,
+            chunithm_catcode=rng.randrange(len(GENRES)),
+            genre=rng.choice(GENRES),
+            artist=f"{rng.choice(WORDS)} feat. {rng.choice(WORDS)}",
+            version="CHUNITHM SUN",
+            release="2023-05-11",
+            bpm=rng.randrange(120, 240),
+            jacket=f"{id:016x}.jpg",
+            available=True,
+            removed=False,
+        )
+
+        for difficulty, low, high in CHART_RANGES:
+            const = round(rng.uniform(low, high), 1)
+            song.charts.append(
+                Chart(
+                    difficulty=difficulty,
+                    level=_level(const),
+                    const=const,
+                    maxcombo=rng.randrange(300, 4000),
+                )
+            )
+
+        if rng.random() < 0.1:
+            const = round(rng.uniform(14.0, 15.4), 1)
+            song.charts.append(
+                Chart(difficulty="ULT", level=_level(const), const=const)
+            )
+
+        words = title.split()
+        for alias in ("".join(w[0] for w in words).lower(), words[0].lower()):
+            if alias not in aliases:
+                aliases.add(alias)
+                song.aliases.append(Alias(alias=alias, guild_id=-1))
+
+        session.add(song)
+
+    await session.commit()
+
+    return list(catalog.values())
+
+
+class _RecordedMessage:
+    def __init__(self, ctx: "BenchmarkContext", **kwargs) -> None:
+        self.ctx = ctx
+        self.id = next(ctx._message_ids)
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.ctx._record(kwargs)
+        self.kwargs.update(kwargs)
+        return self
+
+    async def delete(self, **_):
+        pass
+
+
+class BenchmarkContext(commands.Context):
+    """A context for a DM from a user that records replies."""
+
+    def __init__(self, bot: "ChuniBot", user_id: int = BENCHMARK_USER_ID) -> None:
+        author = SimpleNamespace(
+            id=user_id,
+            name="benchmark",
+            display_name="benchmark",
+            mention=f"<@{user_id}>",
+            bot=False,
+        )
+        message = SimpleNamespace(
+            id=0,
+            author=author,
+            guild=None,
+            channel=SimpleNamespace(id=0, type=None),
+            content="",
+            _state=bot._connection,
+        )
+
+        super().__init__(
+            message=message,  # type: ignore[reportArgumentType]
+            bot=bot,
+            view=StringView(""),
+            prefix="c>",
+        )
+
+        self.replies: list[dict[str, Any]] = []
+        self._message_ids = itertools.count(1)
+
+    def _record(self, kwargs: dict[str, Any]) -> None:
+        self.replies.append(kwargs)
+
+        # Views would otherwise keep timeout tasks around between runs.
+        if (view := kwargs.get("view")) is not None:
+            view.stop()
+
+    def typing(self, *, ephemeral: bool = False):  # type: ignore[reportIncompatibleMethodOverride]
+        return contextlib.nullcontext()
+
+    async def send(self, content=None, **kwargs):  # type: ignore[reportIncompatibleMethodOverride]
+        kwargs["content"] = content
+        self._record(kwargs)
+        return _RecordedMessage(self, **kwargs)
+
+    async def reply(self, content=None, **kwargs):  # type: ignore[reportIncompatibleMethodOverride]
+        return await self.send(content, **kwargs)
+
+
+@dataclass
+class CommandResult:
+    name: str
+    durations: list[float] = field(default_factory=list)
+    errors: int = 0
+    last_error: Optional[BaseException] = None
+    # Bytes allocated at the peak of a run, and still allocated after it.
+    peak_allocated: Optional[int] = None
+    retained: Optional[int] = None
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+
+
+def command_benchmarks(
+    bot: "ChuniBot", titles: list[str], rng: random.Random
+) -> list[Benchmark]:
+    def invoke(command_name: str, *args, flags: Optional[str] = None, **kwargs):
+        async def run():
+            command = bot.get_command(command_name)
+            assert command is not None
+
+            ctx = BenchmarkContext(bot)
+            ctx.command = command
+            if flags is not None:
+                # Parsed like the end of a prefix command's message.
+                converter = command.clean_params["flags"].converter
+                await command(
+                    ctx, *args, **kwargs, flags=await converter.convert(ctx, flags)
+                )
+            else:
+                # What `ctx.invoke` does.
+                await command(ctx, *args, **kwargs)
+            return ctx.replies
+
+        return run
+
+    autocompleters = bot.get_cog("Autocompleters")
+    assert autocompleters is not None
+    interaction = SimpleNamespace(
+        guild=None, user=SimpleNamespace(id=BENCHMARK_USER_ID)
+    )
+
+    async def autocomplete():
+        title = rng.choice(titles)
+        start = rng.randrange(max(1, len(title) - 5))
+        return await autocompleters.song_title_autocomplete(  # type: ignore[reportAttributeAccessIssue]
+            interaction, title[start : start + 5]
+        )
+
+    async def recent_select():
+        replies = await invoke("recent")()
+        view = replies[0]["view"]
+
+        try:
+            # What a dropdown selection waits on, as soon as the list is sent.
+            return await view.get_detailed_record(0)
+        finally:
+            await view.on_timeout()
+
+    # Fixture songs are first, and `scores` needs a song that exists on the
+    # fake CHUNITHM-NET to have something to hydrate.
+    scores_title = titles[0]
+
+    return [
+        Benchmark("find", invoke("find", "14")),
+        Benchmark("find (constant)", invoke("find", "14.5")),
+        Benchmark("random", invoke("random", "14+", 4)),
+        Benchmark("scores", invoke("scores", None, query=scores_title)),
+        Benchmark("top", invoke("top", query="14")),
+        Benchmark("best30", invoke("best30", flags="")),
+        Benchmark("best30 (image)", invoke("best30", flags="image: yes recent: yes")),
+        Benchmark("recent (select)", recent_select),
+        Benchmark("autocomplete", autocomplete),
+    ]
+
+
+def write_config(directory: Path) -> Path:
+    path = directory / "bot.ini"
+    path.write_text(
+        "\n".join(
+            [
+                "[bot]",
+                f"db_connection_string = sqlite+aiosqlite:///{directory / 'database.sqlite3'}",
+                "slow_query_threshold = 1000",
+                "[web]",
+                "[credentials]",
+                "[icons]",
+                "[legal]",
+                "[ratelimit]",
+                "rate = 1000000",
+                "burst = 1000000",
+                "[rendering]",
+                f"asset_dir = {directory / 'assets'}",
+                "[dangerous]",
+                "",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+@contextlib.asynccontextmanager
+async def benchmark_bot(
+    directory: Path,
+    *,
+    songs: int,
+    rng: random.Random,
+    user_ids: Sequence[int] = (BENCHMARK_USER_ID,),
+    options: Optional[FakeChuniNetOptions] = None,
+):
+    """Starts a bot that is not connected to Discord, with a seeded database
+    in which `user_ids` are logged in.
+
+    Returns the bot, the titles in its song catalog and the fake CHUNITHM-NET
+    it talks to. Since the configuration is only read once, this can only be
+    used once per process.
+    """
+    # The configuration is read on import, so everything that imports it has
+    # to be imported after this.
+    os.environ["CHUNINEWBOT_CONFIG"] = str(write_config(directory))
+
+    import discord
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from bot import ChuniBot
+    from database.models import Base, Cookie
+    from utils.config import config
+
+    engine = create_async_engine(config.bot.db_connection_string)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(engine)() as session:
+        titles = await seed_catalog(session, songs=songs, rng=rng)
+
+        await session.execute(
+            insert(Cookie),
+            [
+                {
+                    "discord_id": id,
+                    "cookie": f"#LWP-Cookies-2.0\n{clal_cookie_jar().as_lwp_str()}",
+                }
+                for id in user_ids
+            ],
+        )
+        await session.commit()
+
+    await engine.dispose()
+
+    async with FakeChuniNet(options) as server:
+        bot = ChuniBot(
+            command_prefix="c>",
+            intents=discord.Intents.default(),
+            help_command=None,
+        )
+        bot.chunithm_net_transport = lambda: RewritingTransport(server.url)
+
+        try:
+            await bot.setup_hook()
+            yield bot, titles, server
+        finally:
+            await bot.close()
+
+
+async def run_benchmarks(
+    benchmarks: list[Benchmark], *, iterations: int, measure_allocations: bool
+) -> list[CommandResult]:
+    results = []
+
+    for benchmark in benchmarks:
+        result = CommandResult(benchmark.name)
+
+        # Warm up caches (SQLAlchemy statement cache, imports, ...)
+        with contextlib.suppress(Exception):
+            await benchmark.run()
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            try:
+                await benchmark.run()
+            except Exception as e:  # noqa: BLE001
+                result.errors += 1
+                result.last_error = e
+            else:
+                result.durations.append(time.perf_counter() - start)
+
+        if measure_allocations:
+            tracemalloc.start()
+            try:
+                before, _ = tracemalloc.get_traced_memory()
+                with contextlib.suppress(Exception):
+                    await benchmark.run()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            result.peak_allocated = peak - before
+            result.retained = current - before
+
+        results.append(result)
+
+    return results
+
+
+def _percentile(values: list[float], p: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def report(results: list[CommandResult]) -> None:
+    rows = [
+        ("command", "runs", "errors", "p50 ms", "p99 ms", "peak KiB", "retained KiB")
+    ]
+
+    for result in results:
+        durations = result.durations
+        rows.append(
+            (
+                result.name,
+                str(len(durations)),
+                str(result.errors),
+                f"{_percentile(durations, 50) * 1000:.2f}" if durations else "-",
+                f"{_percentile(durations, 99) * 1000:.2f}" if durations else "-",
+                (
+                    f"{result.peak_allocated / 1024:.1f}"
+                    if result.peak_allocated is not None
+                    else "-"
+                ),
+                f"{result.retained / 1024:.1f}" if result.retained is not None else "-",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    ]
+
+    lines.extend(
+        f"{result.name} failed: {result.last_error!r}"
+        for result in results
+        if result.last_error is not None
+    )
+
+    print("\n".join(lines))
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks bot commands end to end, without Discord or network access."
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--songs", type=int, default=1500, help="Number of songs in the catalog"
+    )
+    parser.add_argument(
+        "--no-allocations",
+        action="store_true",
+        help="Skip measuring allocations with tracemalloc",
+    )
+    parser.add_argument(
+        "-k", dest="filter", default=None, help="Only run commands containing this"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with benchmark_bot(Path(directory), songs=args.songs, rng=rng) as (
+            bot,
+            titles,
+            _,
+        ):
+            benchmarks = [
+                x
+                for x in command_benchmarks(bot, titles, rng)
+                if args.filter is None or args.filter in x.name
+            ]
+            results = await run_benchmarks(
+                benchmarks,
+                iterations=args.iterations,
+                measure_allocations=not args.no_allocations,
+            )
+
+    report(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
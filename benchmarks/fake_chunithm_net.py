@@ -0,0 +1,259 @@
+"""A stand-in for CHUNITHM-NET that serves the test fixture pages.
+
+Both the Aime login host and CHUNITHM-NET are served from the same server, so
+clients need `RewritingTransport` to talk to it with the real URLs.
+
+Run it standalone with `python -m benchmarks.fake_chunithm_net`.
+"""
+import argparse
+import asyncio
+import random
+import secrets
+from dataclasses import dataclass
+from http.cookiejar import Cookie, LWPCookieJar
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from aiohttp import web
+
+__all__ = [
+    "FakeChuniNet",
+    "FakeChuniNetOptions",
+    "RewritingTransport",
+    "clal_cookie_jar",
+]
+
+ASSETS_DIR = Path(__file__).parent.parent / "tests" / "chunithm_net" / "assets"
+
+_BASE_URL = "https://chunithm-net-eng.com"
+
+# (method, path) -> fixture file
+PAGES = {
+    ("GET", "/mobile/home/"): "logged_in_homepage.html",
+    ("GET", "/mobile/home/playerData"): "player_data.html",
+    ("GET", "/mobile/home/playerData/ratingDetailBest/"): "best30.html",
+    ("GET", "/mobile/home/playerData/ratingDetailRecent/"): "recent10.html",
+    ("GET", "/mobile/record/playlog"): "playlog.html",
+    ("POST", "/mobile/record/playlog/sendPlaylogDetail/"): "playlog_detail.html",
+    ("POST", "/mobile/record/musicGenre/sendMusicDetail/"): "music_record.html",
+    (
+        "POST",
+        "/mobile/record/worldsEndList/sendWorldsEndDetail/",
+    ): "worlds_end_music_record.html",
+    (
+        "POST",
+        "/mobile/record/musicLevel/sendSearch/",
+    ): "music_record_by_level_folder.html",
+}
+
+
+@dataclass
+class FakeChuniNetOptions:
+    # Added to every response, in seconds.
+    min_latency: float = 0.0
+    max_latency: float = 0.0
+    # Probability that a logged in request fails with error 200004 (session
+    # expired), forcing the client to log in again.
+    session_expiry_rate: float = 0.0
+    # Probability that a request fails with 503 (maintenance).
+    maintenance_rate: float = 0.0
+
+
+class FakeChuniNet:
+    def __init__(self, options: Optional[FakeChuniNetOptions] = None) -> None:
+        self.options = options or FakeChuniNetOptions()
+
+        self.pages = {
+            key: (ASSETS_DIR / name).read_bytes() for key, name in PAGES.items()
+        }
+        self.session_expired_page = (ASSETS_DIR / "200004.html").read_bytes()
+
+        # key: _t cookie
+        # value: clal cookie it was issued for
+        self.sessions: dict[str, str] = {}
+        self.requests = 0
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/common_auth/login", self.login)
+        self.app.router.add_get("/mobile/", self.mobile_index)
+        self.app.router.add_get("/mobile/error/", self.error)
+        self.app.router.add_route("*", "/{tail:.*}", self.page)
+
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[reportOptionalMemberAccess]
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.stop()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.requests += 1
+
+        if self.options.max_latency > 0:
+            await asyncio.sleep(
+                random.uniform(self.options.min_latency, self.options.max_latency)
+            )
+
+        if random.random() < self.options.maintenance_rate:
+            raise web.HTTPServiceUnavailable
+
+        return await handler(request)
+
+    async def login(self, request: web.Request) -> web.Response:
+        clal = request.cookies.get("clal")
+
+        if clal is None:
+            # The real login page shows a login form here.
+            return web.Response(text="", content_type="text/html")
+
+        location = f"{_BASE_URL}/mobile/?ssid={clal}"
+        raise web.HTTPFound(location)
+
+    async def mobile_index(self, request: web.Request) -> web.Response:
+        if (clal := request.query.get("ssid")) is None:
+            # CHUNITHM-NET sends users that aren't logged in here.
+            return web.Response(
+                body=(ASSETS_DIR / "stupid_way_to_redirect.html").read_bytes(),
+                content_type="text/html",
+            )
+
+        token = secrets.token_hex(16)
+        self.sessions[token] = clal
+
+        response = web.HTTPFound(f"{_BASE_URL}/mobile/home/")
+        response.set_cookie("_t", token, path="/")
+        response.set_cookie("userId", secrets.token_hex(8), path="/")
+        raise response
+
+    async def error(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.session_expired_page, content_type="text/html", charset="utf-8"
+        )
+
+    async def page(self, request: web.Request) -> web.Response:
+        body = self.pages.get((request.method, request.path))
+
+        if body is None:
+            if request.path.startswith("/mobile/record/musicGenre/send"):
+                body = self.pages[("POST", "/mobile/record/musicLevel/sendSearch/")]
+            else:
+                raise web.HTTPNotFound
+
+        token = request.cookies.get("_t")
+        if (
+            token is None
+            or token not in self.sessions
+            or random.random() < self.options.session_expiry_rate
+        ):
+            self.sessions.pop(token, None)  # type: ignore[reportArgumentType]
+            location = f"{_BASE_URL}/mobile/error/"
+            raise web.HTTPFound(location)
+
+        return web.Response(body=body, content_type="text/html", charset="utf-8")
+
+
+def clal_cookie_jar(clal: Optional[str] = None) -> LWPCookieJar:
+    """Creates a cookie jar for a (fake) account, like the one saved on login."""
+    jar = LWPCookieJar()
+    jar.set_cookie(
+        Cookie(
+            version=0,
+            name="clal",
+            value=clal or secrets.token_hex(32),
+            port=None,
+            port_specified=False,
+            domain="lng-tgk-aime-gw.am-all.net",
+            domain_specified=True,
+            domain_initial_dot=False,
+            path="/common_auth",
+            path_specified=True,
+            secure=False,
+            expires=3856586927,  # 2092-03-17 10:08:47Z
+            discard=False,
+            comment=None,
+            comment_url=None,
+            rest={},
+        )
+    )
+    return jar
+
+
+class RewritingTransport(httpx.AsyncBaseTransport):
+    """Sends every request to the fake server, regardless of its host.
+
+    The original request is left untouched, so cookies are still stored under
+    the real domains.
+    """
+
+    def __init__(self, server_url: str) -> None:
+        self.server_url = httpx.URL(server_url)
+        self.transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = request.url.copy_with(
+            scheme=self.server_url.scheme,
+            host=self.server_url.host,
+            port=self.server_url.port,
+        )
+        rewritten = httpx.Request(
+            request.method,
+            url,
+            headers=request.headers,
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+
+        return await self.transport.handle_async_request(rewritten)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Runs a fake CHUNITHM-NET server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5731)
+    parser.add_argument("--min-latency", type=float, default=0.0)
+    parser.add_argument("--max-latency", type=float, default=0.0)
+    parser.add_argument("--session-expiry-rate", type=float, default=0.0)
+    parser.add_argument("--maintenance-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeChuniNet(
+        FakeChuniNetOptions(
+            min_latency=args.min_latency,
+            max_latency=args.max_latency,
+            session_expiry_rate=args.session_expiry_rate,
+            maintenance_rate=args.maintenance_rate,
+        )
+    )
+    await server.start(args.host, args.port)
+    print(f"Fake CHUNITHM-NET listening on {server.url}")
+
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,31 +1,50 @@
+from time import perf_counter, time
+
+# Taken before anything else is imported, so that the startup summary can tell
+# how long imports took.
+IMPORT_START = perf_counter()
+
+import argparse
 import asyncio
 import contextlib
 import functools
 import logging
 import logging.handlers
 import sys
+from collections.abc import Callable
 from pathlib import Path
-from time import time
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import discord
-import sqlalchemy.event
-from aiohttp import web
 from discord.ext import commands
+from discord.utils import MISSING
 from rapidfuzz import fuzz
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from cogs import COG_LIST
+from chunithm_net.limiter import RateLimiter, set_default_limiter
+from cogs import COG_LIST, CORE_COGS
+from database.connections import checkpoint_wal, create_engines
 from database.models import Prefix
 from utils.config import config
 from utils.evtloop import get_event_loop
 from utils.help import HelpCommand
 from utils.logging import QueueListenerHandler, console_handler, logger, setup_handler
-from web import init_app
+from utils.metrics import (
+    instrument_chunithm_net,
+    instrument_engine,
+    monitor_event_loop_lag,
+)
+from utils.query_stats import QueryStats
+from utils.startup import StartupProfile
+from utils.tracing import TracedContext, Tracer, current_trace, install_listeners
+
+IMPORT_END = perf_counter()
 
 if TYPE_CHECKING:
+    import httpx
     from aiohttp.web import Application
+    from discord.ext.commands._types import ContextT
     from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 
@@ -37,9 +56,21 @@ class ChuniBot(commands.Bot):
 
     engine: "AsyncEngine"
     begin_db_session: async_sessionmaker["AsyncSession"]
+    # For queries that don't write. Its connections reject writes.
+    read_engine: "AsyncEngine"
+    begin_read_session: async_sessionmaker["AsyncSession"]
 
     launch_time: float
     app: Optional["Application"] = None
+    loop_lag_monitor: Optional["asyncio.Task"] = None
+    wal_checkpointer: Optional["asyncio.Task"] = None
+    tracer: Optional[Tracer] = None
+    query_stats: QueryStats
+    startup_profile: Optional[StartupProfile] = None
+    _startup_task: Optional["asyncio.Task"] = None
+    # Creates the transport for CHUNITHM-NET clients made by commands. Only
+    # overridden by benchmarks, to talk to a fake CHUNITHM-NET.
+    chunithm_net_transport: Optional[Callable[[], "httpx.AsyncBaseTransport"]] = None
 
     # Prefix cache
     prefixes: dict[int, str]
@@ -60,69 +91,196 @@ class ChuniBot(commands.Bot):
         return await super().start(*args, **kwargs)
 
     async def setup_hook(self) -> None:
-        # Database setup
-        connection_string = config.bot.db_connection_string
-        self.engine = create_async_engine(connection_string)
-        self.begin_db_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        profile = self.startup_profile or StartupProfile(logger)
+
+        with profile.phase("database"):
+            await self._setup_database()
 
-        def setup_database(conn, _):
-            conn.execute("PRAGMA journal_mode=WAL")
+        with profile.phase("web"):
+            self._setup_web()
+
+        with profile.phase("cogs"):
+            await self._load_cogs()
+
+        if self.startup_profile is not None:
+            self._startup_task = asyncio.create_task(self._finish_startup())
+
+    async def _setup_database(self) -> None:
+        def setup_database(conn):
             conn.create_function(
                 "fuzz_qratio",
                 2,
                 functools.partial(fuzz.QRatio, processor=str.lower),  # type: ignore[reportCallIssue]
             )
 
-        sqlalchemy.event.listen(self.engine.sync_engine, "connect", setup_database)
+        self.engine, self.read_engine = create_engines(
+            config.bot.db_connection_string,
+            read_connections=config.bot.db_read_connections,
+            setup=setup_database,
+        )
+        self.begin_db_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.begin_read_session = async_sessionmaker(
+            self.read_engine, expire_on_commit=False
+        )
+        # Both are the same engine for in-memory databases.
+        engines = {self.engine, self.read_engine}
+
+        self.query_stats = QueryStats(
+            logger.getChild("db"), slow_threshold=config.bot.slow_query_threshold
+        )
+        for engine in engines:
+            instrument_engine(engine)
+            self.query_stats.install(engine)
+        instrument_chunithm_net()
+        self.loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+        self.wal_checkpointer = asyncio.create_task(
+            checkpoint_wal(
+                logger.getChild("db"),
+                self.engine,
+                interval=config.bot.wal_checkpoint_interval,
+            )
+        )
+
+        if config.tracing.enable:
+            self.tracer = Tracer(
+                logger.getChild("tracing"),
+                sample_rate=config.tracing.sample_rate,
+                slow_threshold=config.tracing.slow_threshold,
+            )
+            install_listeners(*engines)
+
+            # Traces are started in a before_invoke hook instead of an
+            # on_command listener, because listeners run in their own task and
+            # the trace would not be visible to the command.
+            self.before_invoke(self._start_trace)
+            self.after_invoke(self._finish_trace)
+
+        set_default_limiter(
+            RateLimiter(rate=config.ratelimit.rate, burst=config.ratelimit.burst)
+        )
 
         # Load guild prefixes
-        async with self.begin_db_session() as session:
+        async with self.begin_read_session() as session:
             prefixes = (await session.execute(select(Prefix))).scalars()
 
         self.prefixes = {prefix.guild_id: prefix.prefix for prefix in prefixes}
         logger.info(f"Loaded {len(self.prefixes)} guild prefixes")
 
+    def _setup_web(self) -> None:
         # Setup login web server (if enabled)
         if config.web.enable:
+            # Imported here since most instances don't run the web server, and
+            # aiohttp.web takes a while to import.
+            from aiohttp.web import _run_app
+
+            from web import init_app
+
             self.app = init_app(
                 self,
                 goatcounter=config.web.goatcounter,
                 base_url=config.web.base_url,
                 kamaitachi_client_id=config.credentials.kamaitachi_client_id,
                 kamaitachi_client_secret=config.credentials.kamaitachi_client_secret,
+                metrics_token=config.web.metrics_token,
             )
             _ = asyncio.ensure_future(
-                web._run_app(
+                _run_app(
                     self.app,
                     port=config.web.port,
                     host=config.web.listen_address,
                 )
             )
 
+    async def _load_cogs(self) -> None:
         if self.dev:
             await self.load_extension("cogs.hotreload")
             await self.load_extension("jishaku")
 
-        for cog in COG_LIST:
-            try:
-                await self.load_extension(cog)
-                logger.info(f"Loaded extension {cog}")
-            except commands.errors.ExtensionAlreadyLoaded:  # noqa: PERF203
-                logger.warning(f"{cog} already loaded")
-            except commands.errors.NoEntryPointError:
-                logger.error(f"{COG_LIST} has no `setup` function.")
-            except commands.errors.ExtensionFailed as e:
-                logger.error(
-                    f"{cog} raised an error: {e.original.__class__.__name__}: {e.original}"
-                )
+        # Other cogs look up the core cogs when they are constructed, so those
+        # are loaded first and in order. The rest don't depend on each other,
+        # and are loaded concurrently so that their setup I/O overlaps.
+        for cog in CORE_COGS:
+            await self._load_cog(cog)
+
+        await asyncio.gather(
+            *(self._load_cog(cog) for cog in COG_LIST if cog not in CORE_COGS)
+        )
+
+    async def _load_cog(self, cog: str) -> None:
+        try:
+            await self.load_extension(cog)
+            logger.info(f"Loaded extension {cog}")
+        except commands.errors.ExtensionAlreadyLoaded:
+            logger.warning(f"{cog} already loaded")
+        except commands.errors.NoEntryPointError:
+            logger.error(f"{cog} has no `setup` function.")
+        except commands.errors.ExtensionFailed as e:
+            logger.error(
+                f"{cog} raised an error: {e.original.__class__.__name__}: {e.original}"
+            )
+
+    async def _finish_startup(self) -> None:
+        if self.startup_profile is None:
+            return
+
+        # Song searches wait for the alias index, which is loaded in the
+        # background, so startup is only done once that is loaded.
+        if (utils := self.get_cog("Utils")) is not None:
+            with self.startup_profile.phase("alias index"), contextlib.suppress(
+                Exception
+            ):
+                await utils.wait_for_aliases()  # type: ignore[reportAttributeAccessIssue]
+
+        self.startup_profile.finish()
+
+    async def get_context(
+        self,
+        origin: "discord.Message | discord.Interaction",
+        /,
+        *,
+        cls: "type[ContextT]" = MISSING,
+    ) -> Any:
+        return await super().get_context(
+            origin, cls=TracedContext if cls is MISSING else cls
+        )
+
+    async def _start_trace(self, ctx: commands.Context) -> None:
+        if self.tracer is None or ctx.command is None:
+            return
+
+        self.tracer.start(
+            ctx.command.qualified_name,
+            user=ctx.author.id,
+            guild=ctx.guild.id if ctx.guild is not None else None,
+            slash=ctx.interaction is not None,
+        )
+
+    async def _finish_trace(self, ctx: commands.Context) -> None:
+        if self.tracer is None or (trace := current_trace()) is None:
+            return
+
+        self.tracer.finish(trace)
 
     async def close(self) -> None:
+        if self.loop_lag_monitor is not None:
+            self.loop_lag_monitor.cancel()
+
+        if self.wal_checkpointer is not None:
+            # It may be using the write engine, which is disposed below.
+            self.wal_checkpointer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.wal_checkpointer
+
+        if self._startup_task is not None:
+            self._startup_task.cancel()
+
         if self.app is not None:
             await self.app.shutdown()
             await self.app.cleanup()
 
         if hasattr(self, "engine"):
             await self.engine.dispose()
+            await self.read_engine.dispose()
 
         return await super().close()
 
@@ -139,7 +297,7 @@ def guild_specific_prefix(default: str):
     return inner
 
 
-async def startup():
+async def startup(*, profile_startup: Optional[Path] = None):
     if (token := config.bot.token) is None:
         logger.error("Token not found. Make sure 'bot.token' is set in 'bot.ini'.")
         sys.exit(1)
@@ -151,6 +309,10 @@ async def startup():
         help_command=HelpCommand(),
         config=config,
     )
+    bot.startup_profile = StartupProfile(
+        logger, start=IMPORT_START, profile_path=profile_startup
+    )
+    bot.startup_profile.record("imports", IMPORT_END - IMPORT_START)
 
     discord.utils.setup_logging(
         level=logging.DEBUG if bot.dev else logging.INFO,
@@ -183,18 +345,30 @@ async def startup():
         sys.exit(1)
 
 
-def sync_startup():
+def sync_startup(*, profile_startup: Optional[Path] = None):
     event_loop_impl, loop_factory = get_event_loop()
 
     if sys.version_info >= (3, 11):
         with asyncio.Runner(loop_factory=loop_factory) as runner:
-            runner.run(startup())
+            runner.run(startup(profile_startup=profile_startup))
     else:
         if event_loop_impl is not None:
             event_loop_impl.install()
-        asyncio.run(startup())
+        asyncio.run(startup(profile_startup=profile_startup))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile-startup",
+        metavar="PATH",
+        nargs="?",
+        const=Path("startup.prof"),
+        type=Path,
+        help="Profile startup with cProfile and write the stats to PATH "
+        "(default: startup.prof). Use `python -X importtime` for import times.",
+    )
+    args = parser.parse_args()
+
     with contextlib.suppress(KeyboardInterrupt):
-        sync_startup()
+        sync_startup(profile_startup=args.profile_startup)
@@ -1,12 +1,16 @@
 import dataclasses
-from http.cookiejar import CookieJar
+import time
+from collections.abc import Hashable
+from http.cookiejar import Cookie, CookieJar
 from typing import TYPE_CHECKING, Optional
 
 import httpx
 from bs4 import BeautifulSoup
 
+from . import instrumentation
 from ._bs4 import BS4_FEATURE
 from ._httpx_hooks import raise_on_chunithm_net_error, raise_on_scheduled_maintenance
+from ._singleflight import SingleFlight
 from .consts import _KEY_DETAILED_PARAMS
 from .exceptions import (
     AlreadyAddedAsFriend,
@@ -14,11 +18,19 @@ from .exceptions import (
     InvalidFriendCode,
     InvalidTokenException,
 )
+from .limiter import LimitedTransport, Priority, RateLimiter, get_default_limiter
 from .models.enums import Difficulty, Genres, Rank
-from .models.record import MusicRecord, RecentRecord, Record
+from .models.record import (
+    MusicRecord,
+    PlaylogMarker,
+    RecentRecord,
+    Record,
+    plays_since,
+)
 from .parser import (
     parse_basic_recent_record,
     parse_detailed_recent_record,
+    parse_html,
     parse_music_for_rating,
     parse_music_record,
     parse_player_card_and_avatar,
@@ -28,16 +40,55 @@ from .parser import (
 if TYPE_CHECKING:
     from chunithm_net.models.player_data import PlayerData
 
-__all__ = ["ChuniNet"]
+__all__ = ["ChuniNet", "coalesced_requests"]
 
 _AUTHENTICATION_URL = httpx.URL(
     "https://lng-tgk-aime-gw.am-all.net/common_auth/login?site_id=chuniex&redirect_url=https://chunithm-net-eng.com/mobile/&back_url=https://chunithm.sega.com/"
 )
 _BASE_URL = httpx.URL("https://chunithm-net-eng.com")
 
+_inflight: SingleFlight[tuple[BeautifulSoup, list[Cookie]]] = SingleFlight()
+
+
+def coalesced_requests() -> int:
+    """Returns how many page requests were served by an identical request that
+    was already in flight, since the process started."""
+    return _inflight.coalesced
+
 
 class ChuniNet:
-    def __init__(self, cookies: CookieJar) -> None:
+    def __init__(
+        self,
+        cookies: CookieJar,
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+        limiter: Optional[RateLimiter] = None,
+        user_key: Hashable = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        cookies: CookieJar
+            Cookie jar containing the `clal` cookie of the account.
+        priority: Priority
+            Priority of this client's requests in the rate limiter.
+        limiter: Optional[RateLimiter]
+            The rate limiter to use. Defaults to the process-wide one.
+        user_key: Hashable
+            Identifies the user of this client, so that the rate limiter can
+            be fair between users.
+        transport: Optional[httpx.AsyncBaseTransport]
+            Transport used to make requests, e.g. to talk to a fake CHUNITHM-NET.
+            Defaults to a regular HTTP transport.
+        """
+        transport = LimitedTransport(
+            transport or httpx.AsyncHTTPTransport(retries=5),
+            limiter or get_default_limiter(),
+            priority,
+            user_key,
+        )
+
         self.session = httpx.AsyncClient(
             cookies=cookies,
             event_hooks={
@@ -48,7 +99,7 @@ class ChuniNet:
             },
             timeout=httpx.Timeout(timeout=60.0),
             follow_redirects=True,
-            transport=httpx.AsyncHTTPTransport(retries=5),
+            transport=transport,
         )
 
     async def __aenter__(self):
@@ -76,6 +127,25 @@ class ChuniNet:
 
         return [parse_basic_recent_record(record) for record in web_records]
 
+    async def recent_record_since(
+        self, marker: Optional[PlaylogMarker]
+    ) -> tuple[list[RecentRecord], Optional[PlaylogMarker]]:
+        """Get plays that are newer than a previously seen play.
+
+        Parameters
+        ----------
+        marker: Optional[PlaylogMarker]
+            The marker returned by the previous call. If None, the entire
+            playlog is returned.
+
+        Returns
+        -------
+        tuple[list[RecentRecord], Optional[PlaylogMarker]]
+            New plays, newest first, and the marker to pass on the next call.
+            The marker is unchanged if there are no new plays.
+        """
+        return plays_since(await self.recent_record(), marker)
+
     async def detailed_recent_record(self, recent_record: RecentRecord | int):
         if isinstance(recent_record, int):
             params = {
@@ -305,13 +375,80 @@ class ChuniNet:
         method: str,
         path: str,
         **kwargs,
+    ) -> BeautifulSoup:
+        # Identical requests for the same account that are already in flight
+        # (e.g. someone double-firing a command) share one upstream request.
+        # Everything that goes through here only reads pages, and parsers
+        # don't modify the soup, so it is safe to share.
+        account = self.session.cookies.get("clal", domain=_AUTHENTICATION_URL.host)
+        if account is None:
+            return await self._request_soup_uncoalesced(method, path, **kwargs)
+
+        key = (
+            account,
+            method,
+            _BASE_URL.join(path).path,
+            tuple(sorted((kwargs.get("data") or {}).items())),
+        )
+
+        async def fetch():
+            soup = await self._request_soup_uncoalesced(method, path, **kwargs)
+            return soup, list(self.session.cookies.jar)
+
+        soup, cookies = await _inflight.do(key, fetch)
+
+        # The request may have refreshed the session (`_t`, `userId`), which
+        # callers that shared it need too, or their jar goes stale.
+        for cookie in cookies:
+            self.session.cookies.jar.set_cookie(cookie)
+
+        return soup
+
+    async def _request_soup_uncoalesced(
+        self,
+        method: str,
+        path: str,
+        **kwargs,
     ) -> BeautifulSoup:
         resp = await self._request(method, path, **kwargs)
         text = "".join([part async for part in resp.aiter_text()])
 
-        return BeautifulSoup(text, BS4_FEATURE)
+        return parse_html(text)
 
     async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if not instrumentation.has_request_listeners():
+            return await self._request_uninstrumented(method, path, **kwargs)
+
+        start = time.perf_counter()
+        status = None
+        error = None
+
+        try:
+            response = await self._request_uninstrumented(method, path, **kwargs)
+            status = response.status_code
+        except ChuniNetError as e:
+            error = str(e.code)
+            raise
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            instrumentation.emit_request(
+                instrumentation.RequestEvent(
+                    method=method,
+                    path=_BASE_URL.join(path).path,
+                    status=status,
+                    error=error,
+                    start=start,
+                    duration=time.perf_counter() - start,
+                )
+            )
+
+        return response
+
+    async def _request_uninstrumented(
+        self, method: str, path: str, **kwargs
+    ) -> httpx.Response:
         url = _BASE_URL.join(path)
 
         try:
@@ -0,0 +1,95 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+V = TypeVar("V")
+
+
+class _Call(Generic[V]):
+    def __init__(self, task: "asyncio.Task[V]") -> None:
+        self.task = task
+        self.waiters = 0
+        # Set when the caller that started the call goes away. The call may be
+        # using resources owned by that caller (e.g. its HTTP client), so its
+        # result can't be trusted by the other waiters anymore.
+        self.owner_gone = False
+
+
+class SingleFlight(Generic[V]):
+    """Coalesces concurrent calls with the same key into a single call, whose
+    result (or exception) is shared by every caller.
+
+    Cancelling a caller only cancels the underlying call if there are no other
+    callers waiting on it.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call[V]] = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+
+        if call is not None and not call.owner_gone:
+            return await self._follow(key, call, fn)
+
+        call = _Call(asyncio.ensure_future(fn()))
+        call.task.add_done_callback(lambda task: self._finish(key, call, task))
+        self._calls[key] = call
+        self.calls += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.owner_gone = True
+            raise
+        finally:
+            self._leave(key, call)
+
+    async def _follow(
+        self, key: Hashable, call: _Call[V], fn: Callable[[], Awaitable[V]]
+    ) -> V:
+        self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # Unlike awaiting a shielded task, this only raises CancelledError
+            # if we are cancelled, and returns if the call is.
+            await asyncio.wait((call.task,))
+        finally:
+            self._leave(key, call)
+
+        if call.task.cancelled():
+            # The call was cancelled from under us, make the request ourselves.
+            return await self.do(key, fn)
+
+        try:
+            return call.task.result()
+        except Exception:
+            if call.owner_gone:
+                return await self.do(key, fn)
+            raise
+
+    def _leave(self, key: Hashable, call: _Call[V]) -> None:
+        call.waiters -= 1
+
+        if call.waiters == 0 and not call.task.done():
+            call.task.cancel()
+
+        if call.owner_gone and self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finish(self, key: Hashable, call: _Call[V], task: "asyncio.Task[V]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+        # Avoid "exception was never retrieved" warnings when every caller has
+        # gone away.
+        if not task.cancelled():
+            task.exception()
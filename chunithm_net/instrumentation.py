@@ -0,0 +1,90 @@
+"""Hooks for observing what ChuniNet is doing, e.g. for metrics or tracing.
+
+Listeners are called synchronously right after the observed operation
+finishes, so they should be cheap. When no listeners are registered, the
+overhead is a single list check.
+"""
+import functools
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Optional, TypeVar
+
+__all__ = [
+    "ParseEvent",
+    "RequestEvent",
+    "add_parse_listener",
+    "add_request_listener",
+    "remove_parse_listener",
+    "remove_request_listener",
+]
+
+F = TypeVar("F", bound=Callable)
+
+
+@dataclass
+class RequestEvent:
+    method: str
+    path: str
+    # None if the request failed before a response was received.
+    status: Optional[int]
+    # CHUNITHM-NET error code, or the exception's class name for other errors.
+    error: Optional[str]
+    # time.perf_counter() when the request started
+    start: float
+    duration: float
+
+
+@dataclass
+class ParseEvent:
+    parser: str
+    start: float
+    duration: float
+
+
+_request_listeners: list[Callable[[RequestEvent], None]] = []
+_parse_listeners: list[Callable[[ParseEvent], None]] = []
+
+
+def add_request_listener(listener: Callable[[RequestEvent], None]) -> None:
+    _request_listeners.append(listener)
+
+
+def remove_request_listener(listener: Callable[[RequestEvent], None]) -> None:
+    _request_listeners.remove(listener)
+
+
+def add_parse_listener(listener: Callable[[ParseEvent], None]) -> None:
+    _parse_listeners.append(listener)
+
+
+def remove_parse_listener(listener: Callable[[ParseEvent], None]) -> None:
+    _parse_listeners.remove(listener)
+
+
+def has_request_listeners() -> bool:
+    return len(_request_listeners) > 0
+
+
+def emit_request(event: RequestEvent) -> None:
+    for listener in _request_listeners:
+        listener(event)
+
+
+def timed_parser(fn: F) -> F:
+    """Reports how long each call to a parser function takes to parse listeners."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if len(_parse_listeners) == 0:
+            return fn(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            event = ParseEvent(fn.__name__, start, time.perf_counter() - start)
+            for listener in _parse_listeners:
+                listener(event)
+
+    return wrapper  # type: ignore[reportReturnType]
@@ -0,0 +1,261 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Optional
+
+import httpx
+
+__all__ = [
+    "LimitedTransport",
+    "Priority",
+    "RateLimiter",
+    "get_default_limiter",
+    "request_priority",
+    "set_default_limiter",
+]
+
+
+class Priority(IntEnum):
+    """Request priority classes. Lower values are served first."""
+
+    INTERACTIVE = 0
+    """Someone is waiting on the response, e.g. a command."""
+
+    BULK = 1
+    """Large user-initiated jobs that make many requests, e.g. syncing personal bests."""
+
+    BACKGROUND = 2
+    """Nobody is waiting on the response, e.g. prefetching."""
+
+
+@dataclass
+class PriorityStats:
+    acquired: int = 0
+    # Only counts requests that had to wait for a token.
+    waited: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+@dataclass
+class LimiterStats:
+    queue_depth: dict[Priority, int]
+    priorities: dict[Priority, PriorityStats] = field(default_factory=dict)
+
+
+class RateLimiter:
+    """A token bucket shared by every ChuniNet client in the process.
+
+    When no tokens are available, requests are queued. Higher priority requests
+    are always served first, and requests of the same priority are served
+    round-robin between users, so that one user's large sync cannot hold up
+    other users' requests.
+
+    Parameters
+    ----------
+    rate: float
+        Tokens added per second.
+    burst: int
+        Maximum number of tokens that can be saved up.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 10) -> None:
+        if rate <= 0 or burst < 1:
+            msg = "rate must be positive and burst must be at least 1"
+            raise ValueError(msg)
+
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+        # One round-robin queue of users per priority.
+        self._waiters: dict[
+            Priority, OrderedDict[Hashable, deque[asyncio.Future[None]]]
+        ] = {p: OrderedDict() for p in Priority}
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        self._stats = {p: PriorityStats() for p in Priority}
+
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            queue_depth={
+                p: sum(sum(1 for fut in q if not fut.done()) for q in users.values())
+                for p, users in self._waiters.items()
+            },
+            priorities={p: PriorityStats(**vars(s)) for p, s in self._stats.items()},
+        )
+
+    async def acquire(
+        self, priority: Priority = Priority.INTERACTIVE, key: Hashable = None
+    ) -> None:
+        """Waits until a request can be made.
+
+        Parameters
+        ----------
+        priority: Priority
+            Priority of the request.
+        key: Hashable
+            Identifies who the request is for, used for fairness between users
+            of the same priority.
+        """
+        stats = self._stats[priority]
+
+        if not self._has_waiters() and self._take_token():
+            stats.acquired += 1
+            return
+
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters[priority].setdefault(key, deque()).append(fut)
+        self._ensure_dispatcher()
+
+        start = time.monotonic()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Cancelled after the dispatcher handed it a token, which would
+                # otherwise be lost.
+                self._return_token()
+            raise
+        wait = time.monotonic() - start
+
+        stats.acquired += 1
+        stats.waited += 1
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take_token(self) -> bool:
+        self._refill()
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def _return_token(self) -> None:
+        self._refill()
+        self._tokens = min(self.burst, self._tokens + 1)
+
+        if self._has_waiters():
+            self._ensure_dispatcher()
+
+    def _has_waiters(self) -> bool:
+        return any(len(users) > 0 for users in self._waiters.values())
+
+    def _next_waiter(self) -> Optional[asyncio.Future[None]]:
+        for users in self._waiters.values():
+            while len(users) > 0:
+                key, queue = next(iter(users.items()))
+
+                # Cancelled waiters are dropped here instead of when they are
+                # cancelled, so that cancellation does not need any bookkeeping.
+                while len(queue) > 0 and queue[0].done():
+                    queue.popleft()
+
+                if len(queue) == 0:
+                    del users[key]
+                    continue
+
+                fut = queue.popleft()
+
+                # Move the user to the back of the line.
+                users.move_to_end(key)
+                if len(queue) == 0:
+                    del users[key]
+
+                return fut
+
+        return None
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while self._has_waiters():
+            if not self._take_token():
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+
+            fut = self._next_waiter()
+
+            if fut is None:
+                # Every remaining waiter was cancelled, give the token back.
+                self._tokens += 1
+                break
+
+            fut.set_result(None)
+
+
+_priority_override: ContextVar[Optional[Priority]] = ContextVar(
+    "chunithm_net_priority_override", default=None
+)
+
+
+@contextlib.contextmanager
+def request_priority(priority: Priority) -> Iterator[None]:
+    """Makes requests sent in this context use `priority` instead of their
+    client's, e.g. for background work done with a user's client."""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+class LimitedTransport(httpx.AsyncBaseTransport):
+    """Wraps another transport so that every request, including redirects and
+    reauthentication, goes through a rate limiter."""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        limiter: RateLimiter,
+        priority: Priority = Priority.INTERACTIVE,
+        key: Hashable = None,
+    ) -> None:
+        self.transport = transport
+        self.limiter = limiter
+        self.priority = priority
+        self.key = key
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if (priority := _priority_override.get()) is None:
+            priority = self.priority
+
+        await self.limiter.acquire(priority, self.key)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_default_limiter: Optional[RateLimiter] = None
+
+
+def get_default_limiter() -> RateLimiter:
+    global _default_limiter
+
+    if _default_limiter is None:
+        _default_limiter = RateLimiter()
+
+    return _default_limiter
+
+
+def set_default_limiter(limiter: RateLimiter) -> None:
+    global _default_limiter
+
+    _default_limiter = limiter
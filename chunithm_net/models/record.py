@@ -1,18 +1,21 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 from .enums import ClearType, ComboType, Difficulty, Rank
-from .type_paired_dict import TypePairedDict
+from .type_paired_dict import SlottedTypePairedDict
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
 
-@dataclass
+
+@dataclass(slots=True)
 class Skill:
     name: str
     grade: Optional[int]
 
 
-@dataclass
+@dataclass(slots=True)
 class Judgements:
     jcrit: int
     justice: int
@@ -20,7 +23,7 @@ class Judgements:
     miss: int
 
 
-@dataclass
+@dataclass(slots=True)
 class NoteType:
     tap: float
     hold: float
@@ -29,13 +32,36 @@ class NoteType:
     flick: float
 
 
-@dataclass
+@dataclass(slots=True)
 class DetailedParams:
     idx: int
     token: str
 
 
-@dataclass(kw_only=True)
+class RecordExtras(SlottedTypePairedDict):
+    """Values that are added to records after parsing, such as the ones from
+    `UtilsCog.hydrate_records`. Keys from `chunithm_net.consts` have a slot of
+    their own, so that the thousands of records a sync produces don't each
+    carry a dict."""
+
+    __slots__ = (
+        "detailed_params",
+        "internal_level",
+        "level",
+        "overpower_base",
+        "overpower_max",
+        "play_rating",
+        "song_id",
+        "total_combo",
+    )
+
+
+def _field_values(record: Any) -> dict[str, Any]:
+    # Slotted dataclasses don't have a __dict__ to copy from.
+    return {f.name: getattr(record, f.name) for f in fields(record)}
+
+
+@dataclass(kw_only=True, slots=True)
 class Record:
     title: str
     difficulty: Difficulty
@@ -47,27 +73,99 @@ class Record:
 
     jacket: Optional[str] = None
 
-    extras: TypePairedDict = field(default_factory=TypePairedDict)
+    extras: RecordExtras = field(default_factory=RecordExtras)
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class MusicRecord(Record):
     play_count: Optional[int] = None
     ajc_count: Optional[int] = None
 
     @staticmethod
     def from_record(record: Record) -> "MusicRecord":
-        return MusicRecord(**record.__dict__, jacket="")
+        return MusicRecord(**{**_field_values(record), "jacket": ""})
 
 
-@dataclass(kw_only=True)
+@dataclass(kw_only=True, slots=True)
 class RecentRecord(MusicRecord):
     track: int
     date: datetime
     new_record: bool
 
 
-@dataclass(kw_only=True)
+@dataclass(frozen=True, slots=True)
+class PlaylogMarker:
+    """Identifies the newest play that has already been seen in a playlog."""
+
+    date: datetime
+    track: int
+    title: str
+    difficulty: Difficulty
+    score: int
+
+    @staticmethod
+    def from_record(record: RecentRecord) -> "PlaylogMarker":
+        return PlaylogMarker(
+            date=record.date,
+            track=record.track,
+            title=record.title,
+            difficulty=record.difficulty,
+            score=record.score,
+        )
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> "PlaylogMarker":
+        return PlaylogMarker(
+            date=datetime.fromisoformat(data["date"]),
+            track=data["track"],
+            title=data["title"],
+            difficulty=Difficulty(data["difficulty"]),
+            score=data["score"],
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """A JSON-serializable form of the marker, for `from_dict`."""
+        return {
+            "date": self.date.isoformat(),
+            "track": self.track,
+            "title": self.title,
+            "difficulty": self.difficulty.value,
+            "score": self.score,
+        }
+
+    def matches(self, record: RecentRecord) -> bool:
+        return self == PlaylogMarker.from_record(record)
+
+
+def plays_since(
+    playlog: "Sequence[RecentRecord]", marker: Optional[PlaylogMarker]
+) -> tuple[list[RecentRecord], Optional[PlaylogMarker]]:
+    """Returns the plays of a playlog (newest first) that are newer than
+    `marker`, and the marker of the newest play.
+
+    Every play is new if `marker` is None. The marker is unchanged if there are
+    no new plays.
+    """
+    if marker is None:
+        new_records = list(playlog)
+    else:
+        new_records = []
+
+        for record in playlog:
+            # Playlog dates only have minute precision, so the date alone
+            # can't tell apart two plays in the same minute.
+            if marker.matches(record) or record.date < marker.date:
+                break
+
+            new_records.append(record)
+
+    if len(new_records) > 0:
+        marker = PlaylogMarker.from_record(new_records[0])
+
+    return new_records, marker
+
+
+@dataclass(kw_only=True, slots=True)
 class DetailedRecentRecord(RecentRecord):
     character: str
     skill: Skill
@@ -81,7 +179,7 @@ class DetailedRecentRecord(RecentRecord):
     @staticmethod
     def from_basic(record: RecentRecord) -> "DetailedRecentRecord":
         return DetailedRecentRecord(
-            **record.__dict__,
+            **_field_values(record),
             character="",
             skill=Skill("", 0),
             skill_result=0,
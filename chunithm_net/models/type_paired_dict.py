@@ -1,11 +1,21 @@
-from typing import Generic, TypeVar
+from typing import Any, Generic, Optional, TypeVar
 
 T = TypeVar("T")
 VT = TypeVar("VT")
 
+_MISSING: Any = object()
+
 
 class TypePairedDictKey(Generic[T]):
-    pass
+    def __init__(self, slot: Optional[str] = None) -> None:
+        """
+        Parameters
+        ----------
+        slot: Optional[str]
+            Name of the attribute that stores this key's value in a
+            `SlottedTypePairedDict` that has it.
+        """
+        self.slot = slot
 
 
 class TypePairedDict(dict):
@@ -31,3 +41,109 @@ class TypePairedDict(dict):
 
     def get(self, __key: TypePairedDictKey[T]) -> T | None:  # type: ignore[reportInconsistentOverload]
         return super().get(__key)
+
+
+class SlottedTypePairedDict:
+    """
+    A fixed-layout alternative to `TypePairedDict` for containers that there
+    are a lot of. Subclasses declare `__slots__`, and keys whose `slot` is one
+    of them store their value in that attribute instead of a dict:
+
+    ```python
+    KEY_SOMETHING = TypePairedDictKey[int]("something")
+
+    class Data(SlottedTypePairedDict):
+        __slots__ = ("something",)
+
+    data = Data()
+    data[KEY_SOMETHING] = 1  # stored in data.something
+    ```
+
+    Other keys still work, and are stored in a dict that is only created for
+    the first of them.
+    """
+
+    __slots__ = ("_overflow",)
+
+    def __init__(self) -> None:
+        self._overflow: Optional[dict[TypePairedDictKey[Any], Any]] = None
+
+    def _slot_names(self) -> list[str]:
+        return [
+            name
+            for cls in type(self).__mro__
+            if cls is not SlottedTypePairedDict
+            for name in getattr(cls, "__slots__", ())
+        ]
+
+    def __getitem__(self, __key: TypePairedDictKey[T]) -> T:
+        if __key.slot is not None:
+            value = getattr(self, __key.slot, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        if self._overflow is None:
+            raise KeyError(__key)
+
+        return self._overflow[__key]
+
+    def __setitem__(self, __key: TypePairedDictKey[T], __value: T) -> None:
+        if __key.slot is not None:
+            try:
+                setattr(self, __key.slot, __value)
+            except AttributeError:
+                pass
+            else:
+                return
+
+        if self._overflow is None:
+            self._overflow = {}
+
+        self._overflow[__key] = __value
+
+    def __delitem__(self, __key: TypePairedDictKey[Any]) -> None:
+        if __key.slot is not None and hasattr(self, __key.slot):
+            delattr(self, __key.slot)
+            return
+
+        if self._overflow is None:
+            raise KeyError(__key)
+
+        del self._overflow[__key]
+
+    def __contains__(self, __key: TypePairedDictKey[Any]) -> bool:
+        try:
+            self[__key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, __key: TypePairedDictKey[T]) -> T | None:
+        try:
+            return self[__key]
+        except KeyError:
+            return None
+
+    def _values(self) -> dict[str, Any]:
+        values = {
+            name: getattr(self, name)
+            for name in self._slot_names()
+            if hasattr(self, name)
+        }
+        if self._overflow:
+            values["_overflow"] = self._overflow
+        return values
+
+    def __len__(self) -> int:
+        return sum(hasattr(self, name) for name in self._slot_names()) + len(
+            self._overflow or ()
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SlottedTypePairedDict):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{k}={v!r}" for k, v in self._values().items())
+        return f"{type(self).__name__}({values})"
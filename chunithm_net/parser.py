@@ -3,7 +3,9 @@ from typing import cast
 
 from bs4 import BeautifulSoup, Tag
 
+from ._bs4 import BS4_FEATURE
 from .consts import _KEY_DETAILED_PARAMS, KEY_SONG_ID
+from .instrumentation import timed_parser
 from .models.enums import ClearType, ComboType, Possession, Rank, SkillClass
 from .models.player_data import (
     Currency,
@@ -34,6 +36,12 @@ from .utils import (
 )
 
 
+@timed_parser
+def parse_html(text: str) -> BeautifulSoup:
+    return BeautifulSoup(text, BS4_FEATURE)
+
+
+@timed_parser
 def parse_player_card_and_avatar(soup: BeautifulSoup):
     if (e := soup.select_one(".player_chara img")) is not None:
         character = cast(str, e["src"])
@@ -127,6 +135,7 @@ def parse_player_card_and_avatar(soup: BeautifulSoup):
     )
 
 
+@timed_parser
 def parse_player_data(soup: BeautifulSoup) -> PlayerData:
     data = parse_player_card_and_avatar(soup)
 
@@ -150,6 +159,7 @@ def parse_player_data(soup: BeautifulSoup) -> PlayerData:
     return data
 
 
+@timed_parser
 def parse_basic_recent_record(record: Tag) -> RecentRecord:
     idx_elem = record.select_one("form input[name=idx]")
 
@@ -199,6 +209,7 @@ def parse_basic_recent_record(record: Tag) -> RecentRecord:
     return score
 
 
+@timed_parser
 def parse_music_record(soup: BeautifulSoup, song_id: int) -> list[MusicRecord]:
     jacket = (
         str(elem["src"]) if (elem := soup.select_one(".play_jacket_img img")) else ""
@@ -252,6 +263,7 @@ def parse_music_record(soup: BeautifulSoup, song_id: int) -> list[MusicRecord]:
     return records
 
 
+@timed_parser
 def parse_music_for_rating(soup: BeautifulSoup) -> list[Record]:
     records = []
     for x in soup.select("form:has(.w388.musiclist_box)"):
@@ -280,6 +292,7 @@ def parse_music_for_rating(soup: BeautifulSoup) -> list[Record]:
     return records
 
 
+@timed_parser
 def parse_detailed_recent_record(soup: BeautifulSoup) -> DetailedRecentRecord:
     def get_judgement_count(class_name):
         return chuni_int(soup.select_one(class_name).get_text().replace(",", ""))
@@ -1,11 +1,15 @@
-from datetime import datetime
-from typing import cast
+from datetime import datetime, time
+from typing import Optional, cast
 
 from bs4.element import ResultSet, Tag
 from zoneinfo import ZoneInfo
 
 from .models.enums import ClearType, ComboType, Difficulty, Rank
 
+# CHUNITHM-NET is down for maintenance every day during this period (JST).
+MAINTENANCE_START = time(2)
+MAINTENANCE_END = time(7)
+
 
 def chuni_int(s: str) -> int:
     return int(s.replace(",", ""))
@@ -26,6 +30,17 @@ def parse_time(time: str, format: str = "%Y/%m/%d %H:%M") -> datetime:
     return datetime.strptime(time, format).replace(tzinfo=ZoneInfo("Asia/Tokyo"))
 
 
+def maintenance_end(now: datetime) -> Optional[datetime]:
+    """Returns when the ongoing daily maintenance ends, or None if CHUNITHM-NET
+    should be up at `now`."""
+    now = now.astimezone(ZoneInfo("Asia/Tokyo"))
+
+    if not (MAINTENANCE_START <= now.time() < MAINTENANCE_END):
+        return None
+
+    return datetime.combine(now.date(), MAINTENANCE_END, tzinfo=now.tzinfo)
+
+
 def extract_last_part(url: str) -> str:
     return url.split("_")[-1].split(".")[0]
 
@@ -1,3 +1,10 @@
+# Cogs that other cogs look up in their constructors. These are loaded first,
+# in this order.
+CORE_COGS: list[str] = [
+    "cogs.botutils",
+    "cogs.autocompleters",
+]
+
 COG_LIST: list[str] = [
     "cogs.botutils",
     "cogs.autocompleters",
@@ -8,6 +15,7 @@ COG_LIST: list[str] = [
     "cogs.misc",
     "cogs.chunithm.auth",
     "cogs.chunithm.kamaitachi",
+    "cogs.chunithm.prefetch",
     "cogs.chunithm.profile",
     "cogs.chunithm.records",
     "cogs.chunithm.search",
@@ -1,12 +1,16 @@
+import asyncio
 import contextlib
+import copy
+import datetime
 import io
+import time
+from collections.abc import Awaitable, Callable
 from dataclasses import dataclass
 from http.cookiejar import LWPCookieJar
-from typing import TYPE_CHECKING, Optional, Sequence, TypeVar
+from typing import TYPE_CHECKING, Any, Optional, Sequence, TypeVar
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import Context
-from rapidfuzz import fuzz, process
 from sqlalchemy import select, update
 from sqlalchemy.orm import joinedload
 
@@ -20,45 +24,40 @@ from chunithm_net.consts import (
     KEY_SONG_ID,
     KEY_TOTAL_COMBO,
 )
+from chunithm_net.limiter import Priority
 from chunithm_net.models.enums import Rank
-from chunithm_net.models.record import Record
+from chunithm_net.models.record import RecentRecord, Record, plays_since
 from database.models import Alias, Cookie, Song
+from database.shadow import database_path
+from database.snapshot import (
+    CatalogAlias,
+    CatalogSnapshot,
+    build_snapshot,
+    load_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
 from utils import get_jacket_url
+from utils.alias_index import AliasIndex
 from utils.calculation.overpower import (
     calculate_overpower_base,
     calculate_overpower_max,
 )
 from utils.calculation.rating import calculate_rating
+from utils.calculation.rating_engine import RatingEngine, RatingState
 from utils.config import config
 from utils.logging import logger
+from utils.metrics import CallbackMetric
+from utils.tracing import span
+from utils.ttl_cache import TTLCache
 from utils.types import MissingDetailedParams
 
 if TYPE_CHECKING:
     from bot import ChuniBot
+    from utils.calculation.rating_engine import RatingDelta
 
 T = TypeVar("T", bound=Record)
-
-
-class CachedAlias:
-    id: Optional[int] = None
-    alias: str
-    title: str
-    song_id: int
-    guild_id: Optional[int] = None
-
-    def __init__(
-        self,
-        id: Optional[int],
-        alias: str,
-        title: str,
-        song_id: int,
-        guild_id: Optional[int],
-    ) -> None:
-        self.id = id
-        self.alias = alias
-        self.title = title
-        self.song_id = song_id
-        self.guild_id = guild_id
+U = TypeVar("U")
 
 
 @dataclass
@@ -71,40 +70,132 @@ class SongSearchResult:
 class UtilsCog(commands.Cog, name="Utils"):
     def __init__(self, bot: "ChuniBot") -> None:
         self.bot = bot
-        self.alias_cache: list[CachedAlias] = []
+        self.alias_index = AliasIndex()
+        # Loads the alias cache when the cog is loaded. Song searches wait on
+        # this, so that the rest of the bot doesn't have to.
+        self._alias_cache_load: Optional[asyncio.Task[None]] = None
+        # Held while the alias index is rebuilt, so that rebuilds finish in the
+        # order they started, and the newest catalog wins.
+        self._alias_cache_lock = asyncio.Lock()
+
+        # The catalog that the alias index is built from is persisted next to
+        # the database, so that the next startup doesn't have to go through
+        # the database. It is written whenever it changes instead of on
+        # shutdown, so that it doesn't have to be kept around.
+        self.catalog_path = snapshot_path(config.bot.db_connection_string)
+
+        # key: user discord ID
+        self.rating_engines: dict[int, RatingEngine] = {}
+
+        # key: (user discord ID, page name)
+        # Only used when prefetching is enabled, since nothing would refresh
+        # the cache after a user plays otherwise.
+        self.page_cache: TTLCache[tuple[int, str], Any] = TTLCache(
+            config.prefetch.cache_ttl if config.prefetch.enable else 0
+        )
+
+        CallbackMetric(
+            "chuninewbot_cache_requests_total",
+            "Cache lookups",
+            ["cache", "result"],
+            lambda: [
+                (("page", "hit"), self.page_cache.hits),
+                (("page", "miss"), self.page_cache.misses),
+            ],
+            type="counter",
+        )
+        CallbackMetric(
+            "chuninewbot_cache_hit_ratio",
+            "Fraction of cache lookups that were hits since startup",
+            ["cache"],
+            lambda: [(("page",), self.page_cache.hit_ratio)],
+        )
 
     async def cog_load(self) -> None:
-        return await self._reload_alias_cache()
+        self._alias_cache_load = asyncio.create_task(self._load_alias_cache())
+
+        if config.catalog.refresh:
+            self.refresh_catalog.start()
+
+    async def cog_unload(self) -> None:
+        if self._alias_cache_load is not None:
+            self._alias_cache_load.cancel()
+
+        self.refresh_catalog.cancel()
+
+    def _save_catalog(self, catalog: CatalogSnapshot) -> None:
+        if self.catalog_path is None:
+            return
+
+        try:
+            write_snapshot(self.catalog_path, catalog)
+        except OSError as e:
+            logger.warning(f"Could not write catalog snapshot: {e}")
+
+    async def wait_for_aliases(self) -> None:
+        """Waits until the alias cache is loaded.
+
+        If loading failed, e.g. because the database was briefly unavailable,
+        it is started again. Raises the exception that loading failed with, if
+        it did.
+        """
+        if (task := self._alias_cache_load) is None:
+            return
+
+        if task.done() and not task.cancelled() and task.exception() is not None:
+            task = self._alias_cache_load = asyncio.create_task(
+                self._load_alias_cache()
+            )
+
+        await asyncio.shield(task)
+
+    async def _load_alias_cache(self) -> None:
+        start = time.perf_counter()
+
+        async with self.bot.begin_read_session() as session:
+            catalog, from_snapshot = await load_snapshot(session, self.catalog_path)
+
+        self._set_catalog(catalog)
+
+        if not from_snapshot:
+            await asyncio.to_thread(self._save_catalog, catalog)
+
+        logger.info(
+            f"Loaded {len(self.alias_index)} aliases from "
+            f"{'snapshot' if from_snapshot else 'database'} "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
 
     async def _reload_alias_cache(self) -> None:
-        async with self.bot.begin_db_session() as session:
-            stmt = select(Song).options(joinedload(Song.aliases))
-            songs = (await session.execute(stmt)).scalars().unique()
+        async with self._alias_cache_lock:
+            async with self.bot.begin_read_session() as session:
+                catalog = await build_snapshot(session)
+
+            self._set_catalog(catalog)
+            await asyncio.to_thread(self._save_catalog, catalog)
 
-        self.alias_cache.clear()
+    def _set_catalog(self, catalog: CatalogSnapshot) -> None:
+        # key: song ID
+        aliases: dict[int, list[CatalogAlias]] = {}
+        for alias in catalog.aliases:
+            aliases.setdefault(alias.song_id, []).append(alias)
 
+        entries: list[tuple[Optional[int], str, str, int, int]] = []
         titles = set()
 
-        for song in songs:
+        for song in catalog.songs:
             if song.title in titles:
                 continue
 
             titles.add(song.title)
 
-            self.alias_cache.append(
-                CachedAlias(None, song.title, song.title, song.id, -1)
+            entries.append((None, song.title, song.title, song.id, -1))
+            entries.extend(
+                (alias.rowid, alias.alias, song.title, alias.song_id, alias.guild_id)
+                for alias in aliases.get(song.id, [])
             )
 
-            for alias in song.aliases:
-                self.alias_cache.append(
-                    CachedAlias(
-                        alias.rowid,
-                        alias.alias,
-                        song.title,
-                        alias.song_id,
-                        alias.guild_id,
-                    )
-                )
+        self.alias_index = AliasIndex(entries)
 
     async def guild_prefix(self, ctx: Context) -> str:
         default_prefix: str = config.bot.default_prefix
@@ -122,7 +213,7 @@ class UtilsCog(commands.Cog, name="Utils"):
         return clal
 
     async def fetch_cookie(self, id: int) -> LWPCookieJar | None:
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             stmt = select(Cookie).where(Cookie.discord_id == id)
             cookie = (await session.execute(stmt)).scalar_one_or_none()
 
@@ -137,11 +228,22 @@ class UtilsCog(commands.Cog, name="Utils"):
         return jar
 
     @contextlib.asynccontextmanager
-    async def chuninet(self, ctx_or_id: Context | int):
+    async def chuninet(
+        self, ctx_or_id: Context | int, *, priority: Priority = Priority.INTERACTIVE
+    ):
         id = ctx_or_id if isinstance(ctx_or_id, int) else ctx_or_id.author.id
         jar = await self.login_check(ctx_or_id)
 
-        session = ChuniNet(jar)
+        session = ChuniNet(
+            jar,
+            priority=priority,
+            user_key=id,
+            transport=(
+                self.bot.chunithm_net_transport()
+                if self.bot.chunithm_net_transport is not None
+                else None
+            ),
+        )
         try:
             yield session
         finally:
@@ -155,7 +257,46 @@ class UtilsCog(commands.Cog, name="Utils"):
 
             await session.close()
 
+    async def cached_page(
+        self,
+        ctx_or_id: Context | int,
+        page: str,
+        fetch: Callable[[ChuniNet], Awaitable[U]],
+    ) -> U:
+        """Returns a parsed CHUNITHM-NET page for a user, fetching it with
+        `fetch` if it is not in the page cache.
+
+        Every call gets its own copy of the page, since callers modify records
+        in place, e.g. when hydrating them.
+
+        Parameters
+        ----------
+        ctx_or_id: Context | int
+            The command context or the Discord ID of the user.
+        page: str
+            Name of the page, used as part of the cache key.
+        fetch: Callable[[ChuniNet], Awaitable[U]]
+            Fetches the page, e.g. `ChuniNet.best30`.
+        """
+        id = ctx_or_id if isinstance(ctx_or_id, int) else ctx_or_id.author.id
+
+        if (cached := self.page_cache.get((id, page))) is not None:
+            return copy.deepcopy(cached)
+
+        async with self.chuninet(ctx_or_id) as client:
+            result = await fetch(client)
+
+        self.page_cache.set((id, page), copy.deepcopy(result))
+        return result
+
+    def invalidate_pages(self, id: int) -> None:
+        self.page_cache.invalidate(lambda key: key[0] == id)
+
     async def hydrate_records(self, records: Sequence[T]) -> list[T]:
+        with span("hydrate_records", count=len(records)):
+            return await self._hydrate_records(records)
+
+    async def _hydrate_records(self, records: Sequence[T]) -> list[T]:
         song_ids = set()
         jackets = set()
 
@@ -169,7 +310,7 @@ class UtilsCog(commands.Cog, name="Utils"):
             else:
                 raise MissingDetailedParams
 
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             stmt = (
                 select(Song)
                 .where(Song.id.in_(song_ids) | Song.jacket.in_(jackets))
@@ -203,6 +344,9 @@ class UtilsCog(commands.Cog, name="Utils"):
             if record.jacket is None:
                 record.jacket = get_jacket_url(song)
 
+            if song_id is None:
+                record.extras[KEY_SONG_ID] = song.id
+
             chart = next(
                 (
                     c
@@ -252,6 +396,149 @@ class UtilsCog(commands.Cog, name="Utils"):
     async def hydrate_record(self, record: T) -> T:
         return (await self.hydrate_records([record]))[0]
 
+    async def rating_engine(self, id: int) -> Optional[RatingEngine]:
+        """Returns a user's rating engine, restoring it from the database if
+        needed, or None if it was never seeded."""
+        if (engine := self.rating_engines.get(id)) is not None:
+            return engine
+
+        async with self.bot.begin_read_session() as session:
+            stmt = select(Cookie.rating_state).where(Cookie.discord_id == id)
+            data = (await session.execute(stmt)).scalar_one_or_none()
+
+        if data is None:
+            return None
+
+        state = RatingState.loads(data)
+        # Hydrated in place, all at once.
+        await self.hydrate_records([*state.best, *state.recent])
+
+        engine = self.rating_engines[id] = RatingEngine.from_state(state)
+        return engine
+
+    async def _save_rating_engine(self, id: int, engine: RatingEngine) -> None:
+        self.rating_engines[id] = engine
+
+        async with self.bot.begin_db_session() as session, session.begin():
+            await session.execute(
+                update(Cookie)
+                .where(Cookie.discord_id == id)
+                .values(rating_state=engine.state().dumps())
+            )
+
+    def forget_rating_engine(self, id: int) -> None:
+        """Drops the in-memory rating engine of a user, e.g. after they logged
+        out or logged in with another account."""
+        self.rating_engines.pop(id, None)
+
+    def _is_synced(self, engine: RatingEngine) -> bool:
+        # A synced engine replaces the best30 page, so it goes stale as
+        # quickly as the page would in the page cache.
+        return (
+            engine.synced_at is not None
+            and (
+                datetime.datetime.now(datetime.timezone.utc) - engine.synced_at
+            ).total_seconds()
+            < self.page_cache.ttl
+        )
+
+    async def sync_rating(
+        self, id: int, playlog: Sequence[RecentRecord]
+    ) -> Optional["RatingDelta"]:
+        """Ingests the plays of a user's playlog (all of it, newest first, as
+        returned by `ChuniNet.recent_record`) that their rating engine hasn't
+        seen yet.
+
+        Returns what changed, or None if the user has no rating engine.
+        """
+        if (engine := await self.rating_engine(id)) is None:
+            return None
+
+        plays, marker = plays_since(playlog, engine.marker)
+
+        if engine.marker is not None and 0 < len(plays) == len(playlog):
+            # The last ingested play fell off the playlog, so plays may have been
+            # missed. The engine is seeded again on the next best30.
+            logger.info(f"Lost track of the playlog of user {id}, dropping rating")
+            self.forget_rating_engine(id)
+            async with self.bot.begin_db_session() as session, session.begin():
+                await session.execute(
+                    update(Cookie)
+                    .where(Cookie.discord_id == id)
+                    .values(rating_state=None)
+                )
+            return None
+
+        delta = engine.ingest(reversed(await self.hydrate_records(plays)))
+        engine.marker = marker
+        engine.synced_at = datetime.datetime.now(datetime.timezone.utc)
+
+        # Polls mostly find nothing new, so those only refresh `synced_at` in
+        # memory. A restart then scrapes the frames once before trusting them.
+        if len(plays) > 0:
+            await self._save_rating_engine(id, engine)
+
+        return delta
+
+    async def seed_rating_engine(self, id: int, best30: Sequence[Record]) -> None:
+        """Replaces the best frame of a user's rating engine with a freshly
+        scraped one, logging any drift between the two.
+
+        `best30` must be hydrated.
+        """
+        engine = await self.rating_engine(id)
+
+        if engine is not None:
+            result = engine.verify(best30)
+
+            if not result.ok:
+                logger.warning(
+                    "Local best frame for user %d drifted from CHUNITHM-NET (expected %s, got %s, %d missing, %d extra)",
+                    id,
+                    result.expected_total,
+                    result.actual_total,
+                    len(result.missing),
+                    len(result.extra),
+                )
+
+        seeded = RatingEngine.from_records(
+            best30, engine.recent_plays() if engine is not None else ()
+        )
+        # Plays up to the marker are part of the scraped frame too, and later
+        # ones are still ingested on the next sync. The engine isn't synced
+        # though, since the recent frame may be missing plays.
+        seeded.marker = engine.marker if engine is not None else None
+        await self._save_rating_engine(id, seeded)
+
+    async def best30(self, ctx_or_id: Context | int) -> list[Record]:
+        """Returns the hydrated best frame of a user.
+
+        It is computed locally if their rating engine is synced, and scraped
+        from CHUNITHM-NET (seeding the engine) otherwise.
+        """
+        id = ctx_or_id if isinstance(ctx_or_id, int) else ctx_or_id.author.id
+
+        if (engine := await self.rating_engine(id)) is not None and self._is_synced(
+            engine
+        ):
+            return engine.best()
+
+        best30 = await self.cached_page(ctx_or_id, "best30", lambda x: x.best30())
+        best30 = await self.hydrate_records(best30)
+        await self.seed_rating_engine(id, best30)
+
+        return best30
+
+    async def recent10(self, ctx_or_id: Context | int) -> list[Record]:
+        """Returns the hydrated recent frame of a user.
+
+        This is always scraped from CHUNITHM-NET: the rating engine only
+        approximates the recent frame, which is fine for rating deltas but
+        not for showing to users as their actual recent frame.
+        """
+        recent10 = await self.cached_page(ctx_or_id, "recent10", lambda x: x.recent10())
+        return await self.hydrate_records(recent10)
+
     async def find_song(
         self,
         query: str,
@@ -275,18 +562,13 @@ class UtilsCog(commands.Cog, name="Utils"):
         tuple[Song, Alias | None, float]
             The third item is the similarity of the matched song.
         """
-        aliases = [
-            x for x in self.alias_cache if x.guild_id == -1 or x.guild_id == guild_id
-        ]
-        (_, similarity, index) = process.extractOne(
-            query,
-            [x.alias for x in aliases],
-            scorer=fuzz.QRatio,
-            processor=str.lower,
-        )
-        matching_alias = aliases[index]
+        await self.wait_for_aliases()
 
-        async with self.bot.begin_db_session() as session:
+        if (match := self.alias_index.extract_one(query, guild_id)) is None:
+            return None, None, 0
+        matching_alias, similarity = match
+
+        async with self.bot.begin_read_session() as session:
             condition = Song.id == matching_alias.song_id
 
             if worlds_end:
@@ -313,16 +595,13 @@ class UtilsCog(commands.Cog, name="Utils"):
         load_charts: bool = False,
         available: Optional[bool] = None,
     ) -> SongSearchResult:
-        aliases = [x for x in self.alias_cache if x.guild_id in {-1, guild_id}]
-        (_, similarity, index) = process.extractOne(
-            query,
-            [x.alias for x in aliases],
-            scorer=fuzz.QRatio,
-            processor=str.lower,
-        )
-        matching_alias = aliases[index]
+        await self.wait_for_aliases()
+
+        if (match := self.alias_index.extract_one(query, guild_id)) is None:
+            return SongSearchResult(songs=[], matched_alias=None, similarity=0)
+        matching_alias, similarity = match
 
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             cond = Song.title == matching_alias.title
 
             if available is not None:
@@ -345,18 +624,39 @@ class UtilsCog(commands.Cog, name="Utils"):
             songs=list(songs), matched_alias=alias, similarity=similarity
         )
 
-    # maimai and CHUNITHM NET goes under maintenance every day at 2:00 AM JST, so we update the DB then
-    #
-    # job is currently disabled until CHUNITHM SUN PLUS reaches international
-    # @tasks.loop(time=time(hour=17, tzinfo=timezone.utc))
-    async def update_chunirec_db(self):
-        # Disable all commands while updating the DB
-        for cmd in self.bot.walk_commands():
-            cmd.enabled = False
-        # await update_db(self.bot.db)
-        # Re-enable all commands
-        for cmd in self.bot.walk_commands():
-            cmd.enabled = True
+    # maimai and CHUNITHM-NET are under maintenance every day at 2:00 AM JST,
+    # so the catalog is refreshed then.
+    @tasks.loop(time=datetime.time(hour=17, tzinfo=datetime.timezone.utc))
+    async def refresh_catalog(self):
+        """Refreshes songs and charts from chunirec and sdvx.in.
+
+        The new catalog is imported into a shadow copy of the database and
+        swapped in once it is complete, so commands keep using the current one
+        until then.
+        """
+        # Imported here, since the importers are only needed once a day.
+        from dbutils.refresh import refresh_catalog
+
+        if (database := database_path(config.bot.db_connection_string)) is None:
+            logger.warning("Catalog refreshes are only supported on SQLite")
+            return
+
+        start = time.perf_counter()
+        try:
+            diffs = await refresh_catalog(
+                logger, database, cache_dir=config.catalog.cache_dir
+            )
+        except Exception:  # noqa: BLE001
+            logger.exception("Catalog refresh failed, keeping the current catalog")
+            return
+
+        if sum(len(x) for x in diffs) > 0:
+            await self._reload_alias_cache()
+
+        logger.info(
+            f"Refreshed catalog in {time.perf_counter() - start:.1f}s "
+            f"({'; '.join(x.summary() for x in diffs)})"
+        )
 
 
 async def setup(bot: "ChuniBot"):
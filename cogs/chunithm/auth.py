@@ -60,6 +60,9 @@ class AuthCog(commands.Cog, name="Auth"):
             stmt = delete(Cookie).where(Cookie.discord_id == ctx.author.id)
             await session.execute(stmt)
             await session.commit()
+
+        self.utils.invalidate_pages(ctx.author.id)
+        self.utils.forget_rating_engine(ctx.author.id)
         await ctx.reply(msg, mention_author=False)
 
     async def _verify_and_login(self, id: int, clal: str) -> Optional[Exception]:
@@ -87,7 +90,7 @@ class AuthCog(commands.Cog, name="Auth"):
         jar = LWPCookieJar()
         jar.set_cookie(cookie)
 
-        async with ChuniNet(jar) as client:
+        async with ChuniNet(jar, user_key=id) as client:
             try:
                 await client.authenticate()
             except ChuniNetException as e:
@@ -95,9 +98,18 @@ class AuthCog(commands.Cog, name="Auth"):
 
         async with self.bot.begin_db_session() as session, session.begin():
             await session.merge(
-                Cookie(discord_id=id, cookie=f"#LWP-Cookies-2.0\n{jar.as_lwp_str()}")
+                Cookie(
+                    discord_id=id,
+                    cookie=f"#LWP-Cookies-2.0\n{jar.as_lwp_str()}",
+                    # It may be a different CHUNITHM-NET account.
+                    rating_state=None,
+                    kamaitachi_marker=None,
+                )
             )
-            return None
+
+        self.utils.invalidate_pages(id)
+        self.utils.forget_rating_engine(id)
+        return None
 
     @commands.hybrid_command("login")
     async def login(self, ctx: Context, clal: Optional[str] = None):
@@ -6,10 +6,12 @@ import discord
 import httpx
 from discord.ext import commands
 from discord.ext.commands import Context
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from chunithm_net.consts import KEY_SONG_ID
+from chunithm_net.limiter import Priority
 from chunithm_net.models.enums import ClearType, ComboType, Difficulty, SkillClass
+from chunithm_net.models.record import PlaylogMarker, plays_since
 from database.models import Cookie
 from utils import json_dumps, json_loads
 from utils.config import config
@@ -88,7 +90,7 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
 
     @kamaitachi.command("link", aliases=["login"])
     async def kamaitachi_link(self, ctx: Context, token: Optional[str] = None):
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             query = select(Cookie).where(Cookie.discord_id == ctx.author.id)
             cookie = (await session.execute(query)).scalar_one_or_none()
 
@@ -121,6 +123,8 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
                 raise commands.BadArgument(result)
 
             cookie.kamaitachi_token = token
+            # Syncing starts over, since this may be a different account.
+            cookie.kamaitachi_marker = None
             async with self.bot.begin_db_session() as session, session.begin():
                 await session.merge(cookie)
 
@@ -156,7 +160,7 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
 
     @kamaitachi.command("unlink", aliases=["logout"])
     async def kamaitachi_unlink(self, ctx: Context):
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             query = select(Cookie).where(Cookie.discord_id == ctx.author.id)
             cookie = (await session.execute(query)).scalar_one_or_none()
 
@@ -166,7 +170,9 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
             )
 
         cookie.kamaitachi_token = None
-        async with self.bot.begin_db_session() as session:
+        # A different Kamaitachi account may be linked next.
+        cookie.kamaitachi_marker = None
+        async with self.bot.begin_db_session() as session, session.begin():
             await session.merge(cookie)
 
         return await ctx.reply(
@@ -198,7 +204,7 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
             Default is `recent`.
         """
 
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             query = select(Cookie).where(Cookie.discord_id == ctx.author.id)
             cookie = (await session.execute(query)).scalar_one_or_none()
 
@@ -219,15 +225,27 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
             "Fetching scores from CHUNITHM-NET...", mention_author=False
         )
         async with self.utils.chuninet(
-            ctx
+            ctx, priority=Priority.BULK
         ) as chuni_client, httpx.AsyncClient() as tachi_client:
             tachi_client.headers["User-Agent"] = self.user_agent
             tachi_client.headers["Authorization"] = f"Bearer {cookie.kamaitachi_token}"
 
-            profile = await chuni_client.player_data()
+            playlog = None
+            marker = None
 
             if sync == "recent":
-                recents = await chuni_client.recent_record()
+                playlog = await chuni_client.recent_record()
+                recents, marker = plays_since(
+                    playlog,
+                    PlaylogMarker.from_dict(json_loads(cookie.kamaitachi_marker))
+                    if cookie.kamaitachi_marker is not None
+                    else None,
+                )
+
+                if len(recents) == 0:
+                    return await message.edit(
+                        content="No new scores since the last sync."
+                    )
 
                 for recent in recents:
                     if recent.difficulty == Difficulty.WORLDS_END:
@@ -311,6 +329,8 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
 
                         scores.append(score_data)
 
+            profile = await chuni_client.player_data()
+
             await message.edit(content="Uploading scores to Kamaitachi...")
 
             request_body = {
@@ -365,11 +385,30 @@ class KamaitachiCog(commands.Cog, name="Kamaitachi", command_attrs={"hidden": Tr
                     continue
 
                 if data["body"]["importStatus"] == "completed":
+                    if marker is not None:
+                        async with self.bot.begin_db_session() as session, session.begin():
+                            await session.execute(
+                                update(Cookie)
+                                .where(Cookie.discord_id == ctx.author.id)
+                                .values(kamaitachi_marker=json_dumps(marker.to_dict()))
+                            )
+
+                    # Only once the plays are committed to Kamaitachi, so a
+                    # failed import that is retried doesn't ingest them twice.
+                    rating = (
+                        await self.utils.sync_rating(ctx.author.id, playlog)
+                        if playlog is not None
+                        else None
+                    )
+
                     msg = f"{data['description']} {len(data['body']['import']['scoreIDs'])} scores"
 
                     if len(data["body"]["import"]["errors"]) > 0:
                         msg += f", {len(data['body']['import']['errors'])} errors"
 
+                    if rating is not None and rating.rating != 0:
+                        msg += f"\nRating: {rating.rating_after:.2f} ({rating.rating:+.2f})"
+
                     return await message.edit(content=msg)
 
 
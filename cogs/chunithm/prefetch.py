@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Optional
+
+from discord.ext import commands
+from discord.ext.commands import Context
+
+from chunithm_net.exceptions import InvalidTokenException, MaintenanceException
+from chunithm_net.limiter import Priority
+from chunithm_net.models.record import plays_since
+from chunithm_net.utils import maintenance_end
+from utils.config import config
+from utils.logging import logger
+
+if TYPE_CHECKING:
+    from bot import ChuniBot
+    from chunithm_net.models.record import PlaylogMarker
+    from cogs.botutils import UtilsCog
+
+
+class PrefetchCog(commands.Cog, name="Prefetch"):
+    """Polls the playlog of recently active users in the background, feeding
+    new plays to their rating engine (which b30 and r10 are computed from) and
+    refreshing their profile page."""
+
+    def __init__(self, bot: "ChuniBot") -> None:
+        if not config.prefetch.enable:
+            msg = "Prefetching is not enabled"
+            raise ValueError(msg)
+
+        self.bot = bot
+        self.utils: "UtilsCog" = bot.get_cog("Utils")  # type: ignore[reportGeneralTypeIssues]
+
+        self.interval = config.prefetch.interval
+        self.jitter = config.prefetch.jitter
+        self.active_window = config.prefetch.active_window
+
+        # key: user discord ID
+        # value: time.monotonic() of the user's last command
+        self.last_active: dict[int, float] = {}
+        # key: user discord ID
+        # value: time.monotonic() when the user should be polled next
+        self.next_poll: dict[int, float] = {}
+        # key: user discord ID
+        # value: newest play seen by the prefetcher. Kept separately from other
+        # consumers of the playlog, so that polling does not hide new plays from them.
+        self.playlog_markers: dict[int, PlaylogMarker] = {}
+
+        self.queue: asyncio.Queue[int] = asyncio.Queue()
+        self.queued: set[int] = set()
+
+        self.tasks: list[asyncio.Task] = []
+        self.worker_count = config.prefetch.workers
+
+    async def cog_load(self) -> None:
+        self.tasks.append(asyncio.create_task(self._dispatcher()))
+        self.tasks.extend(
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        )
+
+    async def cog_unload(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: Context):
+        # Arguments are only parsed by now, and `b30 @user` looks at another
+        # user's scores.
+        user = ctx.kwargs.get("user")
+        self.track(user.id if user is not None else ctx.author.id)
+
+    def track(self, id: int):
+        """Marks a user as active, so they are polled for a while."""
+        now = time.monotonic()
+        self.last_active[id] = now
+        self.next_poll.setdefault(id, now + self._jittered_interval())
+
+    def _jittered_interval(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _dispatcher(self):
+        while True:
+            await asyncio.sleep(min(5.0, self.interval / 4))
+
+            if (end := maintenance_end(datetime.now(timezone.utc))) is not None:
+                delay = (end - datetime.now(timezone.utc)).total_seconds()
+                logger.info(
+                    "CHUNITHM-NET is under maintenance, pausing prefetch for %.0fs",
+                    delay,
+                )
+                await asyncio.sleep(delay + random.uniform(0, self.interval))
+                continue
+
+            now = time.monotonic()
+
+            for id, last_active in list(self.last_active.items()):
+                if now - last_active > self.active_window:
+                    self._forget(id)
+                    continue
+
+                if id in self.queued or self.next_poll.get(id, 0) > now:
+                    continue
+
+                self.next_poll[id] = now + self._jittered_interval()
+                self.queued.add(id)
+                self.queue.put_nowait(id)
+
+    def _forget(self, id: int):
+        self.last_active.pop(id, None)
+        self.next_poll.pop(id, None)
+        self.playlog_markers.pop(id, None)
+
+    async def _worker(self):
+        while True:
+            id = await self.queue.get()
+
+            try:
+                await self.poll(id)
+            except MaintenanceException:
+                pass
+            except (InvalidTokenException, commands.BadArgument):
+                # BadArgument is raised by UtilsCog.login_check() if the user
+                # logged out in the meantime.
+                self._forget(id)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Prefetching for user {id} failed: {e!r}")
+            finally:
+                self.queued.discard(id)
+                self.queue.task_done()
+
+    async def poll(self, id: int) -> Optional[int]:
+        """Checks a user's playlog, syncing their rating engine and refreshing
+        their cached profile if there are new plays.
+
+        Returns the number of new plays, or None if the user was polled for
+        the first time.
+        """
+        marker = self.playlog_markers.get(id)
+
+        async with self.utils.chuninet(id, priority=Priority.BACKGROUND) as client:
+            playlog = await client.recent_record()
+            recents, new_marker = plays_since(playlog, marker)
+
+            if new_marker is None:
+                # Empty playlog.
+                return 0
+
+            self.playlog_markers[id] = new_marker
+
+            if await self.utils.rating_engine(id) is None:
+                # From here on, best30 is computed from the playlog instead
+                # of being scraped.
+                best30 = await self.utils.hydrate_records(await client.best30())
+                await self.utils.seed_rating_engine(id, best30)
+
+            # Even without new plays, this marks the rating engine as synced.
+            rating = await self.utils.sync_rating(id, playlog)
+
+            # On the first poll there is no way to tell whether the user played
+            # since their profile was last cached, so it is always refreshed.
+            if marker is not None and len(recents) == 0:
+                return 0
+
+            player_data = await client.player_data()
+
+        self.utils.page_cache.set((id, "player_data"), player_data)
+
+        if marker is None:
+            return None
+
+        logger.debug(
+            f"Prefetched pages for user {id} after {len(recents)} new plays"
+            + (f", rating {rating.rating:+.2f}" if rating is not None else "")
+        )
+
+        return len(recents)
+
+
+async def setup(bot: "ChuniBot"):
+    await bot.add_cog(PrefetchCog(bot))
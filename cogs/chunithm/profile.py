@@ -7,7 +7,6 @@ from typing import TYPE_CHECKING, Optional
 import discord
 from discord.ext import commands
 from discord.ext.commands import Context
-from PIL import Image
 
 from chunithm_net.exceptions import ChuniNetError
 from utils.views.profile import ProfileView
@@ -89,6 +88,10 @@ AVATAR_COORDS = {
 
 
 def render_avatar(items: dict[str, bytes]) -> BytesIO:
+    # Pillow is slow to import and only needed here, so it is imported on
+    # first use instead of when the bot starts.
+    from PIL import Image
+
     avatar = Image.open(BytesIO(items["base"]))
 
     # crop out the USER AVATAR text at the top
@@ -164,10 +167,12 @@ class ProfileCog(commands.Cog, name="Profile"):
     ):
         """View your CHUNITHM profile."""
 
-        async with ctx.typing(), self.utils.chuninet(
-            ctx if user is None else user.id
-        ) as client:
-            player_data = await client.player_data()
+        async with ctx.typing():
+            player_data = await self.utils.cached_page(
+                ctx if user is None else user.id,
+                "player_data",
+                lambda client: client.player_data(),
+            )
 
             optional_data: list[str] = []
             if player_data.team is not None:
@@ -229,6 +234,7 @@ class ProfileCog(commands.Cog, name="Profile"):
         async with ctx.typing(), self.utils.chuninet(ctx) as client:
             try:
                 await client.change_player_name(new_name)
+                self.utils.invalidate_pages(ctx.author.id)
                 await ctx.reply("Your username has been changed.", mention_author=False)
             except ValueError as e:
                 msg = str(e)
@@ -1,6 +1,9 @@
+import asyncio
 import contextlib
 import itertools
 from argparse import ArgumentError
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from typing import TYPE_CHECKING, Literal, Optional, cast
 
 import discord
@@ -23,22 +26,48 @@ from chunithm_net.models.enums import Difficulty, Genres, Rank
 from database.models import SongJacket
 from utils import did_you_mean_text, shlex_split
 from utils.argparse import DiscordArguments
-from utils.components import ScoreCardEmbed
+from utils.b30_card import AssetCache, jacket_key, render_b30_card
+from utils.config import config
 from utils.constants import SIMILARITY_THRESHOLD
+from utils.tracing import span
 from utils.views import B30View, CompareView, RecentRecordsView, SelectToCompareView
 
 if TYPE_CHECKING:
+    from collections.abc import Sequence
+
     from bot import ChuniBot
+    from chunithm_net.models.record import Record
     from cogs.autocompleters import AutocompletersCog
     from cogs.botutils import UtilsCog
 
 
+class Best30Flags(commands.FlagConverter):
+    image: bool = commands.flag(
+        default=False, aliases=["i"], description="Show all scores in one image."
+    )
+    recent: bool = commands.flag(
+        default=False,
+        aliases=["r"],
+        description="Also show recent 10 scores in the image.",
+    )
+
+
 class RecordsCog(commands.Cog, name="Records"):
     def __init__(self, bot: "ChuniBot") -> None:
         self.bot = bot
         self.utils: "UtilsCog" = self.bot.get_cog("Utils")  # type: ignore[reportGeneralTypeIssues]
         self.autocompleters: "AutocompletersCog" = self.bot.get_cog("Autocompleters")  # type: ignore[reportGeneralTypeIssues]
 
+        # Images are rendered in their own threads, so that a burst of them
+        # can't take over the default executor.
+        self.assets = AssetCache(config.rendering.asset_dir, font=config.rendering.font)
+        self.render_executor = ThreadPoolExecutor(
+            config.rendering.workers, thread_name_prefix="render"
+        )
+
+    async def cog_unload(self) -> None:
+        self.render_executor.shutdown(wait=False, cancel_futures=True)
+
     @commands.hybrid_command(name="recent", aliases=["rs"])
     async def recent(
         self, ctx: Context, *, user: Optional[discord.User | discord.Member] = None
@@ -70,10 +99,12 @@ class RecordsCog(commands.Cog, name="Records"):
             )
             view.message = await ctx.reply(
                 content=f"Most recent credits for {userinfo.name}:",
-                embeds=view.format_score_page(view.items[0]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
+            view.prefetch_detailed_records()
 
     @commands.hybrid_command("compare", aliases=["c"])
     async def compare(
@@ -91,7 +122,7 @@ class RecordsCog(commands.Cog, name="Records"):
             The user to compare with. Defaults to the author.
         """
 
-        async with ctx.typing(), self.bot.begin_db_session() as session, self.utils.chuninet(
+        async with ctx.typing(), self.utils.chuninet(
             ctx if user is None else user.id
         ) as client:
             if ctx.message.reference is not None:
@@ -142,7 +173,10 @@ class RecordsCog(commands.Cog, name="Records"):
                 .where(SongJacket.jacket_url.in_(thumbnail_urls))
                 .options(joinedload(SongJacket.song))
             )
-            jackets = (await session.execute(sql)).scalars().all()
+            # The session is only held for the query, since the rest of the
+            # command waits on Discord and CHUNITHM-NET.
+            async with self.bot.begin_read_session() as session:
+                jackets = (await session.execute(sql)).scalars().all()
 
             if len(jackets) == 0:
                 await ctx.reply("No song found.", mention_author=False)
@@ -213,16 +247,18 @@ class RecordsCog(commands.Cog, name="Records"):
                 view.message = compare_message
                 await compare_message.edit(
                     content=f"Top play for {userinfo.name}",
-                    embed=ScoreCardEmbed(view.items[view.page]),
+                    **view.get_page(),
                     view=view,
                 )
+                view.prerender_adjacent_pages()
                 return
             view.message = await ctx.reply(
                 content=f"Top play for {userinfo.name}",
-                embed=ScoreCardEmbed(view.items[view.page]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
             return
 
     async def song_title_autocomplete(
@@ -313,21 +349,27 @@ class RecordsCog(commands.Cog, name="Records"):
             if select_message is None:
                 view.message = await ctx.reply(
                     content=f"Top play for {userinfo.name}",
-                    embed=ScoreCardEmbed(view.items[view.page]),
+                    **view.get_page(),
                     view=view,
                     mention_author=False,
                 )
+                view.prerender_adjacent_pages()
             else:
                 view.message = await select_message.edit(
                     content=f"Top play for {userinfo.name}",
-                    embed=ScoreCardEmbed(view.items[view.page]),
+                    **view.get_page(),
                     view=view,
                 )
+                view.prerender_adjacent_pages()
             return None
 
     @commands.hybrid_command("best30", aliases=["b30"])
     async def best30(
-        self, ctx: Context, *, user: Optional[discord.User | discord.Member] = None
+        self,
+        ctx: Context,
+        user: Optional[discord.User | discord.Member] = None,
+        *,
+        flags: Best30Flags,
     ):
         """View top plays
 
@@ -337,19 +379,56 @@ class RecordsCog(commands.Cog, name="Records"):
             The user to get scores for.
         """
 
-        async with ctx.typing(), self.utils.chuninet(
-            ctx if user is None else user.id
-        ) as client:
-            best30 = await client.best30()
-            best30 = await self.utils.hydrate_records(best30)
+        async with ctx.typing():
+            best30 = await self.utils.best30(ctx if user is None else user.id)
+
+            if flags.image:
+                recent10 = []
+                if flags.recent:
+                    recent10 = await self.utils.recent10(
+                        ctx if user is None else user.id
+                    )
+
+                name = (user or ctx.author).display_name
+                card = await self.render_b30_card(
+                    best30, recent10, title=f"{name}'s best scores"
+                )
+                await ctx.reply(
+                    file=discord.File(BytesIO(card), filename="b30.png"),
+                    mention_author=False,
+                )
+                return
 
             view = B30View(ctx, best30)
             view.message = await ctx.reply(
-                content=view.format_content(),
-                embeds=view.format_page(view.items[: view.per_page]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
+
+    async def render_b30_card(
+        self, best30: "Sequence[Record]", recent10: "Sequence[Record]", *, title: str
+    ) -> bytes:
+        records = [*best30, *recent10]
+        await self.assets.download_jackets(record.jacket for record in records)
+
+        def render() -> bytes:
+            jackets = self.assets.load_jackets(
+                jacket_key(record.jacket) for record in records
+            )
+            return render_b30_card(
+                best30,
+                recent10,
+                title=title,
+                jackets=jackets,
+                fonts=self.assets.fonts(),
+            )
+
+        with span("render.b30_card"):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.render_executor, render
+            )
 
     @commands.hybrid_command("recent10", aliases=["r10"])
     async def recent10(
@@ -363,19 +442,16 @@ class RecordsCog(commands.Cog, name="Records"):
             The user to get scores for.
         """
 
-        async with ctx.typing(), self.utils.chuninet(
-            ctx if user is None else user.id
-        ) as client:
-            recent10 = await client.recent10()
-            recent10 = await self.utils.hydrate_records(recent10)
+        async with ctx.typing():
+            recent10 = await self.utils.recent10(ctx if user is None else user.id)
 
             view = B30View(ctx, recent10)
             view.message = await ctx.reply(
-                content=view.format_content(),
-                embeds=view.format_page(view.items[: view.per_page]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
 
     @app_commands.command(name="top", description="View your best scores for a level.")
     @app_commands.describe(
@@ -487,10 +563,10 @@ class RecordsCog(commands.Cog, name="Records"):
             ctx = await Context.from_interaction(interaction)
             view = B30View(ctx, records, show_average=False)
             view.message = await ctx.reply(
-                content=view.format_content(),
-                embeds=view.format_page(view.items[: view.per_page]),
+                **view.get_page(),
                 view=view,
             )
+            view.prerender_adjacent_pages()
             return None
 
     @commands.command("top")
@@ -693,11 +769,11 @@ class RecordsCog(commands.Cog, name="Records"):
 
             view = B30View(ctx, records, show_average=False)
             view.message = await ctx.reply(
-                content=view.format_content(),
-                embeds=view.format_page(view.items[: view.per_page]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
             return None
 
 
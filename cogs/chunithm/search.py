@@ -61,8 +61,9 @@ class SearchCog(commands.Cog, name="Search"):
             msg = "Please enter a valid level or chart constant."
             raise commands.BadArgument(msg) from None
 
-        async with ctx.typing(), self.bot.begin_db_session() as session:
-            charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
+        async with ctx.typing():
+            async with self.bot.begin_read_session() as session:
+                charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
 
             if len(charts) == 0:
                 await ctx.reply("No charts found.", mention_author=False)
@@ -70,10 +71,11 @@ class SearchCog(commands.Cog, name="Search"):
 
             view = SonglistView(ctx, charts)
             view.message = await ctx.reply(
-                embed=view.format_songlist(view.items[: view.per_page]),
+                **view.get_page(),
                 view=view,
                 mention_author=False,
             )
+            view.prerender_adjacent_pages()
 
     @commands.hybrid_command("addalias")
     async def addalias(
@@ -119,7 +121,49 @@ class SearchCog(commands.Cog, name="Search"):
             msg = "ctx.guild == None and global_alias == True"
             raise RuntimeError(msg)
 
-        async with ctx.typing(), self.bot.begin_db_session() as session, session.begin():
+        async with ctx.typing():
+            promoted = await self._add_alias(
+                song_title_or_alias,
+                added_alias,
+                guild_id=guild_id,
+                owner_id=ctx.author.id,
+                global_alias=global_alias,
+            )
+
+        await self.utils._reload_alias_cache()
+
+        if promoted:
+            await ctx.reply(
+                f"**{emd(added_alias)}** already exists as a guild-only alias. Promoting to global alias.",
+                mention_author=False,
+            )
+            return
+
+        alias = "an alias"
+        if global_alias:
+            alias = "a global alias"
+
+        await ctx.reply(
+            f"Added **{emd(added_alias)}** as {alias} for **{emd(song_title_or_alias)}**.",
+            mention_author=False,
+        )
+
+    async def _add_alias(
+        self,
+        song_title_or_alias: str,
+        added_alias: str,
+        *,
+        guild_id: int,
+        owner_id: int,
+        global_alias: bool,
+    ) -> bool:
+        """Adds an alias, returning whether an existing guild alias was promoted
+        to a global one instead.
+
+        The write connection is only held for the transaction, not while
+        replying on Discord.
+        """
+        async with self.bot.begin_db_session() as session, session.begin():
             stmt = (
                 select(Song)
                 .where(func.lower(Song.title) == func.lower(added_alias))
@@ -151,10 +195,7 @@ class SearchCog(commands.Cog, name="Search"):
                     for x in aliases[1:]:
                         await session.delete(x)
 
-                    return await ctx.reply(
-                        f"**{emd(added_alias)}** already exists as a guild-only alias. Promoting to global alias.",
-                        mention_author=False,
-                    )
+                    return True
             else:
                 stmt = (
                     select(Alias)
@@ -203,21 +244,11 @@ class SearchCog(commands.Cog, name="Search"):
                     alias=added_alias,
                     guild_id=guild_id,
                     song_id=song.id,
-                    owner_id=None if global_alias else ctx.author.id,
+                    owner_id=None if global_alias else owner_id,
                 )
             )
 
-        await self.utils._reload_alias_cache()
-
-        alias = "an alias"
-        if global_alias:
-            alias = "a global alias"
-
-        await ctx.reply(
-            f"Added **{emd(added_alias)}** as {alias} for **{emd(song_title_or_alias)}**.",
-            mention_author=False,
-        )
-        return None
+        return False
 
     @commands.hybrid_command("removealias")
     async def removealias(self, ctx: Context, *, removed_alias: str):
@@ -289,7 +320,7 @@ class SearchCog(commands.Cog, name="Search"):
         if song is None or similarity < SIMILARITY_THRESHOLD:
             return await ctx.reply(did_you_mean_text(song, alias), mention_author=False)
 
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             stmt = select(Alias).where(Alias.song_id == song.id)
             aliases = (await session.execute(stmt)).scalars().all()
 
@@ -366,7 +397,7 @@ class SearchCog(commands.Cog, name="Search"):
         return await self.info_inner(ctx, query=query, detailed=args.detailed)
 
     async def info_inner(self, ctx: Context, *, query: str, detailed: bool = False):
-        async with ctx.typing(), self.bot.begin_db_session() as session:
+        async with ctx.typing():
             guild_id = ctx.guild.id if ctx.guild is not None else None
             result = await self.utils.find_songs(query, guild_id=guild_id)
 
@@ -376,16 +407,22 @@ class SearchCog(commands.Cog, name="Search"):
                     mention_author=False,
                 )
 
-            song_embeds: list[Embed] = []
-
-            for song in result.songs:
+            # key: song ID
+            charts_by_song: dict[int, list[Chart]] = {}
+            async with self.bot.begin_read_session() as session:
                 stmt = (
                     select(Chart)
-                    .where(Chart.song_id == song.id)
+                    .where(Chart.song_id.in_([song.id for song in result.songs]))
                     .order_by(Chart.id)
                     .options(joinedload(Chart.sdvxin_chart_view))
                 )
-                charts = (await session.execute(stmt)).scalars().all()
+                for chart in (await session.execute(stmt)).scalars():
+                    charts_by_song.setdefault(chart.song_id, []).append(chart)
+
+            song_embeds: list[Embed] = []
+
+            for song in result.songs:
+                charts = charts_by_song.get(song.id, [])
 
                 song_description = ""
 
@@ -490,7 +527,7 @@ class SearchCog(commands.Cog, name="Search"):
 
             view = EmbedPaginationView(ctx, song_embeds)
             view.message = await ctx.reply(
-                embed=view.items[0], view=view, mention_author=False
+                **view.get_page(), view=view, mention_author=False
             )
             return None
 
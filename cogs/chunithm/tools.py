@@ -255,7 +255,7 @@ class ToolsCog(commands.Cog, name="Tools"):
             Number of charts to return. Must be between 1 and 4.
         """
 
-        async with ctx.typing(), self.bot.begin_db_session() as session:
+        async with ctx.typing():
             # Check whether input is level or constant
             stmt = (
                 select(Chart)
@@ -273,7 +273,8 @@ class ToolsCog(commands.Cog, name="Tools"):
                 msg = "Please enter a valid level or chart constant."
                 raise commands.BadArgument(msg) from None
 
-            charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
+            async with self.bot.begin_read_session() as session:
+                charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
 
             if len(charts) == 0:
                 await ctx.reply("No charts found.", mention_author=False)
@@ -313,7 +314,7 @@ class ToolsCog(commands.Cog, name="Tools"):
             assuming you're logged in.
         """
 
-        async with ctx.typing(), self.bot.begin_db_session() as session:
+        async with ctx.typing():
             if max_rating is None:
                 async with self.utils.chuninet(ctx) as client:
                     basic_player_data = await client.authenticate()
@@ -341,7 +342,8 @@ class ToolsCog(commands.Cog, name="Tools"):
                 .options(joinedload(Chart.song), joinedload(Chart.sdvxin_chart_view))
             )
 
-            charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
+            async with self.bot.begin_read_session() as session:
+                charts: Sequence[Chart] = (await session.execute(stmt)).scalars().all()
             if len(charts) == 0:
                 await ctx.reply("No charts found.", mention_author=False)
                 return
@@ -395,7 +397,7 @@ class ToolsCog(commands.Cog, name="Tools"):
             Song title to search for. You don't have to be exact; try things out!
         """
 
-        async with ctx.typing(), self.bot.begin_db_session() as session:
+        async with ctx.typing():
             guild_id = ctx.guild.id if ctx.guild else None
             song, alias, similarity = await self.utils.find_song(
                 query, guild_id=guild_id, worlds_end=False
@@ -414,7 +416,8 @@ class ToolsCog(commands.Cog, name="Tools"):
                 .options(joinedload(Chart.song), joinedload(Chart.sdvxin_chart_view))
             )
 
-            chart = (await session.execute(stmt)).scalar_one_or_none()
+            async with self.bot.begin_read_session() as session:
+                chart = (await session.execute(stmt)).scalar_one_or_none()
             if chart is None:
                 await ctx.reply(
                     "No charts found. Make sure you specified a valid chart difficulty (BAS/ADV/EXP/MAS/ULT).",
@@ -1,5 +1,7 @@
+import time
 import traceback
 from typing import TYPE_CHECKING, cast
+from weakref import WeakKeyDictionary
 
 import aiohttp
 import discord
@@ -17,18 +19,41 @@ from chunithm_net.exceptions import (
 )
 from utils.config import config
 from utils.logging import logger
+from utils.metrics import Histogram
 
 if TYPE_CHECKING:
     from bot import ChuniBot
 
 
+COMMAND_DURATION = Histogram(
+    "chuninewbot_command_duration_seconds",
+    "Command latency, from invocation to completion",
+    ["command", "outcome"],
+)
+
+
 class EventsCog(commands.Cog, name="Events"):
     def __init__(self, bot: "ChuniBot") -> None:
         self.bot = bot
 
+        self._command_start: WeakKeyDictionary[Context, float] = WeakKeyDictionary()
+
+    def _observe_command(self, ctx: Context, outcome: str):
+        start = self._command_start.pop(ctx, None)
+        if start is None or ctx.command is None:
+            return
+
+        COMMAND_DURATION.labels(ctx.command.qualified_name, outcome).observe(
+            time.perf_counter() - start
+        )
+
     @commands.Cog.listener()
     async def on_command(self, ctx: Context):
-        pass
+        self._command_start[ctx] = time.perf_counter()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: Context):
+        self._observe_command(ctx, "ok")
 
     @commands.Cog.listener()
     async def on_command_error(
@@ -39,6 +64,8 @@ class EventsCog(commands.Cog, name="Events"):
         if isinstance(error, commands.CommandNotFound):
             return None
 
+        self._observe_command(ctx, "error")
+
         exc = error
         while hasattr(exc, "original"):
             exc = exc.original  # type: ignore[reportGeneralTypeIssues]
@@ -9,7 +9,6 @@ import discord
 from aiohttp import ClientSession
 from discord.ext import commands
 from discord.ext.commands import Context
-from PIL import Image
 from rapidfuzz import fuzz
 from sqlalchemy import delete, select, text
 
@@ -39,30 +38,34 @@ class GamingCog(commands.Cog, name="Games"):
         with self.game_sessions_lock:
             self.game_sessions[ctx.channel.id] = asyncio.create_task(asyncio.sleep(0))
 
-        async with ctx.typing(), self.bot.begin_db_session() as session:
+        async with ctx.typing():
             prefix = await self.utils.guild_prefix(ctx)
 
-            stmt = (
-                select(Song)
-                .where(Song.genre != "WORLD'S END")
-                .order_by(text("RANDOM()"))
-                .limit(1)
-            )
-            song = (await session.execute(stmt)).scalar_one()
-
-            stmt = select(Alias).where(
-                (Alias.song_id == song.id)
-                & (
-                    (Alias.guild_id == -1)
-                    | (
-                        Alias.guild_id
-                        == (ctx.guild.id if ctx.guild is not None else -1)
+            async with self.bot.begin_read_session() as session:
+                stmt = (
+                    select(Song)
+                    .where(Song.genre != "WORLD'S END")
+                    .order_by(text("RANDOM()"))
+                    .limit(1)
+                )
+                song = (await session.execute(stmt)).scalar_one()
+
+                stmt = select(Alias).where(
+                    (Alias.song_id == song.id)
+                    & (
+                        (Alias.guild_id == -1)
+                        | (
+                            Alias.guild_id
+                            == (ctx.guild.id if ctx.guild is not None else -1)
+                        )
                     )
                 )
-            )
-            aliases = [song.title] + [
-                alias.alias for alias in (await session.execute(stmt)).scalars()
-            ]
+                aliases = [song.title] + [
+                    alias.alias for alias in (await session.execute(stmt)).scalars()
+                ]
+
+            # Deferred, since Pillow is slow to import and only needed here.
+            from PIL import Image
 
             jacket_url = get_jacket_url(song)
             async with ClientSession() as session, session.get(jacket_url) as resp:
@@ -158,9 +161,10 @@ class GamingCog(commands.Cog, name="Games"):
 
     @guess.command("leaderboard")
     async def guess_leaderboard(self, ctx: Context):
-        async with ctx.typing(), self.bot.begin_db_session() as session:
-            stmt = select(GuessScore).order_by(GuessScore.score.desc()).limit(10)
-            scores = (await session.execute(stmt)).scalars()
+        async with ctx.typing():
+            async with self.bot.begin_read_session() as session:
+                stmt = select(GuessScore).order_by(GuessScore.score.desc()).limit(10)
+                scores = (await session.execute(stmt)).scalars().all()
 
             embed = discord.Embed(title="Guess Leaderboard")
             description = ""
@@ -12,6 +12,7 @@ from discord.ext.commands import Context, Greedy
 from discord.utils import oauth_url
 from sqlalchemy import delete, func, select
 
+from chunithm_net.limiter import get_default_limiter
 from database.models import Cookie, Prefix
 from utils.config import config
 from utils.constants import VERSION_NAMES
@@ -66,6 +67,57 @@ class MiscCog(commands.Cog, name="Miscellaneous"):
 
         await ctx.send(f"Synced the tree to {ret}/{len(guilds)}.")
 
+    @commands.command("ratelimit", hidden=True)
+    @commands.is_owner()
+    async def ratelimit(self, ctx: Context):
+        stats = get_default_limiter().stats()
+
+        lines = []
+        for priority, pstats in stats.priorities.items():
+            average_wait = pstats.total_wait / pstats.waited if pstats.waited else 0
+            lines.append(
+                f"**{priority.name}**: {stats.queue_depth[priority]} queued, "
+                f"{pstats.acquired} requests, {pstats.waited} waited "
+                f"(avg {average_wait * 1000:.0f}ms, max {pstats.max_wait * 1000:.0f}ms)"
+            )
+
+        await ctx.reply("\n".join(lines), mention_author=False)
+
+    @commands.command("querystats", hidden=True)
+    @commands.is_owner()
+    async def querystats(
+        self,
+        ctx: Context["ChuniBot"],
+        count: int = 10,
+        sort: Literal["total", "count", "max", "average"] = "total",
+    ):
+        top = ctx.bot.query_stats.top(count, key=sort)
+
+        if len(top) == 0:
+            await ctx.reply("No queries recorded yet.", mention_author=False)
+            return
+
+        lines = []
+        for stats in top:
+            statement = stats.statement
+            if len(statement) > 200:
+                statement = statement[:197] + "..."
+
+            lines.append(
+                f"{stats.total * 1000:.0f}ms total, {stats.count} calls, "
+                f"avg {stats.average * 1000:.1f}ms, max {stats.max * 1000:.1f}ms\n"
+                f"{statement}"
+            )
+
+        content = "```\n"
+        for line in lines:
+            if len(content) + len(line) + 5 > 2000:
+                break
+            content += line + "\n\n"
+        content = content.rstrip() + "\n```"
+
+        await ctx.reply(content, mention_author=False)
+
     @commands.hybrid_command("source", aliases=["src"])
     async def source(self, ctx: Context):
         """Get the source code for this bot."""
@@ -137,7 +189,7 @@ class MiscCog(commands.Cog, name="Miscellaneous"):
 
         version_name = VERSION_NAMES.get(revision.split("-", 1)[0])
 
-        async with self.bot.begin_db_session() as session:
+        async with self.bot.begin_read_session() as session:
             users = await session.scalar(select(func.count()).select_from(Cookie))
 
         embed.add_field(
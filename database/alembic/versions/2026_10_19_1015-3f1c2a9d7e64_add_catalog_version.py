@@ -0,0 +1,45 @@
+"""Add catalog version
+
+Revision ID: 3f1c2a9d7e64
+Revises: d701d4d0c04b
+Create Date: 2026-10-19 10:15:42.118306
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9d7e64"
+down_revision: Union[str, None] = "d701d4d0c04b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ("chunirec_songs", "chunirec_charts", "aliases")
+OPERATIONS = ("INSERT", "UPDATE", "DELETE")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "catalog_version",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False),
+    )
+    op.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0)")
+
+    for table in CATALOG_TABLES:
+        for operation in OPERATIONS:
+            op.execute(
+                f"CREATE TRIGGER {table}_{operation.lower()}_catalog_version "
+                f"AFTER {operation} ON {table} "
+                "BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END"
+            )
+
+
+def downgrade() -> None:
+    for table in CATALOG_TABLES:
+        for operation in OPERATIONS:
+            op.execute(f"DROP TRIGGER {table}_{operation.lower()}_catalog_version")
+
+    op.drop_table("catalog_version")
@@ -0,0 +1,32 @@
+"""Add Music.xml manifest
+
+Revision ID: 8b0e5f2c41d3
+Revises: 3f1c2a9d7e64
+Create Date: 2026-10-19 14:32:07.551920
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b0e5f2c41d3"
+down_revision: Union[str, None] = "3f1c2a9d7e64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "music_xml_manifest",
+        sa.Column("path", sa.String, primary_key=True),
+        sa.Column("song_id", sa.Integer, nullable=True),
+        sa.Column("mtime_ns", sa.BigInteger, nullable=False),
+        sa.Column("size", sa.BigInteger, nullable=False),
+        sa.Column("sha256", sa.String, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("music_xml_manifest")
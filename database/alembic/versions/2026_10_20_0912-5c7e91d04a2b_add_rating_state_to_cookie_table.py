@@ -0,0 +1,27 @@
+"""Add rating_state to Cookie table
+
+Revision ID: 5c7e91d04a2b
+Revises: 8b0e5f2c41d3
+Create Date: 2026-10-20 09:12:41.308215
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c7e91d04a2b"
+down_revision: Union[str, None] = "8b0e5f2c41d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("cookies", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("rating_state", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("cookies", schema=None) as batch_op:
+        batch_op.drop_column("rating_state")
@@ -0,0 +1,27 @@
+"""Add kamaitachi_marker to Cookie table
+
+Revision ID: 9d2f4a6b1c87
+Revises: 5c7e91d04a2b
+Create Date: 2026-10-20 10:34:17.520493
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d2f4a6b1c87"
+down_revision: Union[str, None] = "5c7e91d04a2b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("cookies", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("kamaitachi_marker", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("cookies", schema=None) as batch_op:
+        batch_op.drop_column("kamaitachi_marker")
@@ -0,0 +1,134 @@
+"""Connection management for the bot's SQLite database.
+
+Reads and writes go through separate engines:
+
+- The write engine has a single connection. Writers wait for it in the
+  connection pool, in order, instead of racing for SQLite's write lock and
+  failing with "database is locked" once the busy timeout runs out.
+- The read engine has a pool of connections with `query_only` set, so a write
+  that was sent to it by mistake fails immediately instead of taking the write
+  lock. They also use memory-mapped I/O, which saves a copy for every page read
+  by catalog and search queries.
+
+The database is in WAL mode, so reads aren't blocked by the writer and don't
+block it. The WAL is checkpointed on a schedule by `checkpoint_wal`, so that
+commits rarely have to run an automatic checkpoint themselves.
+"""
+import asyncio
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Optional
+
+import sqlalchemy.event
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.shadow import database_path
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+__all__ = ["checkpoint_wal", "create_engines"]
+
+# How long a connection waits for a lock held by another process (e.g. a
+# catalog swap), in milliseconds.
+BUSY_TIMEOUT = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+# The WAL is truncated to this size after it is checkpointed, in bytes.
+JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024
+
+WRITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT}",
+    f"PRAGMA journal_size_limit={JOURNAL_SIZE_LIMIT}",
+)
+READ_PRAGMAS = (
+    "PRAGMA query_only=1",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT}",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+)
+
+
+def _listen_connect(
+    engine: "AsyncEngine",
+    pragmas: tuple[str, ...],
+    setup: Optional[Callable[[Any], None]],
+) -> None:
+    def on_connect(conn, _):
+        for pragma in pragmas:
+            conn.execute(pragma)
+
+        if setup is not None:
+            setup(conn)
+
+    sqlalchemy.event.listen(engine.sync_engine, "connect", on_connect)
+
+
+def create_engines(
+    connection_string: str,
+    *,
+    read_connections: int = 4,
+    setup: Optional[Callable[[Any], None]] = None,
+) -> tuple["AsyncEngine", "AsyncEngine"]:
+    """Creates the engines for writing to and reading from a database.
+
+    Parameters
+    ----------
+    connection_string: str
+        The database to connect to.
+    read_connections: int
+        The number of connections reads are spread over.
+    setup: Optional[Callable[[Any], None]]
+        Called with every new DBAPI connection of either engine, e.g. to
+        register SQL functions.
+
+    Returns
+    -------
+    tuple[AsyncEngine, AsyncEngine]
+        The write engine and the read engine. For databases that aren't a
+        SQLite file, like in-memory ones, they are the same engine, since
+        connections can't share those.
+    """
+    if database_path(connection_string) is None:
+        engine = create_async_engine(connection_string)
+        _listen_connect(engine, (), setup)
+
+        return engine, engine
+
+    write_engine = create_async_engine(connection_string, pool_size=1, max_overflow=0)
+    _listen_connect(write_engine, WRITE_PRAGMAS, setup)
+
+    read_engine = create_async_engine(
+        connection_string, pool_size=read_connections, max_overflow=0
+    )
+    _listen_connect(read_engine, READ_PRAGMAS, setup)
+
+    return write_engine, read_engine
+
+
+async def checkpoint_wal(
+    logger: "Logger", engine: "AsyncEngine", *, interval: float
+) -> None:
+    """Checkpoints the WAL every `interval` seconds, until cancelled.
+
+    Checkpoints are passive, so they never wait for readers, and go through
+    `engine`, which should be the write engine so they don't compete with
+    writes either.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+                busy, wal_pages, checkpointed = result.one()
+        except Exception:
+            logger.exception("Failed to checkpoint the WAL")
+            continue
+
+        logger.debug(
+            f"Checkpointed {checkpointed} of {wal_pages} WAL pages"
+            f"{' (busy)' if busy else ''}"
+        )
@@ -0,0 +1,115 @@
+"""Hooks for timing the statements an engine executes, e.g. for metrics,
+tracing or query statistics.
+
+Every engine gets a single set of SQLAlchemy event listeners, however many
+statement listeners are added to it. Listeners are called synchronously
+right after a statement finishes, including when it fails.
+"""
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+from weakref import WeakKeyDictionary
+
+import sqlalchemy.event
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine, ExceptionContext
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+__all__ = ["StatementEvent", "add_statement_listener"]
+
+# Key in `Connection.info` of the start times of statements being executed,
+# by cursor. Unlike a stack, entries of statements that fail can't be
+# mistaken for those of other statements.
+_START_TIMES = "statement_start_times"
+
+
+@dataclass
+class StatementEvent:
+    connection: "Connection"
+    statement: str
+    parameters: Any
+    executemany: bool
+    # time.perf_counter() when the statement started
+    start: float
+    duration: float
+    # None if the statement succeeded.
+    error: Optional[BaseException] = None
+
+    @property
+    def verb(self) -> str:
+        """The statement's first keyword, e.g. `SELECT`."""
+        return (
+            self.statement.lstrip().split(None, 1)[0].upper() if self.statement else ""
+        )
+
+
+StatementListener = Callable[[StatementEvent], None]
+
+_listeners: "WeakKeyDictionary[Engine, list[StatementListener]]" = WeakKeyDictionary()
+
+
+def add_statement_listener(engine: "AsyncEngine", listener: StatementListener) -> None:
+    """Calls `listener` after every statement executed by `engine`."""
+    sync_engine = engine.sync_engine
+
+    if (listeners := _listeners.get(sync_engine)) is None:
+        listeners = _listeners[sync_engine] = []
+        _install(sync_engine, listeners)
+
+    listeners.append(listener)
+
+
+def _install(engine: "Engine", listeners: list[StatementListener]) -> None:
+    def emit(conn, cursor, statement, parameters, executemany, error):
+        start = conn.info.get(_START_TIMES, {}).pop(cursor, None)
+
+        # The statement failed before it was sent, or while its results were
+        # being fetched.
+        if start is None:
+            return
+
+        event = StatementEvent(
+            connection=conn,
+            statement=statement,
+            parameters=parameters,
+            executemany=executemany,
+            start=start,
+            duration=time.perf_counter() - start,
+            error=error,
+        )
+        for listener in listeners:
+            listener(event)
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault(_START_TIMES, {})[cursor] = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        emit(conn, cursor, statement, parameters, executemany, None)
+
+    def handle_error(context: "ExceptionContext"):
+        # The execution context's cursor is the one statements are executed
+        # with. `ExceptionContext.cursor` isn't always set.
+        if (execution_context := context.execution_context) is not None:
+            cursor = execution_context.cursor
+        else:
+            cursor = getattr(context, "cursor", None)
+
+        if context.connection is None or cursor is None:
+            return
+
+        emit(
+            context.connection,
+            cursor,
+            context.statement or "",
+            context.parameters,
+            execution_context is not None and execution_context.executemany,
+            context.original_exception,
+        )
+
+    sqlalchemy.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    sqlalchemy.event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    sqlalchemy.event.listen(engine, "handle_error", handle_error)
@@ -5,10 +5,12 @@ from rapidfuzz import fuzz
 from sqlalchemy import (
     BigInteger,
     ColumnElement,
+    Connection,
     Float,
     ForeignKey,
     String,
     UniqueConstraint,
+    event,
     func,
     type_coerce,
 )
@@ -29,6 +31,11 @@ class Cookie(Base):
     discord_id: Mapped[int] = mapped_column(BigInteger(), primary_key=True)
     cookie: Mapped[str] = mapped_column(String(64), nullable=False)
     kamaitachi_token: Mapped[Optional[str]] = mapped_column(String(40), nullable=True)
+    # See utils.calculation.rating_engine.RatingState.
+    rating_state: Mapped[Optional[str]] = mapped_column(nullable=True)
+    # The newest play uploaded to Kamaitachi, as JSON from
+    # chunithm_net.models.record.PlaylogMarker.to_dict.
+    kamaitachi_marker: Mapped[Optional[str]] = mapped_column(nullable=True)
 
 
 class Song(Base):
@@ -191,3 +198,55 @@ class GuessScore(Base):
 
     discord_id: Mapped[int] = mapped_column(BigInteger(), primary_key=True)
     score: Mapped[int] = mapped_column(nullable=False)
+
+
+class MusicXmlManifest(Base):
+    """Music.xml folders that were last imported from a game dump, so that
+    re-imports can skip the ones that haven't changed."""
+
+    __tablename__ = "music_xml_manifest"
+
+    # Folder containing Music.xml and its charts
+    path: Mapped[str] = mapped_column(primary_key=True)
+    # None if Music.xml is invalid
+    song_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # Latest modification time and total size of the files in the folder
+    mtime_ns: Mapped[int] = mapped_column(BigInteger(), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger(), nullable=False)
+    # SHA-256 of the files in the folder
+    sha256: Mapped[str] = mapped_column(nullable=False)
+
+
+class CatalogVersion(Base):
+    """A single row that is incremented on every change to songs, charts and
+    aliases, so that data derived from them can tell whether it is stale."""
+
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+CATALOG_TABLES = ("chunirec_songs", "chunirec_charts", "aliases")
+
+
+def catalog_version_ddl() -> list[str]:
+    return [
+        "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+        *(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_{operation.lower()}_catalog_version "
+            f"AFTER {operation} ON {table} "
+            "BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END"
+            for table in CATALOG_TABLES
+            for operation in ("INSERT", "UPDATE", "DELETE")
+        ),
+    ]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_catalog_version_triggers(_, connection: Connection, **__):
+    if connection.dialect.name != "sqlite":
+        return
+
+    for statement in catalog_version_ddl():
+        connection.exec_driver_sql(statement)
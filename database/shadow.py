@@ -0,0 +1,124 @@
+"""Swapping a refreshed catalog into a database that is in use.
+
+A refresh imports into a shadow copy of the database made with
+`copy_database`. `validate_catalog` checks the result, and `swap_catalog`
+copies it back with a single write transaction. Until that transaction
+commits, anything reading the database sees the catalog as it was.
+
+Only the tables the importers write to are swapped. Aliases aren't, since
+users can add them while a refresh is running.
+"""
+import contextlib
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+
+__all__ = [
+    "REFRESHED_TABLES",
+    "CatalogValidationError",
+    "copy_database",
+    "database_path",
+    "swap_catalog",
+    "validate_catalog",
+]
+
+REFRESHED_TABLES = ("chunirec_songs", "chunirec_charts", "song_jackets", "sdvxin")
+# A refreshed table with fewer rows than this fraction of the current one is
+# assumed to be the result of a broken import.
+MIN_ROW_RATIO = 0.95
+# How long the swap waits for other writers, in seconds.
+SWAP_TIMEOUT = 30
+
+
+class CatalogValidationError(Exception):
+    pass
+
+
+def database_path(connection_string: str) -> Optional[Path]:
+    """The file of a SQLite database, or None if it isn't one."""
+    url = make_url(connection_string)
+
+    if url.get_backend_name() != "sqlite" or url.database in {None, "", ":memory:"}:
+        return None
+
+    return Path(str(url.database))
+
+
+def _read_only_uri(path: Path) -> str:
+    return f"{path.resolve().as_uri()}?mode=ro"
+
+
+def copy_database(source: Path, destination: Path) -> None:
+    """Copies a database that may be in use, using SQLite's backup API."""
+    with contextlib.closing(sqlite3.connect(source)) as src, contextlib.closing(
+        sqlite3.connect(destination)
+    ) as dst:
+        src.backup(dst)
+
+
+def validate_catalog(shadow: Path, live: Path) -> None:
+    """Checks that the catalog in `shadow` can replace the one in `live`.
+
+    Raises
+    ------
+    CatalogValidationError
+        If the shadow database is corrupt, has charts for songs that don't
+        exist, or lost a suspicious number of rows.
+    """
+    with contextlib.closing(sqlite3.connect(shadow, uri=True)) as conn:
+        conn.execute("ATTACH DATABASE ? AS live", (_read_only_uri(live),))
+
+        (result,) = conn.execute("PRAGMA main.integrity_check").fetchone()
+        if result != "ok":
+            msg = f"Integrity check failed: {result}"
+            raise CatalogValidationError(msg)
+
+        orphans = conn.execute(
+            "SELECT COUNT(*) FROM main.chunirec_charts "
+            "WHERE song_id NOT IN (SELECT id FROM main.chunirec_songs)"
+        ).fetchone()[0]
+        if orphans > 0:
+            msg = f"{orphans} charts belong to songs that don't exist"
+            raise CatalogValidationError(msg)
+
+        for table in REFRESHED_TABLES:
+            (count,) = conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()
+            (current,) = conn.execute(f"SELECT COUNT(*) FROM live.{table}").fetchone()
+
+            if count < current * MIN_ROW_RATIO:
+                msg = f"{table} would shrink from {current} to {count} rows"
+                raise CatalogValidationError(msg)
+
+
+def swap_catalog(live: Path, shadow: Path) -> None:
+    """Replaces the refreshed tables of `live` with those of `shadow`, in one
+    transaction.
+
+    Only rows that differ are written. Both databases must have the same
+    schema, which they do if `shadow` was copied from `live`.
+    """
+    with contextlib.closing(
+        sqlite3.connect(live, timeout=SWAP_TIMEOUT, isolation_level=None, uri=True)
+    ) as conn:
+        conn.execute("ATTACH DATABASE ? AS shadow", (_read_only_uri(shadow),))
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table in REFRESHED_TABLES:
+                conn.execute(
+                    f"DELETE FROM main.{table} "
+                    f"WHERE rowid NOT IN (SELECT rowid FROM shadow.{table})"
+                )
+                conn.execute(
+                    f"INSERT OR REPLACE INTO main.{table} "
+                    f"SELECT * FROM shadow.{table} EXCEPT SELECT * FROM main.{table}"
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DETACH DATABASE shadow")
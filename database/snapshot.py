@@ -0,0 +1,287 @@
+"""Snapshots of the song catalog and aliases, for fast startup.
+
+Building the alias cache from the database means loading every song and alias
+through the ORM. Instead, the data the bot keeps in memory is written to a
+binary file next to the database, which can be read back in milliseconds.
+
+A snapshot records the `catalog_version` it was built from. That counter is
+bumped by triggers on every change to songs, charts and aliases, so a snapshot
+whose version doesn't match the database is stale and is not used.
+
+File layout (little endian):
+
+    header  magic, format, catalog version, row counts, string table size, CRC32
+    songs   (id, title, jacket, genre, available, removed)
+    aliases (rowid, song id, guild id, alias)
+    strings UTF-8 string table, referenced by (offset, length) pairs
+
+Fixed-width rows mean the file can be memory-mapped and decoded with
+`struct.iter_unpack`, without parsing anything.
+"""
+import asyncio
+import mmap
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+
+from .models import Alias, CatalogVersion, Song
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = [
+    "CatalogAlias",
+    "CatalogSnapshot",
+    "CatalogSong",
+    "build_snapshot",
+    "get_catalog_version",
+    "load_snapshot",
+    "read_snapshot",
+    "snapshot_path",
+    "write_snapshot",
+]
+
+MAGIC = b"CHUNICAT"
+# Bump this whenever the layout changes.
+FORMAT_VERSION = 2
+
+# magic, format, catalog version, songs, aliases, string table size, crc32
+_HEADER = struct.Struct("<8sIqIIII")
+# id, (title), (jacket), (genre), available, removed
+_SONG = struct.Struct("<qIIIIII??")
+# rowid, song id, guild id, (alias)
+_ALIAS = struct.Struct("<qqqII")
+
+
+@dataclass
+class CatalogSong:
+    id: int
+    title: str
+    jacket: str
+    genre: str
+    available: bool
+    removed: bool
+
+
+@dataclass
+class CatalogAlias:
+    rowid: int
+    song_id: int
+    guild_id: int
+    alias: str
+
+
+@dataclass
+class CatalogSnapshot:
+    version: int
+    songs: list[CatalogSong] = field(default_factory=list)
+    aliases: list[CatalogAlias] = field(default_factory=list)
+
+
+def snapshot_path(connection_string: str) -> Optional[Path]:
+    """Where the snapshot for a database lives, or None if the database is not
+    a SQLite file."""
+    url = make_url(connection_string)
+
+    if url.get_backend_name() != "sqlite" or url.database in {None, "", ":memory:"}:
+        return None
+
+    return Path(f"{url.database}.catalog")
+
+
+async def get_catalog_version(session: "AsyncSession") -> Optional[int]:
+    """Returns the current catalog version, or None if the database has not
+    been migrated to have one yet."""
+    try:
+        return await session.scalar(
+            select(CatalogVersion.version).where(CatalogVersion.id == 1)
+        )
+    except Exception:  # noqa: BLE001
+        await session.rollback()
+        return None
+
+
+async def build_snapshot(session: "AsyncSession") -> CatalogSnapshot:
+    # The version is read in the same transaction as the data, so the two
+    # always match.
+    version = await get_catalog_version(session)
+    snapshot = CatalogSnapshot(version if version is not None else -1)
+
+    songs = await session.execute(
+        select(
+            Song.id, Song.title, Song.jacket, Song.genre, Song.available, Song.removed
+        ).order_by(Song.id)
+    )
+    snapshot.songs = [CatalogSong(*row) for row in songs]
+
+    aliases = await session.execute(
+        select(Alias.rowid, Alias.song_id, Alias.guild_id, Alias.alias).order_by(
+            Alias.song_id, Alias.rowid
+        )
+    )
+    snapshot.aliases = [CatalogAlias(*row) for row in aliases]
+
+    return snapshot
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        # key: string
+        # value: (offset, length)
+        self.offsets: dict[str, tuple[int, int]] = {}
+
+    def add(self, value: str) -> tuple[int, int]:
+        if (offset := self.offsets.get(value)) is None:
+            encoded = value.encode("utf-8")
+            offset = self.offsets[value] = (len(self.buffer), len(encoded))
+            self.buffer += encoded
+        return offset
+
+
+def write_snapshot(path: Path, snapshot: CatalogSnapshot) -> None:
+    """Writes a snapshot atomically, so that a concurrent reader sees either
+    the old or the new file."""
+    strings = _StringTable()
+    body = bytearray()
+
+    for song in snapshot.songs:
+        body += _SONG.pack(
+            song.id,
+            *strings.add(song.title),
+            *strings.add(song.jacket),
+            *strings.add(song.genre),
+            song.available,
+            song.removed,
+        )
+
+    for alias in snapshot.aliases:
+        body += _ALIAS.pack(
+            alias.rowid, alias.song_id, alias.guild_id, *strings.add(alias.alias)
+        )
+
+    body += strings.buffer
+
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        snapshot.version,
+        len(snapshot.songs),
+        len(snapshot.aliases),
+        len(strings.buffer),
+        zlib.crc32(body),
+    )
+
+    temp_path = path.with_name(f"{path.name}.tmp")
+    with temp_path.open("wb") as f:
+        f.write(header)
+        f.write(body)
+    temp_path.replace(path)
+
+
+def read_snapshot(path: Path) -> Optional[CatalogSnapshot]:
+    """Reads a snapshot, returning None if it is missing, corrupted or was
+    written in a different format."""
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return None
+
+    with f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            return None
+
+        with data:
+            return _parse(data)
+
+
+def _parse(data: mmap.mmap) -> Optional[CatalogSnapshot]:
+    if len(data) < _HEADER.size:
+        return None
+
+    (magic, format, version, song_count, alias_count, string_size, crc) = (
+        _HEADER.unpack_from(data)
+    )
+    if magic != MAGIC or format != FORMAT_VERSION:
+        return None
+
+    songs_start = _HEADER.size
+    aliases_start = songs_start + song_count * _SONG.size
+    strings_start = aliases_start + alias_count * _ALIAS.size
+
+    if len(data) != strings_start + string_size:
+        return None
+
+    with memoryview(data) as view:
+        if zlib.crc32(view[songs_start:]) != crc:
+            return None
+
+        strings = bytes(view[strings_start:])
+
+    cache: dict[tuple[int, int], str] = {}
+
+    def string(offset: int, length: int) -> str:
+        if (value := cache.get((offset, length))) is None:
+            value = cache[(offset, length)] = strings[offset : offset + length].decode(
+                "utf-8"
+            )
+        return value
+
+    snapshot = CatalogSnapshot(version)
+
+    snapshot.songs = [
+        CatalogSong(
+            id,
+            string(title_off, title_len),
+            string(jacket_off, jacket_len),
+            string(genre_off, genre_len),
+            available,
+            removed,
+        )
+        for (
+            id,
+            title_off,
+            title_len,
+            jacket_off,
+            jacket_len,
+            genre_off,
+            genre_len,
+            available,
+            removed,
+        ) in _SONG.iter_unpack(data[songs_start:aliases_start])
+    ]
+    snapshot.aliases = [
+        CatalogAlias(rowid, song_id, guild_id, string(alias_off, alias_len))
+        for (rowid, song_id, guild_id, alias_off, alias_len) in _ALIAS.iter_unpack(
+            data[aliases_start:strings_start]
+        )
+    ]
+
+    return snapshot
+
+
+async def load_snapshot(
+    session: "AsyncSession", path: Optional[Path]
+) -> tuple[CatalogSnapshot, bool]:
+    """Loads the snapshot at `path` if it is up to date, or builds a new one
+    from the database otherwise.
+
+    Returns the snapshot, and whether it was read from `path`.
+    """
+    if path is not None:
+        version = await get_catalog_version(session)
+        # Mapping and decoding the file is blocking I/O.
+        snapshot = await asyncio.to_thread(read_snapshot, path)
+
+        if version is not None and snapshot is not None and snapshot.version == version:
+            return snapshot, True
+
+    return await build_snapshot(session), False
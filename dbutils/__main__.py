@@ -11,12 +11,15 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from database.models import Base
+from database.snapshot import build_snapshot, snapshot_path, write_snapshot
 from utils.config import config
 from utils.evtloop import get_event_loop
 from utils.logging import setup_logging
 
 from .aliases import update_aliases
 from .chunirec import update_db
+from .diff import write_report
+from .http_cache import HttpCache
 from .merge_options import merge_options
 from .sdvxin import update_sdvxin
 
@@ -48,6 +51,28 @@ async def main():
         type=Path,
         help="If updating from data, provide path to the `option` folder.",
     )
+    update.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path(".cache/dbutils"),
+        help="Where downloaded pages are cached between runs.",
+    )
+    update.add_argument(
+        "--offline",
+        action="store_true",
+        help="Import from pages cached by previous runs, without downloading anything.",
+    )
+    update.add_argument(
+        "--force",
+        action="store_true",
+        help="Import even if nothing changed since the last import.",
+    )
+    update.add_argument(
+        "--report",
+        required=False,
+        type=Path,
+        help="Write what changed in the database to this file, as JSON.",
+    )
 
     args = parser.parse_args()
 
@@ -63,18 +88,37 @@ async def main():
 
     if args.command == "update":
         async_session = async_sessionmaker(engine, expire_on_commit=False)
+        diffs = []
+        cache = HttpCache(args.cache_dir / args.source, offline=args.offline)
         if args.source == "chunirec":
-            await update_db(logger, async_session)
+            diffs = await update_db(
+                logger, async_session, cache=cache, force=args.force
+            )
         if args.source == "sdvxin":
-            await update_sdvxin(logger, async_session)
+            diffs = await update_sdvxin(logger, async_session, cache=cache)
         if args.source == "alias":
-            await update_aliases(logger, async_session)
+            await update_aliases(logger, async_session, cache=cache, force=args.force)
         if args.source == "dump":
             if args.data_dir is None:
                 update.print_help()
                 exit(1)
 
-            await merge_options(logger, async_session, args.data_dir, args.option_dir)
+            diffs = await merge_options(
+                logger, async_session, args.data_dir, args.option_dir
+            )
+
+        if args.report is not None:
+            write_report(args.report, args.source, diffs)
+            logger.info(f"Wrote change report to {args.report}")
+
+    # Refresh the catalog snapshot, so that the bot doesn't have to rebuild it
+    # from the database on its next startup.
+    if (path := snapshot_path(config.bot.db_connection_string)) is not None:
+        async with async_sessionmaker(engine)() as session:
+            snapshot = await build_snapshot(session)
+
+        write_snapshot(path, snapshot)
+        logger.info(f"Wrote catalog snapshot to {path}")
 
     await engine.dispose()
 
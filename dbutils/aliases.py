@@ -1,4 +1,7 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
 from logging import Logger
+from typing import TypeVar
 
 import aiohttp
 from sqlalchemy import select
@@ -6,51 +9,134 @@ from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from database.models import Alias, Song
+from database.snapshot import get_catalog_version
 from utils import json_loads
 
+from .http_cache import CachedResponse, HttpCache, import_fingerprint
+
+T = TypeVar("T")
+
+# Aliases per upsert statement. Each alias is 4 bound parameters, which keeps
+# statements well under SQLite's limit on them.
+UPSERT_CHUNK_SIZE = 500
+
+GCM_ALIASES_URL = (
+    "https://github.com/lomotos10/GCM-bot/raw/main/data/aliases/en/chuni.tsv"
+)
+TACHI_SONGS_URL = (
+    "https://github.com/zkrising/Tachi/raw/main/seeds/collections/songs-chunithm.json"
+)
+
+
+async def gcm_aliases(response: CachedResponse) -> AsyncIterator[list[str]]:
+    """Yields (title, *aliases) rows from GCM-bot's alias list."""
+    # The cache keeps the body in memory, since it is fingerprinted, but it is
+    # only decoded and split as rows are consumed.
+    for line in response.lines():
+        yield line.split("\t")
+
+
+async def tachi_aliases(response: CachedResponse) -> AsyncIterator[list[str]]:
+    """Yields (title, *aliases) rows from Tachi's CHUNITHM song seeds."""
+    # This is a single JSON array, so unlike the TSV it has to be parsed
+    # whole. It is still only turned into rows as they are consumed.
+    for song in json_loads(response.body):
+        yield [song["title"], *song["searchTerms"]]
+
+
+async def resolve_aliases(
+    rows: AsyncIterable[list[str]], title_ids: dict[str, int], unmatched: set[str]
+) -> AsyncIterator[dict]:
+    """Turns (title, *aliases) rows into alias rows to upsert. Titles that
+    aren't in `title_ids` are added to `unmatched`."""
+    async for row in rows:
+        if len(row) < 2:
+            continue
+
+        title = row[0]
+        if (song_id := title_ids.get(title)) is None:
+            unmatched.add(title)
+            continue
+
+        for alias in row[1:]:
+            yield {"alias": alias, "guild_id": -1, "song_id": song_id, "owner_id": None}
+
+
+async def chunked(items: AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    chunk: list[T] = []
+
+    async for item in items:
+        chunk.append(item)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
 
 async def update_aliases(
-    logger: Logger, async_session: async_sessionmaker[AsyncSession]
+    logger: Logger,
+    async_session: async_sessionmaker[AsyncSession],
+    *,
+    cache: HttpCache,
+    force: bool = False,
 ):
-    async with aiohttp.ClientSession() as client, async_session() as session, session.begin():
-        resp = await client.get(
-            "https://github.com/lomotos10/GCM-bot/raw/main/data/aliases/en/chuni.tsv"
+    """Imports global aliases from GCM-bot and Tachi.
+
+    Skips importing if the alias lists and the catalog are the same as when
+    they were last imported, unless `force` is set.
+    """
+    async with aiohttp.ClientSession() as client:
+        gcm, tachi = await asyncio.gather(
+            cache.get(client, GCM_ALIASES_URL), cache.get(client, TACHI_SONGS_URL)
+        )
+
+    # key: title
+    # value: song ID
+    title_ids: dict[str, int] = {}
+
+    async with async_session() as session:
+        fingerprint = import_fingerprint(
+            [gcm, tachi], await get_catalog_version(session)
         )
-        tachi_resp = await client.get(
-            "https://github.com/zkrising/Tachi/raw/main/seeds/collections/songs-chunithm.json"
+        if not force and cache.is_imported(fingerprint):
+            logger.info("Nothing changed since the last alias import")
+            return
+
+        # Limit to non-WE entries. WE entries are redirected to their non-WE
+        # respectives when song-searching anyways.
+        for title, id in await session.execute(
+            select(Song.title, Song.id).where(Song.id < 8000)
+        ):
+            title_ids.setdefault(title, id)
+
+    insert_statement = insert(Alias)
+    upsert_statement = insert_statement.on_conflict_do_update(
+        index_elements=[Alias.alias, Alias.guild_id],
+        set_={"song_id": insert_statement.excluded.song_id},
+    )
+
+    unmatched: set[str] = set()
+    upserted = 0
+
+    async with async_session() as session, session.begin():
+        for rows in (gcm_aliases(gcm), tachi_aliases(tachi)):
+            async for chunk in chunked(
+                resolve_aliases(rows, title_ids, unmatched), UPSERT_CHUNK_SIZE
+            ):
+                await session.execute(upsert_statement, chunk)
+                upserted += len(chunk)
+
+    logger.info(f"Upserted {upserted} aliases")
+
+    async with async_session() as session:
+        cache.record_import(
+            import_fingerprint([gcm, tachi], await get_catalog_version(session))
         )
-        aliases = [x.split("\t") for x in (await resp.text()).splitlines()]
-
-        tachi_songs = await tachi_resp.json(loads=json_loads, content_type=None)
-        aliases.extend([[x["title"], *x["searchTerms"]] for x in tachi_songs])
-
-        inserted_aliases = []
-        for alias in aliases:
-            if len(alias) < 2:
-                continue
-            title = alias[0]
-
-            song = (
-                await session.execute(
-                    select(Song)
-                    # Limit to non-WE entries. WE entries are redirected to
-                    # their non-WE respectives when song-searching anyways.
-                    .where((Song.title == title) & (Song.id < 8000))
-                )
-            ).scalar_one_or_none()
-            if song is None:
-                continue
-
-            inserted_aliases.extend(
-                [
-                    {"alias": x, "guild_id": -1, "song_id": song.id, "owner_id": None}
-                    for x in alias[1:]
-                ]
-            )
-
-        insert_statement = insert(Alias)
-        upsert_statement = insert_statement.on_conflict_do_update(
-            index_elements=[Alias.alias, Alias.guild_id],
-            set_={"song_id": insert_statement.excluded.song_id},
+
+    if len(unmatched) > 0:
+        logger.warning(
+            f"Could not find songs for {len(unmatched)} titles: {', '.join(sorted(unmatched))}"
         )
-        await session.execute(upsert_statement, inserted_aliases)
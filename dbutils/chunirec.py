@@ -1,20 +1,25 @@
+import asyncio
 import re
+import time
 from datetime import datetime
 from logging import Logger
-from typing import TYPE_CHECKING, Optional, TypedDict
+from typing import TYPE_CHECKING, Optional, TypedDict, cast
 
 import aiohttp
-from sqlalchemy import func
-from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from chunithm_net.consts import INTERNATIONAL_JACKET_BASE, JACKET_BASE
 from database.models import Chart, Song, SongJacket
+from database.snapshot import get_catalog_version
 from utils import TOKYO_TZ, json_loads, release_to_chunithm_version
 from utils.config import config
 from utils.types.errors import MissingConfiguration
 
+from .diff import TableDiff, TableSpec, apply_diff, diff_table, load_rows
+from .http_cache import HttpCache, import_fingerprint
+
 if TYPE_CHECKING:
+    from sqlalchemy import Table
     from typing_extensions import NotRequired
 
 
@@ -65,7 +70,7 @@ class ZetarakuSheet(TypedDict):
     internalLevelValue: float
     noteDesigner: Optional[str]
     noteCounts: ZetarakuNoteCounts
-    regions: dict[str, str]
+    regions: dict[str, bool]
 
 
 class ZetarakuSong(TypedDict):
@@ -81,6 +86,12 @@ class ZetarakuChunithmData(TypedDict):
     songs: list[ZetarakuSong]
 
 
+# The token is added to the query when requesting, and left out of the cache.
+CHUNIREC_URL = "https://api.chunirec.net/2.0/music/showall.json?region=jp2"
+CHUNITHM_URL = "https://chunithm.sega.jp/storage/json/music.json"
+MAIMAI_URL = "https://maimai.sega.jp/data/maimai_songs.json"
+ZETARAKU_URL = "https://dp4p6x0xfi5o9.cloudfront.net/chunithm/data.json"
+
 NOTE_TYPES = ["tap", "hold", "slide", "air", "flick"]
 CHUNITHM_CATCODES = {
     "POPS & ANIME": 0,
@@ -175,125 +186,130 @@ for idx, random in enumerate(
         "image": random_image,
     }
 
+SONG_SPEC = TableSpec(
+    cast("Table", Song.__table__),
+    key=("id",),
+    coalesce=frozenset({"bpm", "jacket"}),
+)
+# chunirec lists every chart of a song, so charts it no longer lists are gone.
+CHART_SPEC = TableSpec(
+    cast("Table", Chart.__table__),
+    key=("song_id", "difficulty"),
+    coalesce=frozenset({"maxcombo", *NOTE_TYPES, "charter"}),
+    delete_scope="song_id",
+)
+JACKET_SPEC = TableSpec(
+    cast("Table", SongJacket.__table__),
+    key=("jacket_url",),
+)
+
 WORLD_END_REGEX = re.compile(r"【(.{1,2})】$", re.MULTILINE)
 
 
+# Characters that are written differently between sources, and what they are
+# normalized to.
+TITLE_TRANSLATION = str.maketrans(
+    {
+        "　": " ",
+        "`": "'",
+        "”": '"',
+        "“": '"',
+    }
+)
+
+
 def normalize_title(title: str, *, remove_we_kanji: bool = False) -> str:
-    title = (
-        title.lower()
-        .replace(" ", " ")
-        .replace("　", " ")
-        .replace(" ", " ")
-        .replace(":", ":")
-        .replace("(", "(")
-        .replace(")", ")")
-        .replace("!", "!")
-        .replace("?", "?")
-        .replace("`", "'")
-        .replace("`", "'")
-        .replace("”", '"')
-        .replace("“", '"')
-        .replace("~", "~")
-        .replace("-", "-")
-        .replace("@", "@")
-    )
+    title = title.lower().translate(TITLE_TRANSLATION)
     if remove_we_kanji:
         title = WORLD_END_REGEX.sub("", title)
     return title
 
 
-async def update_db(logger: Logger, async_session: async_sessionmaker[AsyncSession]):
-    token = config.credentials.chunirec_token
-    if token is None:
-        msg = "credentials.chunirec_token"
-        raise MissingConfiguration(msg)
-
-    async with aiohttp.ClientSession() as client:
-        resp = await client.get(
-            f"https://api.chunirec.net/2.0/music/showall.json?token={token}&region=jp2"
-        )
-        chuni_resp = await client.get(
-            "https://chunithm.sega.jp/storage/json/music.json"
-        )
-        maimai_resp = await client.get(
-            "https://maimai.sega.jp/data/maimai_songs.json",
-        )
-        zetaraku_resp = await client.get(
-            "https://dp4p6x0xfi5o9.cloudfront.net/chunithm/data.json"
-        )
-        songs: list[ChunirecSong] = await resp.json(loads=json_loads)
-        chuni_songs: list[dict[str, str]] = await chuni_resp.json(loads=json_loads)
-        maimai_songs: list[dict[str, str]] = await maimai_resp.json(loads=json_loads)
-        zetaraku_songs: ZetarakuChunithmData = await zetaraku_resp.json(
-            loads=json_loads
+def match_songs(
+    logger: Logger,
+    songs: list[ChunirecSong],
+    chuni_songs: list[dict[str, str]],
+    maimai_songs: list[dict[str, str]],
+    zetaraku_songs: ZetarakuChunithmData,
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """Matches chunirec songs with the official CHUNITHM and maimai song lists
+    and zetaraku's data.
+
+    Returns the rows to upsert into `chunirec_songs`, `chunirec_charts` and
+    `song_jackets`.
+    """
+    # Every chunirec song is looked up in every other source, so they are
+    # indexed by normalized title once, instead of being scanned (and
+    # normalized again) for every song. Where several entries share a key,
+    # the first one wins, like the scans this replaces.
+
+    # key: (normalized title, catcode)
+    chuni_by_title: dict[tuple[str, int], dict[str, str]] = {}
+    # key: normalized title with the WORLD'S END kanji, e.g. "random【分a】"
+    chuni_by_we_title: dict[str, dict[str, str]] = {}
+    # key: (normalized title, normalized artist)
+    chuni_by_title_artist: dict[tuple[str, str], dict[str, str]] = {}
+
+    for x in chuni_songs:
+        title = normalize_title(x["title"])
+
+        if (catcode := CHUNITHM_CATCODES.get(x["catname"])) is not None:
+            chuni_by_title.setdefault((title, catcode), x)
+
+        chuni_by_we_title.setdefault(
+            normalize_title(f"{x['title']}【{x['we_kanji']}】"), x
         )
+        chuni_by_title_artist.setdefault((title, normalize_title(x["artist"])), x)
+
+    # key: (normalized title, catcode)
+    zetaraku_by_title: dict[tuple[str, int], ZetarakuSong] = {}
+    for x in zetaraku_songs["songs"]:
+        if (catcode := CHUNITHM_CATCODES.get(x["category"])) is not None:
+            zetaraku_by_title.setdefault((normalize_title(x["title"]), catcode), x)
+
+    # key: normalized title
+    maimai_by_title: dict[str, dict[str, str]] = {}
+    for x in maimai_songs:
+        maimai_by_title.setdefault(normalize_title(x["title"]), x)
 
     inserted_songs = []
     inserted_charts = []
     inserted_jackets = []
     for song in songs:
-        chunithm_id = -1
-        chunithm_catcode = -1
-        jacket = ""
-        chunithm_song: dict[str, str] = {}
-        try:
-            if song["meta"]["id"] in MANUAL_MAPPINGS:
-                chunithm_song = MANUAL_MAPPINGS[song["meta"]["id"]]
-            elif song["data"].get("WE") is None:
-                chunithm_song = next(
-                    x
-                    for x in chuni_songs
-                    if normalize_title(x["title"])
-                    == normalize_title(song["meta"]["title"])
-                    and CHUNITHM_CATCODES[x["catname"]]
-                    == CHUNITHM_CATCODES[song["meta"]["genre"]]
-                )
-            else:
-                chunithm_song = next(
-                    x
-                    for x in chuni_songs
-                    if normalize_title(f"{x['title']}【{x['we_kanji']}】")
-                    == normalize_title(song["meta"]["title"])
-                )
-            chunithm_id = int(chunithm_song["id"])
-            chunithm_catcode = int(CHUNITHM_CATCODES[chunithm_song["catname"]])
-            jacket = chunithm_song["image"]
-        except StopIteration:
+        chunithm_song: Optional[dict[str, str]] = None
+        title = normalize_title(song["meta"]["title"])
+        catcode = CHUNITHM_CATCODES.get(song["meta"]["genre"])
+
+        if song["meta"]["id"] in MANUAL_MAPPINGS:
+            chunithm_song = MANUAL_MAPPINGS[song["meta"]["id"]]
+        elif song["data"].get("WE") is None:
+            if catcode is not None:
+                chunithm_song = chuni_by_title.get((title, catcode))
+        else:
+            chunithm_song = chuni_by_we_title.get(title)
+
+        if chunithm_song is None:
             logger.warning(f"Couldn't find {song['meta']}")
             continue
 
+        chunithm_id = int(chunithm_song["id"])
+        chunithm_catcode = int(CHUNITHM_CATCODES[chunithm_song["catname"]])
+        jacket = chunithm_song["image"]
+
         if not jacket:
-            chunithm_song = next(
+            chunithm_song = chuni_by_title_artist.get(
                 (
-                    x
-                    for x in chuni_songs
-                    if normalize_title(x["title"])
-                    == normalize_title(song["meta"]["title"], remove_we_kanji=True)
-                    and normalize_title(x["artist"])
-                    == normalize_title(song["meta"]["artist"])
+                    normalize_title(song["meta"]["title"], remove_we_kanji=True),
+                    normalize_title(song["meta"]["artist"]),
                 ),
                 {},
             )
             jacket = chunithm_song.get("image")
 
-        zetaraku_song = next(
-            (
-                x
-                for x in zetaraku_songs["songs"]
-                if normalize_title(x["title"]) == normalize_title(song["meta"]["title"])
-                and CHUNITHM_CATCODES[x["category"]]
-                == CHUNITHM_CATCODES[song["meta"]["genre"]]
-            ),
-            None,
-        )
-        maimai_song = next(
-            (
-                x
-                for x in maimai_songs
-                if normalize_title(x["title"]) == normalize_title(song["meta"]["title"])
-            ),
-            None,
+        zetaraku_song = (
+            zetaraku_by_title.get((title, catcode)) if catcode is not None else None
         )
+        maimai_song = maimai_by_title.get(title)
 
         version = None
 
@@ -442,51 +458,71 @@ async def update_db(logger: Logger, async_session: async_sessionmaker[AsyncSessi
                 }
             )
 
-    async with async_session() as session, session.begin():
-        insert_statement = insert(Song)
-        upsert_statement = insert_statement.on_conflict_do_update(
-            index_elements=[Song.id],
-            set_={
-                "title": insert_statement.excluded.title,
-                "chunithm_catcode": insert_statement.excluded.chunithm_catcode,
-                "genre": insert_statement.excluded.genre,
-                "artist": insert_statement.excluded.artist,
-                "release": insert_statement.excluded.release,
-                "version": insert_statement.excluded.version,
-                "bpm": func.coalesce(insert_statement.excluded.bpm, Song.bpm),
-                "jacket": func.coalesce(insert_statement.excluded.jacket, Song.jacket),
-                "available": insert_statement.excluded.available,
-                "removed": insert_statement.excluded.removed,
-            },
-        )
-        await session.execute(upsert_statement, inserted_songs)
-
-        insert_statement = insert(Chart)
-        upsert_statement = insert_statement.on_conflict_do_update(
-            index_elements=[Chart.song_id, Chart.difficulty],
-            set_={
-                "level": insert_statement.excluded.level,
-                "const": insert_statement.excluded.const,
-                "maxcombo": func.coalesce(
-                    insert_statement.excluded.maxcombo, Chart.maxcombo
-                ),
-                "tap": func.coalesce(insert_statement.excluded.tap, Chart.tap),
-                "hold": func.coalesce(insert_statement.excluded.hold, Chart.hold),
-                "slide": func.coalesce(insert_statement.excluded.slide, Chart.slide),
-                "air": func.coalesce(insert_statement.excluded.air, Chart.air),
-                "flick": func.coalesce(insert_statement.excluded.flick, Chart.flick),
-                "charter": func.coalesce(
-                    insert_statement.excluded.charter, Chart.charter
-                ),
-            },
+    return inserted_songs, inserted_charts, inserted_jackets
+
+
+async def update_db(
+    logger: Logger,
+    async_session: async_sessionmaker[AsyncSession],
+    *,
+    cache: HttpCache,
+    force: bool = False,
+) -> list[TableDiff]:
+    """Imports songs and charts from chunirec, filling in the gaps from the
+    official song lists and zetaraku's data.
+
+    Skips matching altogether if the sources and the catalog are the same as
+    when they were last imported, unless `force` is set.
+    """
+    token = config.credentials.chunirec_token
+    if token is None and not cache.offline:
+        msg = "credentials.chunirec_token"
+        raise MissingConfiguration(msg)
+
+    async with aiohttp.ClientSession() as client:
+        responses = await asyncio.gather(
+            cache.get(client, f"{CHUNIREC_URL}&token={token}", key=CHUNIREC_URL),
+            cache.get(client, CHUNITHM_URL),
+            cache.get(client, MAIMAI_URL),
+            cache.get(client, ZETARAKU_URL),
         )
-        await session.execute(upsert_statement, inserted_charts)
-
-        insert_statement = insert(SongJacket)
-        upsert_statement = insert_statement.on_conflict_do_update(
-            index_elements=[SongJacket.jacket_url],
-            set_={
-                "song_id": insert_statement.excluded.song_id,
-            },
+
+    async with async_session() as session:
+        fingerprint = import_fingerprint(responses, await get_catalog_version(session))
+
+    if not force and cache.is_imported(fingerprint):
+        logger.info("Nothing changed since the last chunirec import")
+        return []
+
+    songs: list[ChunirecSong] = json_loads(responses[0].body)
+    chuni_songs: list[dict[str, str]] = json_loads(responses[1].body)
+    maimai_songs: list[dict[str, str]] = json_loads(responses[2].body)
+    zetaraku_songs: ZetarakuChunithmData = json_loads(responses[3].body)
+
+    start = time.perf_counter()
+    inserted_songs, inserted_charts, inserted_jackets = match_songs(
+        logger, songs, chuni_songs, maimai_songs, zetaraku_songs
+    )
+    logger.info(
+        f"Matched {len(inserted_songs)}/{len(songs)} chunirec songs in {time.perf_counter() - start:.2f}s"
+    )
+
+    diffs = []
+    async with async_session() as session, session.begin():
+        for spec, rows in (
+            (SONG_SPEC, inserted_songs),
+            (CHART_SPEC, inserted_charts),
+            (JACKET_SPEC, inserted_jackets),
+        ):
+            diff = diff_table(spec, await load_rows(session, spec), rows)
+            await apply_diff(session, diff)
+
+            logger.info(diff.summary())
+            diffs.append(diff)
+
+    async with async_session() as session:
+        cache.record_import(
+            import_fingerprint(responses, await get_catalog_version(session))
         )
-        await session.execute(upsert_statement, inserted_jackets)
+
+    return diffs
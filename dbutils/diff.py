@@ -0,0 +1,239 @@
+"""Differential updates for the importers.
+
+Instead of upserting every row they fetched, importers describe their tables
+with a `TableSpec`, compare the current rows with the incoming ones using
+`diff_table`, and write only what changed with `apply_diff`. Rows that are the
+same are not touched at all, so they don't grow the WAL or bump
+`catalog_version`.
+
+The resulting `TableDiff`s double as a change report, which
+`python -m dbutils update ... --report` writes as JSON:
+
+    {
+        "source": "chunirec",
+        "tables": {
+            "chunirec_charts": {
+                "inserted": [{"song_id": 1, "difficulty": "ULT", ...}],
+                "updated": [
+                    {
+                        "key": {"song_id": 1, "difficulty": "MAS"},
+                        "changes": {"const": [13.7, 13.8]}
+                    }
+                ],
+                "deleted": [{"song_id": 1, "difficulty": "WE"}]
+            },
+            ...
+        }
+    }
+"""
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+if TYPE_CHECKING:
+    from sqlalchemy import ColumnElement, Table
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+__all__ = [
+    "TableDiff",
+    "TableSpec",
+    "apply_diff",
+    "diff_table",
+    "load_rows",
+    "write_report",
+]
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    # Mapped classes' `__table__` is typed as a FromClause, so it needs a cast.
+    table: "Table"
+    # Columns that identify a row, like a unique constraint.
+    key: tuple[str, ...]
+    # Columns that keep their current value if the incoming one is None.
+    coalesce: frozenset[str] = frozenset()
+    # Columns that are only written when a row is inserted.
+    insert_only: frozenset[str] = frozenset()
+    # If set, current rows missing from the incoming ones are deleted, but only
+    # if their value in this column appears in an incoming row, e.g. a chart
+    # is only deleted if the rest of its song was imported. Importers rarely
+    # see every row of a table, so unscoped deletes would be destructive.
+    delete_scope: Optional[str] = None
+
+    @property
+    def primary_key(self) -> str:
+        return next(iter(self.table.primary_key.columns)).name
+
+    @property
+    def columns(self) -> list[str]:
+        """Columns that are compared and written, i.e. everything but an
+        autoincrementing primary key that isn't part of the key."""
+        return [
+            x.name
+            for x in self.table.columns
+            if x.name in self.key or x.name != self.primary_key
+        ]
+
+    def key_of(self, row: dict[str, Any]) -> tuple:
+        return tuple(row[x] for x in self.key)
+
+    def merge(
+        self, current: dict[str, Any], incoming: dict[str, Any]
+    ) -> dict[str, Any]:
+        """What `current` becomes after importing `incoming` over it."""
+        merged = dict(current)
+
+        for column, value in incoming.items():
+            if column in self.insert_only:
+                continue
+            if value is None and column in self.coalesce:
+                continue
+
+            merged[column] = value
+
+        return merged
+
+
+@dataclass
+class TableDiff:
+    spec: TableSpec
+    inserted: list[dict[str, Any]] = field(default_factory=list)
+    # (current row, updated row)
+    updated: list[tuple[dict[str, Any], dict[str, Any]]] = field(default_factory=list)
+    deleted: list[dict[str, Any]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+    def extend(self, other: "TableDiff") -> None:
+        """Adds the changes of a diff of other rows of the same table."""
+        self.inserted.extend(other.inserted)
+        self.updated.extend(other.updated)
+        self.deleted.extend(other.deleted)
+
+    def summary(self) -> str:
+        return (
+            f"{self.spec.table.name}: {len(self.inserted)} inserted, "
+            f"{len(self.updated)} updated, {len(self.deleted)} deleted"
+        )
+
+    def to_report(self) -> dict[str, Any]:
+        columns = self.spec.columns
+
+        return {
+            "inserted": [{x: row.get(x) for x in columns} for row in self.inserted],
+            "updated": [
+                {
+                    "key": dict(zip(self.spec.key, self.spec.key_of(new), strict=True)),
+                    "changes": {
+                        x: [current.get(x), new.get(x)]
+                        for x in columns
+                        if current.get(x) != new.get(x)
+                    },
+                }
+                for current, new in self.updated
+            ],
+            "deleted": [
+                dict(zip(self.spec.key, self.spec.key_of(row), strict=True))
+                for row in self.deleted
+            ],
+        }
+
+
+async def load_rows(
+    session: "AsyncSession",
+    spec: TableSpec,
+    where: "Optional[ColumnElement[bool]]" = None,
+) -> list[dict[str, Any]]:
+    """Loads every row of the table, or those matching `where`, including
+    their primary key."""
+    stmt = select(spec.table)
+    if where is not None:
+        stmt = stmt.where(where)
+
+    result = await session.execute(stmt)
+    return [dict(x) for x in result.mappings()]
+
+
+def diff_table(
+    spec: TableSpec,
+    current_rows: Iterable[dict[str, Any]],
+    incoming_rows: Iterable[dict[str, Any]],
+) -> TableDiff:
+    """Compares the current rows of a table with the incoming ones.
+
+    Incoming rows with the same key are merged in order, like consecutive
+    upserts would be. Incoming rows don't need to have every column; missing
+    ones are left alone on update and are NULL on insert.
+    """
+    current = {spec.key_of(x): x for x in current_rows}
+
+    incoming: dict[tuple, dict[str, Any]] = {}
+    for row in incoming_rows:
+        key = spec.key_of(row)
+        incoming[key] = spec.merge(incoming[key], row) if key in incoming else row
+
+    diff = TableDiff(spec)
+    for key, row in incoming.items():
+        if (existing := current.get(key)) is None:
+            diff.inserted.append(row)
+            continue
+
+        merged = spec.merge(existing, row)
+        if any(merged[x] != existing.get(x) for x in row if x in merged):
+            diff.updated.append((existing, merged))
+
+    if spec.delete_scope is not None:
+        scope = {x.get(spec.delete_scope) for x in incoming.values()}
+        diff.deleted = [
+            row
+            for key, row in current.items()
+            if key not in incoming and row[spec.delete_scope] in scope
+        ]
+
+    return diff
+
+
+async def apply_diff(session: "AsyncSession", diff: TableDiff) -> None:
+    spec = diff.spec
+    table = spec.table
+    primary_key = table.c[spec.primary_key]
+    columns = spec.columns
+
+    if len(diff.inserted) > 0:
+        await session.execute(
+            insert(table), [{x: row.get(x) for x in columns} for row in diff.inserted]
+        )
+
+    if len(diff.updated) > 0:
+        # The SET clause is made of the parameters that aren't bound in WHERE.
+        await session.execute(
+            update(table).where(primary_key == bindparam("b_primary_key")),
+            [
+                {"b_primary_key": current[spec.primary_key]}
+                | {x: new.get(x) for x in columns if x != spec.primary_key}
+                for current, new in diff.updated
+            ],
+        )
+
+    if len(diff.deleted) > 0:
+        await session.execute(
+            delete(table).where(
+                primary_key.in_([x[spec.primary_key] for x in diff.deleted])
+            )
+        )
+
+
+def write_report(path: Path, source: str, diffs: Iterable[TableDiff]) -> None:
+    report = {
+        "source": source,
+        "tables": {x.spec.table.name: x.to_report() for x in diffs},
+    }
+
+    temp_path = path.with_name(f"{path.name}.tmp")
+    with temp_path.open("w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    temp_path.replace(path)
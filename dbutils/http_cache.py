@@ -0,0 +1,226 @@
+"""An on-disk HTTP cache for the importers.
+
+Responses are stored with their `ETag` and `Last-Modified` headers, and
+revalidated with a conditional request the next time they are fetched, so
+that re-running an importer only downloads what changed upstream.
+
+Each entry is a single file named after the SHA-256 of its URL: a line of
+JSON metadata followed by the raw body. Entries are written atomically, so an
+interrupted run never leaves a half-written entry behind.
+
+With `offline=True`, nothing is requested, and only cached responses are
+served. This is what lets importers be tested against a recorded cache, and
+re-run reproducibly with `python -m dbutils update ... --offline`.
+
+Importers also record a fingerprint of what they last imported, so that they
+can skip matching and writing anything when neither their sources nor the
+catalog changed since (see `import_fingerprint` and `HttpCache.is_imported`).
+"""
+import hashlib
+import io
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import aiohttp
+
+__all__ = ["CacheMissError", "CachedResponse", "HttpCache", "import_fingerprint"]
+
+
+class CacheMissError(Exception):
+    def __init__(self, url: str) -> None:
+        super().__init__(f"{url} is not cached")
+        self.url = url
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    charset: Optional[str] = None
+
+    def text(self) -> str:
+        return self.body.decode(self.charset or "utf-8", errors="replace")
+
+    def lines(self) -> Iterator[str]:
+        """Decodes the body a line at a time, without line endings."""
+        # BytesIO shares the body instead of copying it.
+        with io.TextIOWrapper(
+            io.BytesIO(self.body), encoding=self.charset or "utf-8", errors="replace"
+        ) as f:
+            for line in f:
+                yield line.rstrip("\r\n")
+
+
+def import_fingerprint(
+    responses: Iterable[CachedResponse], catalog_version: Optional[int]
+) -> Optional[str]:
+    """Identifies an import of `responses` into a catalog at `catalog_version`.
+
+    Returns None if the database has no catalog version, in which case imports
+    can't be told apart and are never skipped.
+    """
+    if catalog_version is None:
+        return None
+
+    digest = hashlib.sha256(str(catalog_version).encode("utf-8"))
+    for response in responses:
+        digest.update(response.url.encode("utf-8"))
+        digest.update(hashlib.sha256(response.body).digest())
+
+    return digest.hexdigest()
+
+
+class HttpCache:
+    def __init__(self, directory: Path, *, offline: bool = False) -> None:
+        """
+        Parameters
+        ----------
+        directory: Path
+            Where responses are stored. Created on the first write.
+        offline: bool
+            Only serve responses from the cache, raising `CacheMissError` for
+            anything that isn't cached.
+        """
+        self.directory = directory
+        self.offline = offline
+
+        # Responses served from the cache, either offline or because the
+        # server said they hadn't changed.
+        self.hits = 0
+        # Responses that had to be downloaded.
+        self.misses = 0
+
+    def _path(self, url: str) -> Path:
+        return self.directory / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _write(self, path: Path, *chunks: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.tmp")
+        with temp_path.open("wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        temp_path.replace(path)
+
+    def is_imported(self, fingerprint: Optional[str]) -> bool:
+        """Whether `fingerprint` is what was imported last. Always False when
+        offline, so that replays always import."""
+        if self.offline or fingerprint is None:
+            return False
+
+        try:
+            last_import = (self.directory / "last_import").read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return False
+
+        return last_import == fingerprint
+
+    def record_import(self, fingerprint: Optional[str]) -> None:
+        if self.offline or fingerprint is None:
+            return
+
+        self._write(self.directory / "last_import", fingerprint.encode("utf-8"))
+
+    def load(self, url: str) -> Optional[CachedResponse]:
+        try:
+            data = self._path(url).read_bytes()
+        except FileNotFoundError:
+            return None
+
+        header, _, body = data.partition(b"\n")
+        try:
+            metadata = json.loads(header)
+        except ValueError:
+            return None
+
+        if metadata.get("url") != url:
+            return None
+
+        return CachedResponse(
+            url=url,
+            body=body,
+            etag=metadata.get("etag"),
+            last_modified=metadata.get("last_modified"),
+            charset=metadata.get("charset"),
+        )
+
+    def store(self, response: CachedResponse) -> None:
+        metadata = {
+            "url": response.url,
+            "etag": response.etag,
+            "last_modified": response.last_modified,
+            "charset": response.charset,
+        }
+
+        self._write(
+            self._path(response.url),
+            json.dumps(metadata).encode("utf-8"),
+            b"\n",
+            response.body,
+        )
+
+    async def get(
+        self, client: "aiohttp.ClientSession", url: str, *, key: Optional[str] = None
+    ) -> CachedResponse:
+        """Fetches `url`, revalidating the cached response if there is one.
+
+        Parameters
+        ----------
+        client: aiohttp.ClientSession
+            The session to make requests with.
+        url: str
+            The URL to fetch.
+        key: Optional[str]
+            What the response is cached as, instead of `url`. Use this for URLs
+            with credentials in them, so that they aren't written to disk.
+
+        Raises
+        ------
+        CacheMissError
+            If offline, and the response is not cached.
+        aiohttp.ClientResponseError
+            If the server responded with an error.
+        """
+        if key is None:
+            key = url
+
+        cached = self.load(key)
+
+        if self.offline:
+            if cached is None:
+                raise CacheMissError(key)
+
+            self.hits += 1
+            return cached
+
+        headers = {}
+        if cached is not None:
+            if cached.etag is not None:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with client.get(url, headers=headers) as resp:
+            if resp.status == 304 and cached is not None:
+                self.hits += 1
+                return cached
+
+            resp.raise_for_status()
+
+            response = CachedResponse(
+                url=key,
+                body=await resp.read(),
+                etag=resp.headers.get("ETag"),
+                last_modified=resp.headers.get("Last-Modified"),
+                charset=resp.charset,
+            )
+
+        self.misses += 1
+        self.store(response)
+
+        return response
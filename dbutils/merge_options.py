@@ -1,15 +1,29 @@
+import asyncio
+import contextlib
 import csv
-import itertools
+import hashlib
+import multiprocessing
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
 from logging import Logger
 from pathlib import Path
-from typing import Optional, overload
+from typing import TYPE_CHECKING, Optional, TypeVar, cast, overload
 from xml.etree import ElementTree
 
-from sqlalchemy import func
+from sqlalchemy import delete, select
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from database.models import Chart, Song
+from database.models import Chart, MusicXmlManifest, Song
+
+from .diff import TableDiff, TableSpec, apply_diff, diff_table, load_rows
+
+if TYPE_CHECKING:
+    from sqlalchemy import Table
+
+T = TypeVar("T")
+U = TypeVar("U")
 
 VERSIONS = [
     "CHUNITHM",
@@ -32,6 +46,26 @@ VERSIONS = [
     "LUMINOUS PLUS",
 ]
 
+# Music.xml folders handed to a worker at a time.
+WORKER_CHUNK_SIZE = 16
+# Below this many changed folders, they are read in a thread instead, since
+# starting worker processes takes longer than reading them.
+PROCESS_POOL_THRESHOLD = 100
+# Folders imported at a time. The next batch is parsed while one is written.
+IMPORT_BATCH_SIZE = 200
+
+# Jackets and whether a song was removed aren't in game dumps, so only songs
+# the dump adds get them.
+SONG_SPEC = TableSpec(
+    cast("Table", Song.__table__),
+    key=("id",),
+    coalesce=frozenset({"release", "bpm", "min_bpm", "max_bpm"}),
+    insert_only=frozenset({"jacket", "removed"}),
+)
+# Charts are never deleted, since a dump can be older than what was imported
+# from chunirec.
+CHART_SPEC = TableSpec(cast("Table", Chart.__table__), key=("song_id", "difficulty"))
+
 
 @overload
 def gettext(p: ElementTree.Element, path: str) -> Optional[str]:
@@ -51,199 +85,429 @@ def gettext(
     return default
 
 
-async def merge_options(
-    logger: Logger,
-    async_session: async_sessionmaker[AsyncSession],
-    data_dir: Path,
-    option_dir: Optional[Path],
-):
-    xml_paths = data_dir.glob("**/music/**/Music.xml")
+@dataclass
+class MusicFolder:
+    """A folder with a Music.xml and its charts."""
 
-    if option_dir is not None:
-        xml_paths = itertools.chain(
-            xml_paths,
-            option_dir.glob("**/music/**/Music.xml"),
-        )
+    path: Path
+    # Latest modification time and total size of the files in the folder
+    mtime_ns: int
+    size: int
 
-    inserted_songs = []
-    inserted_charts = []
+    sha256: Optional[str] = None
+    song_id: Optional[int] = None
 
-    for xml_path in xml_paths:
-        tree = ElementTree.parse(xml_path)
-        root = tree.getroot()
+    @staticmethod
+    def scan(path: Path) -> "MusicFolder":
+        stats = [x.stat() for x in path.iterdir() if x.is_file()]
+
+        return MusicFolder(
+            path=path,
+            mtime_ns=max((x.st_mtime_ns for x in stats), default=0),
+            size=sum(x.st_size for x in stats),
+        )
 
-        if root.tag != "MusicData":
-            logger.warning("%s: Invalid XML (missing MusicData root)", xml_path)
-            continue
 
-        song_id = gettext(root, "./name/id")
-        catcode = gettext(root, "./genreNames/list/StringID/id")
-        genre = gettext(root, "./genreNames/list/StringID/str")
-        we_tag_name = gettext(root, "./worldsEndTagName/str")
-        release_tag_id = gettext(root, path="./releaseTagName/id")
+@dataclass
+class ParsedMusic:
+    song: Optional[dict] = None
+    charts: list[dict] = field(default_factory=list)
+    # Log messages, since workers can't log to the parent's logger.
+    warnings: list[str] = field(default_factory=list)
+
+
+def fingerprint_folder(path: Path) -> tuple[str, Optional[int]]:
+    """Hashes the files in a Music.xml folder, and reads its song ID."""
+    sha256 = hashlib.sha256()
+
+    for file in sorted(x for x in path.iterdir() if x.is_file()):
+        data = file.read_bytes()
+        sha256.update(f"{file.name}\0{len(data)}\0".encode())
+        sha256.update(data)
+
+    try:
+        song_id = gettext(ElementTree.parse(path / "Music.xml").getroot(), "./name/id")
+    except ElementTree.ParseError:
+        song_id = None
+
+    return sha256.hexdigest(), int(song_id) if song_id is not None else None
+
+
+def parse_music_xml(xml_path: Path) -> ParsedMusic:
+    """Reads a song and its charts from a Music.xml. Runs in a worker process."""
+    result = ParsedMusic()
+
+    tree = ElementTree.parse(xml_path)
+    root = tree.getroot()
+
+    if root.tag != "MusicData":
+        result.warnings.append(f"{xml_path}: Invalid XML (missing MusicData root)")
+        return result
+
+    song_id = gettext(root, "./name/id")
+    catcode = gettext(root, "./genreNames/list/StringID/id")
+    genre = gettext(root, "./genreNames/list/StringID/str")
+    we_tag_name = gettext(root, "./worldsEndTagName/str")
+    release_tag_id = gettext(root, path="./releaseTagName/id")
+
+    if (
+        song_id is None
+        or catcode is None
+        or genre is None
+        or we_tag_name is None
+        or release_tag_id is None
+    ):
+        result.warnings.append(f"{xml_path}: Invalid XML (missing required tags)")
+        return result
+
+    if we_tag_name != "Invalid":
+        genre = "WORLD'S END"
+
+    release_date = gettext(root, "./releaseDate")
+
+    inserted_song = {
+        "id": int(song_id),
+        "title": gettext(root, "./name/str"),
+        "chunithm_catcode": int(catcode),
+        "genre": genre,
+        "artist": gettext(root, "./artistName/str"),
+        "release": f"{release_date[:4]}-{release_date[4:6]}-{release_date[6:]}"
+        if release_date
+        else None,
+        "version": VERSIONS[int(release_tag_id)],
+        "bpm": None,
+        "min_bpm": None,
+        "max_bpm": None,
+        # The column can't be NULL, even if the upsert ends up updating an
+        # existing song, whose jacket is kept.
+        "jacket": "",
+        "available": gettext(root, "./disableFlag") != "true",
+        "removed": False,
+    }
+
+    for idx, chart in enumerate(root.findall("./fumens/MusicFumenData[enable='true']")):
+        difficulty = gettext(chart, "./type/data")
+        chart_filename = gettext(chart, "./file/path")
+        level_str = gettext(chart, "./level")
+        level_decimal_str = gettext(chart, "./levelDecimal")
 
         if (
-            song_id is None
-            or catcode is None
-            or genre is None
-            or we_tag_name is None
-            or release_tag_id is None
+            difficulty is None
+            or chart_filename is None
+            or level_str is None
+            or level_decimal_str is None
         ):
-            logger.warning("%s: Invalid XML (missing required tags)", xml_path)
+            result.warnings.append(
+                f"{xml_path}: Invalid MusicFumenData at index {idx} (missing required tags)"
+            )
             continue
 
-        logger.debug("Reading music ID %s", song_id)
-
-        if we_tag_name != "Invalid":
-            genre = "WORLD'S END"
-
-        release_date = gettext(root, "./releaseDate")
-
-        inserted_song = {
-            "id": int(song_id),
-            "title": gettext(root, "./name/str"),
-            "chunithm_catcode": int(catcode),
-            "genre": genre,
-            "artist": gettext(root, "./artistName/str"),
-            "release": f"{release_date[:4]}-{release_date[4:6]}-{release_date[6:]}"
-            if release_date
-            else None,
-            "version": VERSIONS[int(release_tag_id)],
-            "bpm": None,
-            "min_bpm": None,
-            "max_bpm": None,
-            "jacket": None,
-            "available": gettext(root, "./disableFlag") != "true",
-            "removed": False,
+        level_decimal = int(level_decimal_str)
+
+        if genre == "WORLD'S END":
+            star_dif_type = int(gettext(root, "./starDifType", "0"))
+            displayed_level = we_tag_name
+
+            for _ in range(-1, star_dif_type, 2):
+                displayed_level += "☆"
+
+            const = None
+        else:
+            displayed_level = level_str + ("+" if level_decimal >= 50 else "")
+            const = float(f"{level_str}.{level_decimal_str}")
+
+        inserted_chart = {
+            "song_id": int(song_id),
+            "difficulty": "WE" if difficulty == "WORLD'S END" else difficulty[:3],
+            "level": displayed_level,
+            "const": const,
+            # Charts are upserted together, so they all need the same keys.
+            "maxcombo": None,
+            "tap": None,
+            "hold": None,
+            "slide": None,
+            "air": None,
+            "flick": None,
+            "charter": None,
         }
 
-        for idx, chart in enumerate(
-            root.findall("./fumens/MusicFumenData[enable='true']")
+        with xml_path.with_name(chart_filename).open(encoding="utf-8") as f:
+            rd = csv.reader(f, delimiter="\t")
+
+            for row in rd:
+                if len(row) == 0:
+                    continue
+
+                command = row[0]
+
+                if command == "BPM_DEF" and inserted_song.get("bpm") is None:
+                    inserted_song["bpm"] = float(row[2])
+                if command == "BPM":
+                    bpm = float(row[3])
+
+                    if (
+                        min_bpm := inserted_song.get("min_bpm")
+                    ) is None or bpm < min_bpm:
+                        inserted_song["min_bpm"] = bpm
+                    if (
+                        max_bpm := inserted_song.get("max_bpm")
+                    ) is None or bpm > max_bpm:
+                        inserted_song["max_bpm"] = bpm
+                elif command == "T_JUDGE_ALL":
+                    inserted_chart["maxcombo"] = int(row[1])
+                elif command == "T_JUDGE_TAP":
+                    inserted_chart["tap"] = int(row[1])
+                elif command == "T_JUDGE_HLD":
+                    inserted_chart["hold"] = int(row[1])
+                elif command == "T_JUDGE_SLD":
+                    inserted_chart["slide"] = int(row[1])
+                elif command == "T_JUDGE_AIR":
+                    inserted_chart["air"] = int(row[1])
+                elif command == "T_JUDGE_FLK":
+                    inserted_chart["flick"] = int(row[1])
+                elif command == "CREATOR":
+                    inserted_chart["charter"] = row[1]
+
+        result.charts.append(inserted_chart)
+
+    result.song = inserted_song
+    return result
+
+
+def _map_chunk(fn: Callable[[T], U], items: list[T]) -> list[U]:
+    return [fn(x) for x in items]
+
+
+async def _map(
+    executor: Optional[Executor], fn: Callable[[T], U], items: list[T]
+) -> list[U]:
+    """`executor.map(fn, items)`, in chunks, without blocking the event loop.
+    Runs in the default thread pool if `executor` is None."""
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor, _map_chunk, fn, items[i : i + WORKER_CHUNK_SIZE]
+            )
+            for i in range(0, len(items), WORKER_CHUNK_SIZE)
+        )
+    )
+
+    return [x for chunk in chunks for x in chunk]
+
+
+def folders_to_import(
+    folders: list[MusicFolder],
+    manifest: dict[str, MusicXmlManifest],
+    removed: Sequence[str] = (),
+) -> list[MusicFolder]:
+    """Picks the folders that changed since the last import, in order.
+
+    Folders later in `folders` override earlier ones that have the same song
+    ID. An unchanged folder is picked as well if an earlier one with the same
+    song ID changed, so that it still wins. Every folder with the song ID of a
+    `removed` one is picked, so that what it overrode is imported again.
+
+    `sha256` and `song_id` must be set on folders that were touched.
+    """
+    picked = []
+    # Song IDs of the folders picked so far, including the IDs they used to
+    # have.
+    reimported_ids: set[Optional[int]] = {manifest[path].song_id for path in removed}
+
+    for folder in folders:
+        previous = manifest.get(str(folder.path))
+
+        if previous is None or (
+            folder.sha256 is not None and previous.sha256 != folder.sha256
         ):
-            difficulty = gettext(chart, "./type/data")
-            chart_filename = gettext(chart, "./file/path")
-            level_str = gettext(chart, "./level")
-            level_decimal_str = gettext(chart, "./levelDecimal")
+            picked.append(folder)
+            reimported_ids.add(folder.song_id)
+            if previous is not None:
+                reimported_ids.add(previous.song_id)
+        elif previous.song_id is not None and previous.song_id in reimported_ids:
+            picked.append(folder)
 
+    return picked
+
+
+def batch_by_song(folders: list[MusicFolder], size: int) -> list[list[MusicFolder]]:
+    """Splits folders into batches of about `size` folders.
+
+    Folders with the same song ID are kept in the same batch, in order, so
+    that one overriding another is resolved within a batch.
+    """
+    groups: dict[Optional[int], list[MusicFolder]] = {}
+    for folder in folders:
+        groups.setdefault(folder.song_id, []).append(folder)
+
+    batches: list[list[MusicFolder]] = []
+    for group in groups.values():
+        if len(batches) == 0 or len(batches[-1]) + len(group) > size:
+            batches.append([])
+        batches[-1].extend(group)
+
+    return batches
+
+
+async def merge_options(
+    logger: Logger,
+    async_session: async_sessionmaker[AsyncSession],
+    data_dir: Path,
+    option_dir: Optional[Path],
+) -> list[TableDiff]:
+    roots = [data_dir] if option_dir is None else [data_dir, option_dir]
+    # Sorted, so that which folder overrides which doesn't depend on the order
+    # the file system lists them in.
+    folders = [
+        MusicFolder.scan(xml_path.parent.resolve())
+        for root in roots
+        for xml_path in sorted(root.glob("**/music/**/Music.xml"))
+    ]
+
+    async with async_session() as session:
+        manifest = {
+            x.path: x
+            for x in (await session.execute(select(MusicXmlManifest))).scalars()
+        }
+
+    # Folders that are gone. Only the roots that were scanned are looked at,
+    # since folders elsewhere may just not have been passed this time.
+    scanned_roots = [root.resolve() for root in roots]
+    scanned_paths = {str(x.path) for x in folders}
+    removed = [
+        path
+        for path in manifest
+        if path not in scanned_paths
+        and any(Path(path).is_relative_to(root) for root in scanned_roots)
+    ]
+
+    # Only hash the folders whose files were touched since the last import, to
+    # tell whether they actually changed.
+    touched = [
+        x
+        for x in folders
+        if (previous := manifest.get(str(x.path))) is None
+        or (previous.mtime_ns, previous.size) != (x.mtime_ns, x.size)
+    ]
+
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if len(touched) >= PROCESS_POOL_THRESHOLD:
+            # Forking a process with threads, like the database connection's,
+            # can deadlock.
+            pool = stack.enter_context(
+                ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+            )
+
+        fingerprints = await _map(pool, fingerprint_folder, [x.path for x in touched])
+        for folder, (sha256, song_id) in zip(touched, fingerprints, strict=True):
+            folder.sha256 = sha256
+            folder.song_id = song_id
+        for folder in folders:
             if (
-                difficulty is None
-                or chart_filename is None
-                or level_str is None
-                or level_decimal_str is None
+                folder.sha256 is None
+                and (previous := manifest.get(str(folder.path))) is not None
             ):
-                logger.warning(
-                    "%s: Invalid MusicFumenData at index %d (missing required tags)",
-                    xml_path,
-                    idx,
-                )
-                continue
-
-            logger.debug("Reading music ID %s, difficulty %s", song_id, difficulty)
-
-            level_decimal = int(level_decimal_str)
-
-            if genre == "WORLD'S END":
-                star_dif_type = int(gettext(root, "./starDifType", "0"))
-                displayed_level = we_tag_name
-
-                for _ in range(-1, star_dif_type, 2):
-                    displayed_level += "☆"
-
-                const = None
-            else:
-                displayed_level = level_str + ("+" if level_decimal >= 50 else "")
-                const = float(f"{level_str}.{level_decimal_str}")
-
-            inserted_chart = {
-                "song_id": int(song_id),
-                "difficulty": "WE" if difficulty == "WORLD'S END" else difficulty[:3],
-                "level": displayed_level,
-                "const": const,
-            }
-
-            with xml_path.with_name(chart_filename).open(encoding="utf-8") as f:
-                rd = csv.reader(f, delimiter="\t")
-
-                for row in rd:
-                    if len(row) == 0:
-                        continue
-
-                    command = row[0]
-
-                    if command == "BPM_DEF" and inserted_song.get("bpm") is None:
-                        inserted_song["bpm"] = float(row[2])
-                    if command == "BPM":
-                        bpm = float(row[3])
-
-                        if (
-                            min_bpm := inserted_song.get("min_bpm")
-                        ) is None or bpm < min_bpm:
-                            inserted_song["min_bpm"] = bpm
-                        if (
-                            max_bpm := inserted_song.get("max_bpm")
-                        ) is None or bpm > max_bpm:
-                            inserted_song["max_bpm"] = bpm
-                    elif command == "T_JUDGE_ALL":
-                        inserted_chart["maxcombo"] = int(row[1])
-                    elif command == "T_JUDGE_TAP":
-                        inserted_chart["tap"] = int(row[1])
-                    elif command == "T_JUDGE_HLD":
-                        inserted_chart["hold"] = int(row[1])
-                    elif command == "T_JUDGE_SLD":
-                        inserted_chart["slide"] = int(row[1])
-                    elif command == "T_JUDGE_AIR":
-                        inserted_chart["air"] = int(row[1])
-                    elif command == "T_JUDGE_FLK":
-                        inserted_chart["flick"] = int(row[1])
-                    elif command == "CREATOR":
-                        inserted_chart["charter"] = row[1]
-
-            inserted_charts.append(inserted_chart)
-
-        inserted_songs.append(inserted_song)
-
-    async with async_session() as session, session.begin():
+                folder.song_id = previous.song_id
+
+        picked = folders_to_import(folders, manifest, removed)
         logger.info(
-            "Upserting %d songs and %d charts",
-            len(inserted_songs),
-            len(inserted_charts),
+            "Importing %d of %d Music.xml folders (%d touched since the last import)",
+            len(picked),
+            len(folders),
+            len(touched),
         )
 
-        insert_stmt = insert(Song)
+        batches = batch_by_song(picked, IMPORT_BATCH_SIZE)
+        song_diff = TableDiff(SONG_SPEC)
+        chart_diff = TableDiff(CHART_SPEC)
+
+        async with async_session() as session, session.begin():
+            pending = None
+            for i, batch in enumerate(batches):
+                if pending is None:
+                    pending = asyncio.ensure_future(
+                        _map(
+                            pool, parse_music_xml, [x.path / "Music.xml" for x in batch]
+                        )
+                    )
+                results = await pending
+
+                # The next batch is parsed while this one is written.
+                pending = None
+                if i + 1 < len(batches):
+                    pending = asyncio.ensure_future(
+                        _map(
+                            pool,
+                            parse_music_xml,
+                            [x.path / "Music.xml" for x in batches[i + 1]],
+                        )
+                    )
+
+                inserted_songs = []
+                inserted_charts = []
+                for result in results:
+                    for warning in result.warnings:
+                        logger.warning(warning)
+
+                    if result.song is not None:
+                        inserted_songs.append(result.song)
+                        inserted_charts.extend(result.charts)
+
+                # Only the rows of this batch's songs are compared.
+                song_ids = [x["id"] for x in inserted_songs]
+                for combined, rows, column in (
+                    (song_diff, inserted_songs, "id"),
+                    (chart_diff, inserted_charts, "song_id"),
+                ):
+                    spec = combined.spec
+                    current = await load_rows(
+                        session, spec, spec.table.c[column].in_(song_ids)
+                    )
+                    diff = diff_table(spec, current, rows)
+                    await apply_diff(session, diff)
+                    combined.extend(diff)
+
+            # Recorded in the same transaction, so that the manifest never says
+            # something was imported when it wasn't.
+            await _update_manifest(session, touched, removed)
+
+    for diff in (song_diff, chart_diff):
+        logger.info(diff.summary())
+
+    return [song_diff, chart_diff]
+
+
+async def _update_manifest(
+    session: AsyncSession, touched: list[MusicFolder], removed: list[str]
+):
+    if len(touched) > 0:
+        insert_stmt = insert(MusicXmlManifest)
         upsert_stmt = insert_stmt.on_conflict_do_update(
-            index_elements=[Song.id],
+            index_elements=[MusicXmlManifest.path],
             set_={
-                "title": insert_stmt.excluded.title,
-                "chunithm_catcode": insert_stmt.excluded.chunithm_catcode,
-                "genre": insert_stmt.excluded.genre,
-                "artist": insert_stmt.excluded.artist,
-                "release": func.coalesce(insert_stmt.excluded.release, Song.release),
-                "version": insert_stmt.excluded.version,
-                "bpm": func.coalesce(insert_stmt.excluded.bpm, Song.bpm),
-                "min_bpm": func.coalesce(insert_stmt.excluded.min_bpm, Song.min_bpm),
-                "max_bpm": func.coalesce(insert_stmt.excluded.max_bpm, Song.max_bpm),
-                # also ignore jackets
-                "available": insert_stmt.excluded.available,
-                # also ignore removed state
+                "song_id": insert_stmt.excluded.song_id,
+                "mtime_ns": insert_stmt.excluded.mtime_ns,
+                "size": insert_stmt.excluded.size,
+                "sha256": insert_stmt.excluded.sha256,
             },
         )
-
-        await session.execute(upsert_stmt, inserted_songs)
-
-        insert_stmt = insert(Chart)
-        upsert_stmt = insert_stmt.on_conflict_do_update(
-            index_elements=[Chart.song_id, Chart.difficulty],
-            set_={
-                "level": insert_stmt.excluded.level,
-                "const": insert_stmt.excluded.const,
-                "maxcombo": insert_stmt.excluded.maxcombo,
-                "tap": insert_stmt.excluded.tap,
-                "hold": insert_stmt.excluded.hold,
-                "slide": insert_stmt.excluded.slide,
-                "air": insert_stmt.excluded.air,
-                "flick": insert_stmt.excluded.flick,
-                "charter": insert_stmt.excluded.charter,
-            },
+        await session.execute(
+            upsert_stmt,
+            [
+                {
+                    "path": str(x.path),
+                    "song_id": x.song_id,
+                    "mtime_ns": x.mtime_ns,
+                    "size": x.size,
+                    "sha256": x.sha256,
+                }
+                for x in touched
+            ],
         )
 
-        await session.execute(upsert_stmt, inserted_charts)
+    if len(removed) > 0:
+        await session.execute(
+            delete(MusicXmlManifest).where(MusicXmlManifest.path.in_(removed))
+        )
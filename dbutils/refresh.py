@@ -0,0 +1,68 @@
+"""Refreshing the catalog of a database that is in use.
+
+The importers are run against a shadow copy of the database, which is swapped
+in once it has been checked (see `database.shadow`), so the bot can keep
+serving commands while chunirec and sdvx.in are fetched and matched.
+"""
+import asyncio
+from logging import Logger
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.shadow import copy_database, swap_catalog, validate_catalog
+
+from .chunirec import update_db
+from .diff import TableDiff
+from .http_cache import HttpCache
+from .sdvxin import update_sdvxin
+
+__all__ = ["refresh_catalog"]
+
+
+def _remove_database(path: Path) -> None:
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        path.with_name(f"{path.name}{suffix}").unlink(missing_ok=True)
+
+
+async def refresh_catalog(
+    logger: Logger, database: Path, *, cache_dir: Path
+) -> list[TableDiff]:
+    """Imports chunirec and sdvx.in into a shadow copy of `database`, and swaps
+    the result in if it is valid.
+
+    Returns what changed. Nothing is swapped if nothing changed.
+
+    Raises
+    ------
+    CatalogValidationError
+        If the imported catalog looks broken. `database` is left untouched.
+    """
+    shadow = database.with_name(f"{database.name}.shadow")
+    _remove_database(shadow)
+
+    try:
+        await asyncio.to_thread(copy_database, database, shadow)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{shadow}")
+        try:
+            async_session = async_sessionmaker(engine, expire_on_commit=False)
+            diffs = await update_db(
+                logger, async_session, cache=HttpCache(cache_dir / "chunirec")
+            )
+            diffs += await update_sdvxin(
+                logger, async_session, cache=HttpCache(cache_dir / "sdvxin")
+            )
+        finally:
+            await engine.dispose()
+
+        if sum(len(x) for x in diffs) == 0:
+            logger.info("Catalog is up to date")
+            return diffs
+
+        await asyncio.to_thread(validate_catalog, shadow, database)
+        await asyncio.to_thread(swap_catalog, database, shadow)
+    finally:
+        _remove_database(shadow)
+
+    return diffs
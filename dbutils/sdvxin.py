@@ -1,22 +1,36 @@
 # ruff: noqa: RUF001
 
+import asyncio
 import importlib.util
 import re
+from dataclasses import dataclass
 from html import unescape
 from logging import Logger
+from typing import TYPE_CHECKING, Optional, cast
 
 import aiohttp
 from bs4 import BeautifulSoup
 from bs4.element import Comment
 from sqlalchemy import select
-from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from database.models import Chart, SdvxinChartView, Song
 
+from .diff import TableDiff, TableSpec, apply_diff, diff_table, load_rows
+from .http_cache import HttpCache
+
+if TYPE_CHECKING:
+    from sqlalchemy import Table
+
 WORLD_END_SDVXIN_REGEX = re.compile(
     r"document\.title\s*=\s*['\"](?P<title>.+?) \[WORLD'S END(?:\])?\s*(?P<difficulty>.+?)(?:\]\s*)?['\"]"
 )
+# A song's links are only removed if its page could be fetched and parsed.
+SDVXIN_SPEC = TableSpec(
+    cast("Table", SdvxinChartView.__table__),
+    key=("id", "difficulty"),
+    delete_scope="song_id",
+)
 SDVXIN_CATEGORIES = [
     "pops",
     "niconico",
@@ -115,120 +129,212 @@ TITLE_MAPPING = {
 }
 
 
+# Scripts fetched from sdvx.in at once.
+SCRIPT_CONCURRENCY = 8
+
+
+@dataclass
+class SdvxinEntry:
+    category: str
+    title: str
+    sdvx_in_id: str
+    script_url: str
+
+
+def parse_category_page(
+    html: str, category: str, bs4_features: str
+) -> Optional[list[SdvxinEntry]]:
+    """Returns the songs listed on a category page, or None if it has no song
+    table."""
+    soup = BeautifulSoup(html, bs4_features)
+
+    tables = soup.select("table:has(td.tbgl)")
+    if len(tables) == 0:
+        return None
+
+    entries = []
+    for table in tables:
+        for script in table.select("script[src]"):
+            title = next(
+                (str(x) for x in script.next_elements if isinstance(x, Comment)),
+                None,
+            )
+
+            if title is None:
+                continue
+
+            entries.append(
+                SdvxinEntry(
+                    category=category,
+                    title=TITLE_MAPPING.get(title, unescape(title)),
+                    # TODO: dont assume the ID is always 5 digits
+                    sdvx_in_id=str(script["src"]).split("/")[-1][:5],
+                    script_url=f"https://sdvx.in{script['src']}",
+                )
+            )
+
+    return entries
+
+
+async def build_song_index(
+    session: AsyncSession,
+) -> dict[tuple[str, bool, Optional[str]], int]:
+    """Indexes every song by what sdvx.in identifies it with, so that matching
+    a script doesn't need a query of its own."""
+    # key: (title, is WORLD'S END, WORLD'S END level or None)
+    # value: song ID
+    index: dict[tuple[str, bool, Optional[str]], int] = {}
+
+    for id, title in await session.execute(
+        select(Song.id, Song.title).where(Song.id < 8000)
+    ):
+        index.setdefault((title, False, None), id)
+
+    for id, title, level in await session.execute(
+        select(Song.id, Song.title, Chart.level).join(Chart).where(Song.id >= 8000)
+    ):
+        index.setdefault((title, True, level), id)
+
+    return index
+
+
 async def update_sdvxin(
-    logger: Logger, async_session: async_sessionmaker[AsyncSession]
-):
+    logger: Logger,
+    async_session: async_sessionmaker[AsyncSession],
+    *,
+    cache: HttpCache,
+) -> list[TableDiff]:
     bs4_features = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
 
-    # sdvx.in ID, song_id, difficulty
-    inserted_data: list[dict] = []
     async with aiohttp.ClientSession(
         timeout=aiohttp.ClientTimeout(total=600)
-    ) as client, async_session() as session, session.begin():
-        # standard categories
-        for category in SDVXIN_CATEGORIES:
+    ) as client:
+        semaphore = asyncio.Semaphore(SCRIPT_CONCURRENCY)
+
+        async def fetch(url: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return (await cache.get(client, url)).text()
+                except aiohttp.ClientResponseError as e:
+                    logger.warning(f"Could not fetch {url}: {e.status} {e.message}")
+                    return None
+
+        category_urls = [
+            "https://sdvx.in/chunithm/end.htm"
+            if category == "end"
+            else f"https://sdvx.in/chunithm/sort/{category}.htm"
+            for category in SDVXIN_CATEGORIES
+        ]
+        category_pages = await asyncio.gather(*(fetch(x) for x in category_urls))
+
+        entries: list[SdvxinEntry] = []
+        for category, page in zip(SDVXIN_CATEGORIES, category_pages, strict=True):
             logger.info(f"Processing category {category}")
-            if category == "end":
-                url = "https://sdvx.in/chunithm/end.htm"
-            else:
-                url = f"https://sdvx.in/chunithm/sort/{category}.htm"
-            resp = await client.get(url)
-            soup = BeautifulSoup(await resp.text(), bs4_features)
-
-            tables = soup.select("table:has(td.tbgl)")
-            if len(tables) == 0:
+
+            category_entries = (
+                parse_category_page(page, category, bs4_features)
+                if page is not None
+                else None
+            )
+            if category_entries is None:
                 logger.error(f"Could not find table(s) for category {category}")
                 continue
 
-            for table in tables:
-                scripts = table.select("script[src]")
-
-                for script in scripts:
-                    title = next(
-                        (
-                            str(x)
-                            for x in script.next_elements
-                            if isinstance(x, Comment)
-                        ),
-                        None,
-                    )
-
-                    if title is None:
-                        continue
-
-                    title = TITLE_MAPPING.get(title, unescape(title))
-                    sdvx_in_id = str(script["src"]).split("/")[-1][
-                        :5
-                    ]  # TODO: dont assume the ID is always 5 digits
-
-                    stmt = select(Song)
-                    condition = Song.title == title
-                    script_data = None
-                    level = None
-
-                    if category == "end":
-                        script_resp = await client.get(
-                            f"https://sdvx.in{script['src']}"
-                        )
-                        script_data = await script_resp.text()
-
-                        match = WORLD_END_SDVXIN_REGEX.search(script_data)
-                        if (
-                            match is None
-                            or (level := match.group("difficulty")) is None
-                        ):
-                            logger.warning(
-                                f"Could not extract difficulty for {title}, {sdvx_in_id}"
-                            )
-                            continue
-
-                        stmt = stmt.join(Chart)
-                        condition &= (Song.id >= 8000) & (Chart.level == level)
-                    else:
-                        condition &= Song.id < 8000
-
-                    stmt = stmt.where(condition)
-                    song = (await session.execute(stmt)).scalar_one_or_none()
-
-                    if song is None:
-                        if category == "end":
-                            logger.warning("Could not find %s [%s]", title, level)
-                        else:
-                            logger.warning("Could not find %s", title)
-
-                        continue
-
-                    if script_data is None:
-                        script_resp = await client.get(
-                            f"https://sdvx.in{script['src']}"
-                        )
-                        script_data = await script_resp.text()
-
-                    for line in script_data.splitlines():
-                        if not line.startswith(f"var LV{sdvx_in_id}"):
-                            continue
-
-                        key, value = line.split("=", 1)
-
-                        # var LV00000W
-                        # var LV00000W2
-                        level = SDVXIN_DIFFICULTY_MAPPING[key[11]]
-                        end_index = key[12] if len(key) > 12 else ""
-                        value_soup = BeautifulSoup(
-                            value.removeprefix('"').removesuffix('";'), bs4_features
-                        )
-
-                        if value_soup.select_one("a") is None:
-                            continue
-
-                        inserted_data.append(
-                            {
-                                "id": sdvx_in_id,
-                                "song_id": song.id,
-                                "difficulty": level,
-                                "end_index": end_index,
-                            }
-                        )
-
-        stmt = insert(SdvxinChartView).on_conflict_do_nothing()
-        await session.execute(stmt, inserted_data)
+            entries.extend(category_entries)
+
+        async with async_session() as session:
+            song_index = await build_song_index(session)
+
+        # WORLD'S END scripts are always needed, since the song can only be
+        # told apart by the level in the script.
+        script_urls = list(
+            dict.fromkeys(
+                x.script_url
+                for x in entries
+                if x.category == "end" or (x.title, False, None) in song_index
+            )
+        )
+        scripts = dict(
+            zip(
+                script_urls,
+                await asyncio.gather(*(fetch(x) for x in script_urls)),
+                strict=True,
+            )
+        )
+        logger.info(
+            f"Fetched {len(script_urls)} scripts, {cache.hits} pages unchanged since the last run"
+        )
+
+    # sdvx.in ID, song_id, difficulty
+    inserted_data: list[dict] = []
+    for entry in entries:
+        title = entry.title
+        sdvx_in_id = entry.sdvx_in_id
+        script_data = scripts.get(entry.script_url)
+
+        if entry.category == "end":
+            match = (
+                WORLD_END_SDVXIN_REGEX.search(script_data)
+                if script_data is not None
+                else None
+            )
+            if match is None or (level := match.group("difficulty")) is None:
+                logger.warning(
+                    f"Could not extract difficulty for {title}, {sdvx_in_id}"
+                )
+                continue
+
+            song_id = song_index.get((title, True, level))
+            if song_id is None:
+                logger.warning("Could not find %s [%s]", title, level)
+                continue
+        else:
+            song_id = song_index.get((title, False, None))
+            if song_id is None:
+                logger.warning("Could not find %s", title)
+                continue
+
+        if script_data is None:
+            continue
+
+        for line in script_data.splitlines():
+            if not line.startswith(f"var LV{sdvx_in_id}"):
+                continue
+
+            key, value = line.split("=", 1)
+
+            # var LV00000W
+            # var LV00000W2
+            level = SDVXIN_DIFFICULTY_MAPPING[key[11]]
+            end_index = key[12] if len(key) > 12 else ""
+            value_soup = BeautifulSoup(
+                value.removeprefix('"').removesuffix('";'), bs4_features
+            )
+
+            if value_soup.select_one("a") is None:
+                continue
+
+            inserted_data.append(
+                {
+                    "id": sdvx_in_id,
+                    "song_id": song_id,
+                    "difficulty": level,
+                    "end_index": end_index,
+                }
+            )
+
+    # The first link to a chart wins, like it did when they were inserted
+    # while ignoring conflicts.
+    inserted_data = list(
+        {SDVXIN_SPEC.key_of(x): x for x in reversed(inserted_data)}.values()
+    )
+
+    async with async_session() as session, session.begin():
+        diff = diff_table(
+            SDVXIN_SPEC, await load_rows(session, SDVXIN_SPEC), inserted_data
+        )
+        await apply_diff(session, diff)
+
+    logger.info(diff.summary())
+
+    return [diff]
@@ -0,0 +1,66 @@
+from http.cookiejar import LWPCookieJar
+
+import pytest
+
+from benchmarks.fake_chunithm_net import (
+    FakeChuniNet,
+    FakeChuniNetOptions,
+    RewritingTransport,
+    clal_cookie_jar,
+)
+from chunithm_net import ChuniNet
+from chunithm_net.exceptions import InvalidTokenException, MaintenanceException
+from chunithm_net.limiter import RateLimiter, set_default_limiter
+
+
+@pytest.fixture(autouse=True)
+def _no_rate_limit():
+    set_default_limiter(RateLimiter(rate=1000, burst=1000))
+
+
+@pytest.mark.asyncio
+async def test_fake_server_logs_in_and_serves_pages():
+    async with FakeChuniNet() as server:
+        jar = clal_cookie_jar()
+
+        async with ChuniNet(jar, transport=RewritingTransport(server.url)) as client:
+            best30 = await client.best30()
+            assert len(best30) == 30
+
+            token = client._token
+            assert token in server.sessions
+
+            # Logged in requests reuse the session.
+            await client.player_data()
+            assert client._token == token
+
+
+@pytest.mark.asyncio
+async def test_fake_server_expires_sessions():
+    async with FakeChuniNet() as server:
+        jar = clal_cookie_jar()
+
+        async with ChuniNet(jar, transport=RewritingTransport(server.url)) as client:
+            await client.authenticate()
+            token = client._token
+
+            server.sessions.clear()
+            await client.recent10()
+
+            assert client._token != token
+
+
+@pytest.mark.asyncio
+async def test_fake_server_errors():
+    async with FakeChuniNet() as server, ChuniNet(
+        LWPCookieJar(), transport=RewritingTransport(server.url)
+    ) as client:
+        with pytest.raises(InvalidTokenException):
+            await client.authenticate()
+
+    async with FakeChuniNet(FakeChuniNetOptions(maintenance_rate=1.0)) as server:
+        jar = clal_cookie_jar()
+
+        async with ChuniNet(jar, transport=RewritingTransport(server.url)) as client:
+            with pytest.raises(MaintenanceException):
+                await client.authenticate()
@@ -1,3 +1,4 @@
+import asyncio
 import string
 from datetime import timedelta
 from http.cookiejar import Cookie, LWPCookieJar
@@ -14,6 +15,7 @@ from chunithm_net.exceptions import (
     InvalidTokenException,
     MaintenanceException,
 )
+from chunithm_net.limiter import RateLimiter, set_default_limiter
 from chunithm_net.models.enums import (
     ClearType,
     ComboType,
@@ -21,10 +23,16 @@ from chunithm_net.models.enums import (
     Possession,
     Rank,
 )
+from chunithm_net.models.record import PlaylogMarker
 
 BASE_DIR = Path(__file__).parent
 
 
+@pytest.fixture(autouse=True)
+def _no_rate_limit():
+    set_default_limiter(RateLimiter(rate=1000, burst=1000))
+
+
 @pytest.fixture
 def clal():
     return "".join(choices(string.ascii_lowercase + string.digits, k=64))
@@ -531,6 +539,93 @@ async def test_client_parses_playlog(
     assert record.new_record is True
 
 
+@pytest.mark.asyncio
+async def test_client_returns_playlog_since_marker(
+    httpx_mock: HTTPXMock,
+    jar: LWPCookieJar,
+):
+    with (BASE_DIR / "assets" / "playlog.html").open("rb") as f:
+        content = f.read()
+
+    for _ in range(3):
+        httpx_mock.add_response(
+            method="GET",
+            url="https://chunithm-net-eng.com/mobile/record/playlog",
+            status_code=200,
+            content=content,
+        )
+
+    async with ChuniNet(jar) as client:
+        records, marker = await client.recent_record_since(None)
+
+        assert len(records) == 50
+        assert marker is not None
+        assert marker.matches(records[0])
+
+        old_marker = PlaylogMarker.from_record(records[3])
+        new_records, new_marker = await client.recent_record_since(old_marker)
+
+        assert [x.title for x in new_records] == [x.title for x in records[:3]]
+        assert new_marker == marker
+
+        new_records, new_marker = await client.recent_record_since(marker)
+
+        assert new_records == []
+        assert new_marker == marker
+
+
+@pytest.mark.asyncio
+async def test_client_coalesces_identical_requests(
+    httpx_mock: HTTPXMock,
+    jar: LWPCookieJar,
+):
+    with (BASE_DIR / "assets" / "playlog.html").open("rb") as f:
+        httpx_mock.add_response(
+            method="GET",
+            url="https://chunithm-net-eng.com/mobile/record/playlog",
+            status_code=200,
+            content=f.read(),
+        )
+
+    async with ChuniNet(jar) as client1, ChuniNet(jar) as client2:
+        results = await asyncio.gather(
+            client1.recent_record(),
+            client1.recent_record(),
+            client2.recent_record(),
+        )
+
+    assert len(httpx_mock.get_requests()) == 1
+    assert all(len(x) == 50 for x in results)
+
+
+@pytest.mark.asyncio
+async def test_client_shares_refreshed_cookies_with_coalesced_callers(
+    httpx_mock: HTTPXMock,
+    clal: str,
+    jar: LWPCookieJar,
+):
+    with (BASE_DIR / "assets" / "playlog.html").open("rb") as f:
+        httpx_mock.add_response(
+            method="GET",
+            url="https://chunithm-net-eng.com/mobile/record/playlog",
+            status_code=200,
+            headers={"Set-Cookie": "_t=refreshed; Path=/"},
+            content=f.read(),
+        )
+
+    # A separate jar for the same account, like another command would load.
+    other_jar = LWPCookieJar()
+    for cookie in jar:
+        other_jar.set_cookie(cookie)
+
+    async with ChuniNet(jar) as client1, ChuniNet(other_jar) as client2:
+        await asyncio.gather(client1.recent_record(), client2.recent_record())
+
+        assert len(httpx_mock.get_requests()) == 1
+        assert client1._token == "refreshed"
+        assert client2._token == "refreshed"
+
+
 @pytest.mark.asyncio
 async def test_client_parses_detailed_playlog(
     httpx_mock: HTTPXMock,
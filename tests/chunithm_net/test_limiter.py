@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+import pytest
+
+from chunithm_net.limiter import (
+    LimitedTransport,
+    Priority,
+    RateLimiter,
+    request_priority,
+)
+
+
+async def _drain(limiter: RateLimiter):
+    while limiter._tokens >= 1:
+        await limiter.acquire()
+
+
+@pytest.mark.asyncio
+async def test_limiter_allows_bursts():
+    limiter = RateLimiter(rate=1, burst=3)
+
+    await asyncio.wait_for(
+        asyncio.gather(*[limiter.acquire() for _ in range(3)]), timeout=0.1
+    )
+
+    stats = limiter.stats()
+    assert stats.priorities[Priority.INTERACTIVE].acquired == 3
+    assert stats.priorities[Priority.INTERACTIVE].waited == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_serves_higher_priority_first():
+    limiter = RateLimiter(rate=100, burst=1)
+    await _drain(limiter)
+
+    order = []
+
+    async def request(priority: Priority, name: str):
+        await limiter.acquire(priority, name)
+        order.append(name)
+
+    tasks = [
+        asyncio.create_task(request(Priority.BACKGROUND, "background")),
+        asyncio.create_task(request(Priority.BULK, "bulk")),
+        asyncio.create_task(request(Priority.INTERACTIVE, "interactive")),
+    ]
+    await asyncio.sleep(0)
+
+    assert limiter.stats().queue_depth == {
+        Priority.INTERACTIVE: 1,
+        Priority.BULK: 1,
+        Priority.BACKGROUND: 1,
+    }
+
+    await asyncio.gather(*tasks)
+
+    assert order == ["interactive", "bulk", "background"]
+    assert limiter.stats().priorities[Priority.BACKGROUND].waited == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_is_fair_between_users():
+    limiter = RateLimiter(rate=100, burst=1)
+    await _drain(limiter)
+
+    order = []
+
+    async def request(user: int):
+        await limiter.acquire(Priority.BULK, user)
+        order.append(user)
+
+    tasks = [asyncio.create_task(request(1)) for _ in range(3)]
+    tasks.append(asyncio.create_task(request(2)))
+    await asyncio.gather(*tasks)
+
+    assert order == [1, 2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_limiter_skips_cancelled_waiters():
+    limiter = RateLimiter(rate=100, burst=1)
+    await _drain(limiter)
+
+    cancelled = asyncio.create_task(limiter.acquire(Priority.INTERACTIVE, 1))
+    waiting = asyncio.create_task(limiter.acquire(Priority.INTERACTIVE, 2))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+
+    await asyncio.wait_for(waiting, timeout=1)
+    assert limiter.stats().queue_depth[Priority.INTERACTIVE] == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_returns_tokens_of_cancelled_waiters():
+    # Slow enough that the dispatcher never hands out a token by itself.
+    limiter = RateLimiter(rate=0.001, burst=1)
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    # The waiter is handed a token, but cancelled before it gets to run.
+    fut = limiter._next_waiter()
+    assert fut is not None
+    fut.set_result(None)
+    waiter.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    await asyncio.wait_for(limiter.acquire(), timeout=0.1)
+    limiter._dispatcher.cancel()  # type: ignore[reportOptionalMemberAccess]
+
+
+@pytest.mark.asyncio
+async def test_request_priority_overrides_the_transports():
+    limiter = RateLimiter(rate=1, burst=2)
+    transport = LimitedTransport(
+        httpx.MockTransport(lambda _: httpx.Response(200)), limiter
+    )
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        with request_priority(Priority.BACKGROUND):
+            await client.get("https://example.com")
+        await client.get("https://example.com")
+
+    stats = limiter.stats()
+    assert stats.priorities[Priority.BACKGROUND].acquired == 1
+    assert stats.priorities[Priority.INTERACTIVE].acquired == 1
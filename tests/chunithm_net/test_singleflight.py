@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from chunithm_net._singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_singleflight_coalesces_concurrent_calls():
+    group: SingleFlight[int] = SingleFlight()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*[group.do("key", fn) for _ in range(5)])
+
+    assert results == [1] * 5
+    assert calls == 1
+    assert group.coalesced == 4
+    assert len(group) == 0
+
+    assert await group.do("key", fn) == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_propagates_exceptions():
+    group: SingleFlight[int] = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise ValueError
+
+    results = await asyncio.gather(
+        *[group.do("key", fn) for _ in range(3)], return_exceptions=True
+    )
+
+    assert all(isinstance(x, ValueError) for x in results)
+    assert len(group) == 0
+
+
+@pytest.mark.asyncio
+async def test_singleflight_cancelling_one_caller_keeps_call_alive():
+    group: SingleFlight[int] = SingleFlight()
+    started = 0
+
+    async def fn():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return 1
+
+    owner = asyncio.create_task(group.do("key", fn))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do("key", fn))
+    await asyncio.sleep(0)
+
+    owner.cancel()
+
+    assert await follower == 1
+    with pytest.raises(asyncio.CancelledError):
+        await owner
+    assert started == 1
+
+
+@pytest.mark.asyncio
+async def test_singleflight_follower_retries_if_owner_resources_go_away():
+    group: SingleFlight[str] = SingleFlight()
+    closed = asyncio.Event()
+
+    async def owner_fn():
+        await asyncio.sleep(0.01)
+        if closed.is_set():
+            msg = "client has been closed"
+            raise RuntimeError(msg)
+        return "owner"
+
+    async def follower_fn():
+        return "follower"
+
+    async def owner():
+        try:
+            return await group.do("key", owner_fn)
+        finally:
+            closed.set()
+
+    owner_task = asyncio.create_task(owner())
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do("key", follower_fn))
+    await asyncio.sleep(0)
+
+    owner_task.cancel()
+
+    assert await follower == "follower"
+
+
+@pytest.mark.asyncio
+async def test_singleflight_cancels_call_when_everyone_leaves():
+    group: SingleFlight[int] = SingleFlight()
+    cancelled = False
+
+    async def fn():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return 1
+
+    tasks = [asyncio.create_task(group.do("key", fn)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert cancelled
+    assert len(group) == 0
+
+
+@pytest.mark.asyncio
+async def test_singleflight_follower_retries_if_call_is_cancelled():
+    group: SingleFlight[str] = SingleFlight()
+
+    async def owner_fn():
+        await asyncio.sleep(1)
+        return "owner"
+
+    async def follower_fn():
+        return "follower"
+
+    owner = asyncio.create_task(group.do("key", owner_fn))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do("key", follower_fn))
+    await asyncio.sleep(0)
+
+    group._calls["key"].task.cancel()
+
+    assert await follower == "follower"
+    with pytest.raises(asyncio.CancelledError):
+        await owner
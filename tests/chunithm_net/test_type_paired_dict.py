@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+import pytest
+
+from chunithm_net.consts import KEY_PLAY_RATING, KEY_SONG_ID
+from chunithm_net.models.enums import Difficulty
+from chunithm_net.models.record import MusicRecord, Record, RecordExtras
+from chunithm_net.models.type_paired_dict import TypePairedDictKey
+
+
+def test_slotted_keys_are_stored_in_slots():
+    extras = RecordExtras()
+    extras[KEY_SONG_ID] = 2574
+    extras[KEY_PLAY_RATING] = Decimal("17.15")
+
+    assert extras.song_id == 2574  # type: ignore[reportAttributeAccessIssue]
+    assert extras[KEY_PLAY_RATING] == Decimal("17.15")
+    assert KEY_SONG_ID in extras
+    assert len(extras) == 2
+    assert extras._overflow is None
+
+
+def test_other_keys_are_stored_in_overflow():
+    key = TypePairedDictKey[str]()
+    slotless = TypePairedDictKey[str]("not_a_slot")
+    extras = RecordExtras()
+
+    assert extras.get(key) is None
+    with pytest.raises(KeyError):
+        extras[slotless]
+
+    extras[key] = "a"
+    extras[slotless] = "b"
+
+    assert extras[key] == "a"
+    assert extras[slotless] == "b"
+    assert len(extras) == 2
+
+    del extras[key]
+    assert key not in extras
+
+
+def test_extras_equality():
+    a, b = RecordExtras(), RecordExtras()
+    a[KEY_SONG_ID] = 1
+    assert a != b
+
+    b[KEY_SONG_ID] = 1
+    assert a == b
+
+
+def test_records_are_slotted():
+    record = Record(title="Air", difficulty=Difficulty.MASTER, score=1_000_000)
+    record.extras[KEY_SONG_ID] = 1
+
+    assert not hasattr(record, "__dict__")
+
+    music_record = MusicRecord.from_record(record)
+    assert music_record.title == "Air"
+    assert music_record.jacket == ""
+    assert music_record.extras[KEY_SONG_ID] == 1
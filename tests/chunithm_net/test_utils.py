@@ -1,10 +1,15 @@
 import importlib.util
+from datetime import datetime, timezone
 
 import pytest
 from bs4 import BeautifulSoup
 
 from chunithm_net.models.enums import ClearType, ComboType, Difficulty, Rank
-from chunithm_net.utils import difficulty_from_imgurl, get_rank_and_lamps
+from chunithm_net.utils import (
+    difficulty_from_imgurl,
+    get_rank_and_lamps,
+    maintenance_end,
+)
 
 
 @pytest.mark.parametrize(
@@ -153,3 +158,22 @@ def test_difficulty_from_imgurl(value, expected):
 def test_difficulty_from_imgurl_raises_on_unknown_difficulty(value):
     with pytest.raises(ValueError):
         difficulty_from_imgurl(value)
+
+
+@pytest.mark.parametrize(
+    ("now", "expected"),
+    [
+        (datetime(2023, 8, 4, 16, 59, tzinfo=timezone.utc), None),
+        (
+            datetime(2023, 8, 4, 17, 0, tzinfo=timezone.utc),
+            datetime(2023, 8, 4, 22, 0, tzinfo=timezone.utc),
+        ),
+        (
+            datetime(2023, 8, 4, 21, 59, tzinfo=timezone.utc),
+            datetime(2023, 8, 4, 22, 0, tzinfo=timezone.utc),
+        ),
+        (datetime(2023, 8, 4, 22, 0, tzinfo=timezone.utc), None),
+    ],
+)
+def test_maintenance_end(now: datetime, expected: "datetime | None"):
+    assert maintenance_end(now) == expected
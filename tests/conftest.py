@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database.models import Base, Song
+
+# Some modules read the configuration on import, so it's pointed at the
+# example before any test modules are imported.
+os.environ.setdefault(
+    "CHUNINEWBOT_CONFIG", str(Path(__file__).parents[1] / "bot.example.ini")
+)
+
+
+def make_song(id: int, title: Optional[str] = None, **columns: Any) -> Song:
+    """A song with placeholder values for every column that isn't passed."""
+    return Song(
+        **{
+            "id": id,
+            "title": f"Song {id}" if title is None else title,
+            "chunithm_catcode": 0,
+            "genre": "ORIGINAL",
+            "artist": "",
+            "version": "CHUNITHM",
+            "jacket": f"{id}.webp",
+            "available": True,
+            "removed": False,
+        }
+        | columns
+    )
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(tmp_path: Path):
+    """Sessions of an empty database in `tmp_path`. Modules that need data
+    override this with a fixture of the same name that seeds it."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'database.sqlite3'}")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_sessionmaker(engine)
+
+    await engine.dispose()
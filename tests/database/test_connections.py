@@ -0,0 +1,102 @@
+import asyncio
+import contextlib
+import logging
+import re
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.connections import checkpoint_wal, create_engines
+from database.models import Base, Prefix
+
+
+@pytest_asyncio.fixture()
+async def engines(tmp_path: Path):
+    write_engine, read_engine = create_engines(
+        f"sqlite+aiosqlite:///{tmp_path / 'database.sqlite3'}", read_connections=2
+    )
+
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield write_engine, read_engine
+
+    await write_engine.dispose()
+    await read_engine.dispose()
+
+
+def test_create_engines_in_memory():
+    write_engine, read_engine = create_engines("sqlite+aiosqlite:///:memory:")
+
+    assert write_engine is read_engine
+
+
+@pytest.mark.asyncio
+async def test_read_engine_rejects_writes(engines):
+    write_engine, read_engine = engines
+
+    async with async_sessionmaker(write_engine)() as session, session.begin():
+        await session.execute(insert(Prefix).values(guild_id=1, prefix="!"))
+
+    async with async_sessionmaker(read_engine)() as session:
+        assert await session.scalar(select(func.count()).select_from(Prefix)) == 1
+
+        with pytest.raises(OperationalError, match="readonly"):
+            await session.execute(insert(Prefix).values(guild_id=2, prefix="?"))
+
+
+@pytest.mark.asyncio
+async def test_writes_are_queued(engines):
+    write_engine, _ = engines
+    sessionmaker = async_sessionmaker(write_engine)
+
+    async def write(guild_id: int):
+        async with sessionmaker() as session, session.begin():
+            await session.execute(insert(Prefix).values(guild_id=guild_id, prefix="!"))
+            # Would fail with "database is locked" if another connection
+            # started writing meanwhile.
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(write(x) for x in range(20)))
+
+    assert write_engine.pool.size() == 1  # type: ignore[reportAttributeAccessIssue]
+
+    async with sessionmaker() as session:
+        assert await session.scalar(select(func.count()).select_from(Prefix)) == 20
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_wal(engines):
+    write_engine, _ = engines
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    records: list[logging.LogRecord] = []
+    logged = asyncio.Event()
+
+    class Handler(logging.Handler):
+        def emit(self, record: logging.LogRecord) -> None:
+            records.append(record)
+            logged.set()
+
+    async with write_engine.begin() as conn:
+        await conn.execute(insert(Prefix).values(guild_id=1, prefix="!"))
+
+    handler = Handler()
+    logger.addHandler(handler)
+    task = asyncio.create_task(checkpoint_wal(logger, write_engine, interval=0))
+    try:
+        await asyncio.wait_for(logged.wait(), timeout=5)
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        logger.removeHandler(handler)
+
+    # Everything written so far was copied to the database.
+    match = re.fullmatch(r"Checkpointed (\d+) of \1 WAL pages", records[0].getMessage())
+    assert match is not None
+    assert int(match[1]) > 0
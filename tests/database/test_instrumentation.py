@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.instrumentation import (
+    _START_TIMES,
+    StatementEvent,
+    add_statement_listener,
+)
+
+
+@pytest.mark.asyncio
+async def test_statement_listeners_see_failed_statements():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    first: list[StatementEvent] = []
+    second: list[StatementEvent] = []
+    add_statement_listener(engine, first.append)
+    add_statement_listener(engine, second.append)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+        with pytest.raises(OperationalError):
+            await conn.execute(text("SELECT * FROM missing"))
+
+        await conn.execute(text("SELECT 2"))
+
+        start_times = (await conn.get_raw_connection()).info[_START_TIMES]
+
+    await engine.dispose()
+
+    assert [(x.verb, x.error is None) for x in first] == [
+        ("SELECT", True),
+        ("SELECT", False),
+        ("SELECT", True),
+    ]
+    assert isinstance(first[1].error, Exception)
+    assert first[2].statement == "SELECT 2"
+    assert all(x.duration >= 0 for x in first)
+    assert second == first
+    # Nothing is left behind by the failed statement.
+    assert start_times == {}
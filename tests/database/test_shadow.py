@@ -0,0 +1,103 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from database.models import Alias, Chart
+from database.shadow import (
+    CatalogValidationError,
+    copy_database,
+    database_path,
+    swap_catalog,
+    validate_catalog,
+)
+from database.snapshot import get_catalog_version
+from tests.conftest import make_song
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    async with sessionmaker() as session, session.begin():
+        session.add_all([make_song(id, f"Song {id}") for id in range(1, 21)])
+        session.add_all(
+            Chart(song_id=id, difficulty="MAS", level="13", const=13.0)
+            for id in range(1, 21)
+        )
+
+    return sessionmaker
+
+
+def test_database_path():
+    assert database_path("sqlite+aiosqlite:///database/database.sqlite3") == Path(
+        "database/database.sqlite3"
+    )
+    assert database_path("sqlite+aiosqlite:///:memory:") is None
+
+
+@pytest.mark.asyncio
+async def test_swap_catalog(tmp_path: Path, sessionmaker):
+    live = tmp_path / "database.sqlite3"
+    shadow = tmp_path / "database.sqlite3.shadow"
+    copy_database(live, shadow)
+
+    with sqlite3.connect(shadow) as conn:
+        conn.execute("UPDATE chunirec_charts SET const = 13.5 WHERE song_id = 1")
+        conn.execute(
+            "INSERT INTO chunirec_charts (song_id, difficulty, level, const) "
+            "VALUES (1, 'ULT', '15', 15.0)"
+        )
+        conn.execute("DELETE FROM chunirec_charts WHERE song_id = 2")
+    conn.close()
+
+    # Added while the refresh was running, and not part of the catalog swap.
+    async with sessionmaker() as session, session.begin():
+        session.add(Alias(alias="song", guild_id=1234, song_id=3))
+
+    async with sessionmaker() as session:
+        before = await get_catalog_version(session)
+
+    validate_catalog(shadow, live)
+    swap_catalog(live, shadow)
+
+    async with sessionmaker() as session:
+        charts = (
+            await session.execute(
+                select(Chart.song_id, Chart.difficulty, Chart.const).where(
+                    Chart.song_id <= 3
+                )
+            )
+        ).all()
+        aliases = (await session.execute(select(Alias.alias))).scalars().all()
+        after = await get_catalog_version(session)
+
+    assert sorted(charts) == [
+        (1, "MAS", 13.5),
+        (1, "ULT", 15.0),
+        (3, "MAS", 13.0),
+    ]
+    assert aliases == ["song"]
+    # Only the three rows that changed were written.
+    assert before is not None and after == before + 3
+
+
+@pytest.mark.asyncio
+async def test_validate_catalog(tmp_path: Path, sessionmaker):
+    live = tmp_path / "database.sqlite3"
+    shadow = tmp_path / "database.sqlite3.shadow"
+    copy_database(live, shadow)
+
+    with sqlite3.connect(shadow) as conn:
+        conn.execute("DELETE FROM chunirec_songs WHERE id = 1")
+    conn.close()
+
+    with pytest.raises(CatalogValidationError, match="belong to songs"):
+        validate_catalog(shadow, live)
+
+    with sqlite3.connect(shadow) as conn:
+        conn.execute("DELETE FROM chunirec_charts WHERE song_id <= 10")
+    conn.close()
+
+    with pytest.raises(CatalogValidationError, match="would shrink"):
+        validate_catalog(shadow, live)
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+
+from database.models import Alias, Chart
+from database.snapshot import (
+    CatalogSnapshot,
+    build_snapshot,
+    get_catalog_version,
+    load_snapshot,
+    read_snapshot,
+    snapshot_path,
+    write_snapshot,
+)
+from tests.conftest import make_song
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    async with sessionmaker() as session, session.begin():
+        session.add_all([make_song(1, "Air"), make_song(2, "ウソラセラ")])
+        session.add_all(
+            [
+                Chart(
+                    song_id=1, difficulty="MAS", level="12+", const=12.7, maxcombo=1000
+                ),
+                Chart(
+                    song_id=2, difficulty="EXP", level="10", const=None, maxcombo=None
+                ),
+                Alias(alias="air", guild_id=-1, song_id=1),
+                Alias(alias="usorasera", guild_id=1234, song_id=2),
+            ]
+        )
+
+    return sessionmaker
+
+
+def test_snapshot_path():
+    assert snapshot_path("sqlite+aiosqlite:///database/database.sqlite3") == Path(
+        "database/database.sqlite3.catalog"
+    )
+    assert snapshot_path("sqlite+aiosqlite:///:memory:") is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(sessionmaker, tmp_path: Path):
+    async with sessionmaker() as session:
+        snapshot = await build_snapshot(session)
+
+    path = tmp_path / "catalog"
+    write_snapshot(path, snapshot)
+
+    assert read_snapshot(path) == snapshot
+    assert snapshot.songs[1].jacket == "2.webp"
+    assert snapshot.aliases[1].alias == "usorasera"
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_is_rebuilt(sessionmaker, tmp_path: Path):
+    path = tmp_path / "catalog"
+
+    async with sessionmaker() as session:
+        write_snapshot(path, await build_snapshot(session))
+
+        snapshot, from_file = await load_snapshot(session, path)
+        assert from_file
+
+    async with sessionmaker() as session, session.begin():
+        version = await get_catalog_version(session)
+        session.add(Alias(alias="rekt", guild_id=-1, song_id=1))
+
+    assert version is not None
+
+    async with sessionmaker() as session:
+        assert await get_catalog_version(session) == version + 1
+
+        snapshot, from_file = await load_snapshot(session, path)
+        assert not from_file
+        assert "rekt" in [x.alias for x in snapshot.aliases]
+
+
+def test_corrupted_snapshot_is_ignored(tmp_path: Path):
+    path = tmp_path / "catalog"
+    write_snapshot(path, CatalogSnapshot(1))
+
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(data + b"x")
+
+    assert read_snapshot(path) is None
+    assert read_snapshot(tmp_path / "missing") is None
@@ -0,0 +1,67 @@
+import json
+import logging
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from database.models import Alias
+from dbutils.aliases import (
+    GCM_ALIASES_URL,
+    TACHI_SONGS_URL,
+    chunked,
+    resolve_aliases,
+    update_aliases,
+)
+from dbutils.http_cache import CachedResponse, HttpCache
+from tests.conftest import make_song
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_resolve_aliases():
+    unmatched = set()
+    rows = [["Air", "air", "エアー"], ["Air"], ["Not a song", "nas"], [""]]
+
+    aliases = [x async for x in resolve_aliases(_aiter(rows), {"Air": 1}, unmatched)]
+
+    assert [(x["alias"], x["song_id"], x["guild_id"]) for x in aliases] == [
+        ("air", 1, -1),
+        ("エアー", 1, -1),
+    ]
+    assert unmatched == {"Not a song"}
+
+
+@pytest.mark.asyncio
+async def test_chunked():
+    assert [x async for x in chunked(_aiter(range(5)), 2)] == [[0, 1], [2, 3], [4]]
+    assert [x async for x in chunked(_aiter([]), 2)] == []
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    async with sessionmaker() as session, session.begin():
+        session.add_all([make_song(1, "Air"), make_song(2, "ウソラセラ")])
+
+    return sessionmaker
+
+
+@pytest.mark.asyncio
+async def test_update_aliases_offline(tmp_path: Path, sessionmaker):
+    cache = HttpCache(tmp_path / "cache", offline=True)
+    gcm = "Air\tair\tエアー\r\nNot a song\tnas\n"
+    tachi = [{"title": "ウソラセラ", "searchTerms": ["usorasera"]}]
+    cache.store(CachedResponse(url=GCM_ALIASES_URL, body=gcm.encode()))
+    cache.store(CachedResponse(url=TACHI_SONGS_URL, body=json.dumps(tachi).encode()))
+
+    await update_aliases(logging.getLogger("dbutils"), sessionmaker, cache=cache)
+
+    async with sessionmaker() as session:
+        aliases = (await session.execute(select(Alias.alias, Alias.song_id))).all()
+
+    assert sorted(aliases) == [("air", 1), ("usorasera", 2), ("エアー", 1)]
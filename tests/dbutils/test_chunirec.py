@@ -0,0 +1,218 @@
+import logging
+from typing import TYPE_CHECKING
+
+import pytest
+
+from dbutils.chunirec import match_songs, normalize_title
+
+if TYPE_CHECKING:
+    from dbutils.chunirec import (
+        ChunirecData,
+        ChunirecDifficulty,
+        ChunirecSong,
+        ZetarakuSong,
+    )
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _chunirec_song(
+    id: str, title: str, genre: str, data: "ChunirecData", artist: str = ""
+) -> "ChunirecSong":
+    return {
+        "meta": {
+            "id": id,
+            "title": title,
+            "genre": genre,
+            "artist": artist,
+            "release": "2015-07-16",
+            "bpm": 0,
+        },
+        "data": data,
+    }
+
+
+def _chuni_song(
+    id: str,
+    title: str,
+    catname: str,
+    image: str,
+    *,
+    artist: str = "",
+    we_kanji: str = "",
+    we_star: str = "",
+) -> dict[str, str]:
+    return {
+        "id": id,
+        "catname": catname,
+        "title": title,
+        "artist": artist,
+        "we_kanji": we_kanji,
+        "we_star": we_star,
+        "image": image,
+    }
+
+
+def _chart(level: float, const: float, maxcombo: int = 1000) -> "ChunirecDifficulty":
+    return {
+        "level": level,
+        "const": const,
+        "maxcombo": maxcombo,
+        "is_const_unknown": 0,
+    }
+
+
+def _zetaraku_song(title: str, category: str) -> "ZetarakuSong":
+    return {
+        "title": title,
+        "category": category,
+        "imageName": "air.png",
+        "version": "AIR",
+        "bpm": 200,
+        "sheets": [
+            {
+                "difficulty": difficulty,
+                "level": "13",
+                "levelValue": 13,
+                "internalLevel": None,
+                "internalLevelValue": 13,
+                "noteDesigner": "Jack",
+                "noteCounts": {
+                    "tap": 1,
+                    "hold": 2,
+                    "slide": 3,
+                    "air": 4,
+                    "flick": None,
+                    "total": 10,
+                },
+                "regions": {"jp": True, "intl": True},
+            }
+            for difficulty in ("basic", "master")
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    ("title", "remove_we_kanji", "expected"),
+    [
+        ("Help　me, “ARIN”", False, 'help me, "arin"'),
+        ("Don`t Stop", False, "don't stop"),
+        ("Air【狂】", False, "air【狂】"),
+        ("Air【狂】", True, "air"),
+        ("Random【分A】", True, "random"),
+    ],
+)
+def test_normalize_title(title: str, remove_we_kanji: bool, expected: str):  # noqa: FBT001
+    assert normalize_title(title, remove_we_kanji=remove_we_kanji) == expected
+
+
+def test_match_songs_by_title_and_category():
+    songs, charts, jackets = match_songs(
+        LOGGER,
+        [
+            _chunirec_song(
+                "a", "Air", "ORIGINAL", {"MAS": _chart(13.0, 13.4, maxcombo=0)}
+            ),
+        ],
+        [
+            # Same title, different category
+            _chuni_song("1", "Air", "POPS & ANIME", "pops.jpg"),
+            _chuni_song("2", "Air", "ORIGINAL", "original.jpg"),
+        ],
+        [{"title": "AIR", "image_url": "maimai.png"}],
+        {"songs": [_zetaraku_song("Air", "ORIGINAL")]},
+    )
+
+    assert len(songs) == 1
+    assert songs[0]["id"] == 2
+    assert songs[0]["chunithm_catcode"] == 5
+    assert songs[0]["jacket"] == "original.jpg"
+    assert songs[0]["version"] == "AIR"
+    assert songs[0]["bpm"] == 200
+
+    assert len(charts) == 1
+    assert charts[0]["level"] == "13"
+    assert charts[0]["const"] == 13.4
+    assert charts[0]["charter"] == "Jack"
+    # chunirec doesn't know the combo, so it's counted from zetaraku's notes.
+    assert charts[0]["maxcombo"] == 10
+
+    assert {jacket["jacket_url"].rsplit("/", 1)[1] for jacket in jackets} == {
+        "original.jpg",
+        "maimai.png",
+        "air.png",
+    }
+
+
+def test_match_songs_world_end():
+    songs, charts, _ = match_songs(
+        LOGGER,
+        [_chunirec_song("a", "Air【狂】", "WORLD'S END", {"WE": _chart(0, 0)})],
+        [
+            _chuni_song("1", "Air", "ORIGINAL", "air.jpg"),
+            _chuni_song(
+                "8001", "Air", "ORIGINAL", "we.jpg", we_kanji="狂", we_star="5"
+            ),
+        ],
+        [],
+        {"songs": []},
+    )
+
+    assert [song["id"] for song in songs] == [8001]
+    assert songs[0]["jacket"] == "we.jpg"
+    assert [(chart["difficulty"], chart["level"]) for chart in charts] == [
+        ("WE", "狂☆☆☆")
+    ]
+
+
+def test_match_songs_finds_missing_jackets_by_title_and_artist():
+    songs, _, _ = match_songs(
+        LOGGER,
+        [
+            _chunirec_song(
+                "a", "Air【狂】", "WORLD'S END", {"WE": _chart(0, 0)}, artist="Jack"
+            )
+        ],
+        [
+            _chuni_song("1", "Air", "ORIGINAL", "air.jpg", artist="Jack"),
+            _chuni_song(
+                "8001",
+                "Air",
+                "ORIGINAL",
+                "",
+                artist="Jack",
+                we_kanji="狂",
+                we_star="5",
+            ),
+        ],
+        [],
+        {"songs": []},
+    )
+
+    assert songs[0]["jacket"] == "air.jpg"
+
+
+def test_match_songs_manual_mappings():
+    songs, charts, _ = match_songs(
+        LOGGER,
+        [
+            # Trackless wilderness【狂】, which isn't in the official list
+            _chunirec_song(
+                "7a561ab609a0629d",
+                "Trackless wilderness【狂】",
+                "WORLD'S END",
+                {"WE": _chart(0, 0)},
+            ),
+            _chunirec_song("b", "Not anywhere", "ORIGINAL", {"MAS": _chart(13, 13)}),
+        ],
+        [],
+        [],
+        {"songs": []},
+    )
+
+    assert [(song["id"], song["title"]) for song in songs] == [
+        (8227, "Trackless wilderness")
+    ]
+    assert [(chart["difficulty"], chart["level"]) for chart in charts] == [
+        ("WE", "狂☆☆☆☆")
+    ]
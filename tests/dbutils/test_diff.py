@@ -0,0 +1,133 @@
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, cast
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from database.models import CatalogVersion, Chart, Song
+from dbutils.diff import TableSpec, apply_diff, diff_table, load_rows, write_report
+
+if TYPE_CHECKING:
+    from sqlalchemy import Table
+
+SONG_SPEC = TableSpec(
+    cast("Table", Song.__table__),
+    key=("id",),
+    coalesce=frozenset({"bpm"}),
+    insert_only=frozenset({"jacket"}),
+)
+CHART_SPEC = TableSpec(
+    cast("Table", Chart.__table__),
+    key=("song_id", "difficulty"),
+    delete_scope="song_id",
+)
+
+
+def _song(id: int, **kwargs) -> dict:
+    return {
+        "id": id,
+        "title": f"Song {id}",
+        "chunithm_catcode": 0,
+        "genre": "ORIGINAL",
+        "artist": "",
+        "version": "CHUNITHM",
+        "bpm": 150,
+        "jacket": f"{id}.webp",
+        "available": True,
+        "removed": False,
+    } | kwargs
+
+
+def _chart(song_id: int, difficulty: str, const: float) -> dict:
+    return {
+        "song_id": song_id,
+        "difficulty": difficulty,
+        "level": str(int(const)),
+        "const": const,
+    }
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    async with sessionmaker() as session, session.begin():
+        session.add_all(Song(**_song(id)) for id in (1, 2))
+        session.add_all(
+            [
+                Chart(**_chart(1, "EXP", 11.0)),
+                Chart(**_chart(1, "MAS", 13.7)),
+                Chart(**_chart(1, "WE", 0)),
+                Chart(**_chart(2, "MAS", 14.0)),
+            ]
+        )
+
+    return sessionmaker
+
+
+def test_diff_table_merges_rows():
+    current = [_song(1), _song(2)]
+    incoming = [
+        # Unchanged, since a missing BPM and a new jacket are ignored.
+        _song(1, bpm=None, jacket="new.webp"),
+        _song(2, title="Renamed"),
+        # Merged like consecutive upserts, so the first jacket is kept.
+        _song(3, bpm=200),
+        _song(3, bpm=None, jacket="ignored.webp"),
+    ]
+
+    diff = diff_table(SONG_SPEC, current, incoming)
+
+    assert diff.inserted == [_song(3, bpm=200)]
+    assert [(x["title"], y["title"]) for x, y in diff.updated] == [
+        ("Song 2", "Renamed")
+    ]
+    assert diff.deleted == []
+    assert diff.to_report()["updated"] == [
+        {"key": {"id": 2}, "changes": {"title": ["Song 2", "Renamed"]}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_apply_diff(tmp_path: Path, sessionmaker):
+    async def catalog_version() -> int:
+        async with sessionmaker() as session:
+            return (await session.execute(select(CatalogVersion.version))).scalar_one()
+
+    before = await catalog_version()
+
+    async with sessionmaker() as session, session.begin():
+        diff = diff_table(
+            CHART_SPEC,
+            await load_rows(session, CHART_SPEC),
+            [
+                _chart(1, "EXP", 11.0),
+                _chart(1, "MAS", 13.8),
+                _chart(1, "ULT", 15.0),
+            ],
+        )
+        await apply_diff(session, diff)
+
+    assert diff.summary() == "chunirec_charts: 1 inserted, 1 updated, 1 deleted"
+    # Only the rows that changed were written.
+    assert await catalog_version() == before + 3
+
+    async with sessionmaker() as session:
+        charts = (
+            await session.execute(select(Chart.song_id, Chart.difficulty, Chart.const))
+        ).all()
+    # Song 2 wasn't imported, so its charts are left alone.
+    assert sorted(charts) == [
+        (1, "EXP", 11.0),
+        (1, "MAS", 13.8),
+        (1, "ULT", 15.0),
+        (2, "MAS", 14.0),
+    ]
+
+    write_report(tmp_path / "report.json", "chunirec", [diff])
+    report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+    tables = report["tables"]["chunirec_charts"]
+    assert tables["updated"] == [
+        {"key": {"song_id": 1, "difficulty": "MAS"}, "changes": {"const": [13.7, 13.8]}}
+    ]
+    assert tables["deleted"] == [{"song_id": 1, "difficulty": "WE"}]
@@ -0,0 +1,95 @@
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from dbutils.http_cache import (
+    CachedResponse,
+    CacheMissError,
+    HttpCache,
+    import_fingerprint,
+)
+
+
+@pytest.mark.asyncio
+async def test_http_cache_revalidates(tmp_path):
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append(request.headers.get("If-None-Match"))
+
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(
+            text="var LV01001M;", headers={"ETag": '"v1"'}, charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/script.js", handler)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as client:
+        url = str(server.make_url("/script.js"))
+        cache = HttpCache(tmp_path)
+
+        first = await cache.get(client, url)
+        second = await cache.get(client, url)
+
+    assert requests == [None, '"v1"']
+    assert first.text() == second.text() == "var LV01001M;"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_http_cache_offline(tmp_path):
+    cache = HttpCache(tmp_path, offline=True)
+    cache.store(CachedResponse(url="https://sdvx.in/a.js", body="ウソ".encode()))
+
+    async with aiohttp.ClientSession() as client:
+        assert (await cache.get(client, "https://sdvx.in/a.js")).text() == "ウソ"
+
+        with pytest.raises(CacheMissError):
+            await cache.get(client, "https://sdvx.in/b.js")
+
+
+@pytest.mark.asyncio
+async def test_http_cache_key(tmp_path):
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(text="[]", headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/showall.json", handler)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as client:
+        url = str(server.make_url("/showall.json"))
+        cache = HttpCache(tmp_path)
+
+        await cache.get(client, f"{url}?token=secret", key=url)
+
+    assert cache.load(url) is not None
+    assert all(b"secret" not in x.read_bytes() for x in tmp_path.iterdir())
+
+
+def test_import_fingerprint(tmp_path):
+    responses = [CachedResponse(url="https://example.com/a.json", body=b"[]")]
+    fingerprint = import_fingerprint(responses, 1)
+
+    cache = HttpCache(tmp_path)
+    assert not cache.is_imported(fingerprint)
+
+    cache.record_import(fingerprint)
+    assert cache.is_imported(fingerprint)
+    # The catalog changed since.
+    assert not cache.is_imported(import_fingerprint(responses, 2))
+    # Replays always import.
+    assert not HttpCache(tmp_path, offline=True).is_imported(fingerprint)
+    # Databases without a catalog version always import.
+    assert import_fingerprint(responses, None) is None
+
+
+def test_cached_response_lines():
+    response = CachedResponse(
+        url="https://example.com/a.tsv",
+        body="Air\tair\r\nウソラセラ\tusorasera\n".encode(),
+    )
+
+    assert list(response.lines()) == ["Air\tair", "ウソラセラ\tusorasera"]
@@ -0,0 +1,162 @@
+import logging
+import shutil
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from database.models import Chart, MusicXmlManifest, Song
+from dbutils import merge_options as merge_options_module
+from dbutils.merge_options import MusicFolder, batch_by_song, merge_options
+from tests.conftest import make_song
+
+MUSIC_XML = """<?xml version="1.0" encoding="utf-8"?>
+<MusicData>
+  <name><id>{id}</id><str>{title}</str></name>
+  <genreNames><list><StringID><id>0</id><str>POPS &amp; ANIME</str></StringID></list></genreNames>
+  <worldsEndTagName><id>-1</id><str>Invalid</str></worldsEndTagName>
+  <releaseTagName><id>14</id><str>v2 2.10.00</str></releaseTagName>
+  <releaseDate>20230511</releaseDate>
+  <artistName><id>0</id><str>Artist</str></artistName>
+  <disableFlag>false</disableFlag>
+  <fumens>
+    <MusicFumenData>
+      <enable>true</enable>
+      <type><id>3</id><data>MASTER</data></type>
+      <file><path>{id:04d}_03.c2s</path></file>
+      <level>13</level>
+      <levelDecimal>{level_decimal}</levelDecimal>
+    </MusicFumenData>
+  </fumens>
+</MusicData>
+"""
+CHART = "BPM_DEF\t180.000\t180.000\t180.000\t180.000\nBPM\t0\t0\t180.000\nT_JUDGE_ALL\t1000\nCREATOR\tCharter\n"
+
+
+def write_song(root: Path, id: int, title: str, level_decimal: int = 70) -> None:
+    folder = root / "music" / f"music{id:04d}"
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "Music.xml").write_text(
+        MUSIC_XML.format(id=id, title=title, level_decimal=level_decimal),
+        encoding="utf-8",
+    )
+    (folder / f"{id:04d}_03.c2s").write_text(CHART, encoding="utf-8")
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    # Game dumps are merged into songs imported from chunirec.
+    async with sessionmaker() as session, session.begin():
+        session.add_all(make_song(id, "", genre="", version="") for id in (1, 2, 3))
+
+    return sessionmaker
+
+
+async def _titles(sessionmaker) -> dict[int, str]:
+    async with sessionmaker() as session:
+        return dict((await session.execute(select(Song.id, Song.title))).all())
+
+
+@pytest.mark.asyncio
+async def test_merge_options(tmp_path, sessionmaker, caplog):
+    logger = logging.getLogger("dbutils")
+    data_dir = tmp_path / "data"
+    option_dir = tmp_path / "option"
+
+    write_song(data_dir / "A000", 1, "Air")
+    write_song(data_dir / "A000", 2, "ウソラセラ")
+    # Options override the base game.
+    write_song(option_dir / "A001", 2, "ウソラセラ (A001)")
+
+    await merge_options(logger, sessionmaker, data_dir, option_dir)
+
+    assert await _titles(sessionmaker) == {1: "Air", 2: "ウソラセラ (A001)", 3: ""}
+    async with sessionmaker() as session:
+        chart = (
+            await session.execute(select(Chart).where(Chart.song_id == 1))
+        ).scalar_one()
+        assert (chart.difficulty, chart.level, chart.const) == ("MAS", "13+", 13.7)
+        assert (chart.maxcombo, chart.charter) == (1000, "Charter")
+        assert len((await session.execute(select(MusicXmlManifest))).all()) == 3
+
+    # Nothing changed, so nothing is imported.
+    caplog.clear()
+    with caplog.at_level(logging.INFO, "dbutils"):
+        await merge_options(logger, sessionmaker, data_dir, option_dir)
+    assert "Importing 0 of 3 Music.xml folders" in caplog.text
+
+    # A new option only imports its own folders.
+    write_song(option_dir / "A002", 3, "Aleph-0")
+    caplog.clear()
+    with caplog.at_level(logging.INFO, "dbutils"):
+        await merge_options(logger, sessionmaker, data_dir, option_dir)
+    assert "Importing 1 of 4 Music.xml folders" in caplog.text
+    assert (await _titles(sessionmaker))[3] == "Aleph-0"
+
+    # A changed base game folder is imported again, along with the option that
+    # overrides it, so that the option still wins.
+    write_song(data_dir / "A000", 2, "ウソラセラ", level_decimal=80)
+    caplog.clear()
+    with caplog.at_level(logging.INFO, "dbutils"):
+        await merge_options(logger, sessionmaker, data_dir, option_dir)
+    assert "Importing 2 of 4 Music.xml folders" in caplog.text
+    assert (await _titles(sessionmaker))[2] == "ウソラセラ (A001)"
+    # ...which means nothing actually changed.
+    assert "chunirec_songs: 0 inserted, 0 updated, 0 deleted" in caplog.text
+    assert "chunirec_charts: 0 inserted, 0 updated, 0 deleted" in caplog.text
+
+    # Folders under roots that weren't scanned are left in the manifest...
+    await merge_options(logger, sessionmaker, data_dir, None)
+    async with sessionmaker() as session:
+        assert len((await session.execute(select(MusicXmlManifest))).all()) == 4
+
+    # ...but those that are gone from a scanned root are removed.
+    shutil.rmtree(option_dir / "A002")
+    await merge_options(logger, sessionmaker, data_dir, option_dir)
+    async with sessionmaker() as session:
+        assert len((await session.execute(select(MusicXmlManifest))).all()) == 3
+
+    # Removing an option imports what it overrode again.
+    shutil.rmtree(option_dir / "A001")
+    caplog.clear()
+    with caplog.at_level(logging.INFO, "dbutils"):
+        await merge_options(logger, sessionmaker, data_dir, option_dir)
+    assert "Importing 1 of 2 Music.xml folders" in caplog.text
+    assert (await _titles(sessionmaker))[2] == "ウソラセラ"
+    async with sessionmaker() as session:
+        assert len((await session.execute(select(MusicXmlManifest))).all()) == 2
+
+
+def test_batch_by_song():
+    folders = [
+        MusicFolder(Path(str(i)), mtime_ns=0, size=0, song_id=song_id)
+        for i, song_id in enumerate([1, 2, 1, 3])
+    ]
+
+    batches = batch_by_song(folders, 2)
+
+    assert [[x.path.name for x in batch] for batch in batches] == [
+        ["0", "2"],
+        ["1", "3"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_merge_options_in_batches(tmp_path, sessionmaker, monkeypatch):
+    monkeypatch.setattr(merge_options_module, "IMPORT_BATCH_SIZE", 1)
+    data_dir = tmp_path / "data"
+    option_dir = tmp_path / "option"
+
+    write_song(data_dir / "A000", 1, "Air")
+    write_song(data_dir / "A000", 2, "ウソラセラ")
+    write_song(option_dir / "A001", 2, "ウソラセラ (A001)")
+
+    songs, charts = await merge_options(
+        logging.getLogger("dbutils"), sessionmaker, data_dir, option_dir
+    )
+
+    assert await _titles(sessionmaker) == {1: "Air", 2: "ウソラセラ (A001)", 3: ""}
+    # Each song is only written once, even though it's in several folders.
+    assert [new["title"] for _, new in songs.updated] == ["Air", "ウソラセラ (A001)"]
+    assert len(charts.inserted) == 2
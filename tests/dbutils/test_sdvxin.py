@@ -0,0 +1,85 @@
+import logging
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from database.models import Chart, SdvxinChartView
+from dbutils.http_cache import CachedResponse, HttpCache
+from dbutils.sdvxin import SDVXIN_CATEGORIES, update_sdvxin
+from tests.conftest import make_song
+
+CATEGORY_PAGES = {
+    "pops": (
+        "<table><tr><td class='tbgl'>"
+        "<script src='/chunithm/01/js/01001sort.js'></script><!--Air-->"
+        "<script src='/chunithm/01/js/01002sort.js'></script><!--Not in the database-->"
+        "</td></tr></table>"
+    ),
+    "end": (
+        "<table><tr><td class='tbgl'>"
+        "<script src='/chunithm/end/js/08227end.js'></script><!--Trackless wilderness-->"
+        "</td></tr></table>"
+    ),
+}
+SCRIPTS = {
+    "/chunithm/01/js/01001sort.js": (
+        'var LV01001E="";\n'
+        "var LV01001M=\"<a href='/chunithm/01/01001mst.htm'>13</a>\";\n"
+    ),
+    "/chunithm/end/js/08227end.js": (
+        'document.title="Trackless wilderness [WORLD\'S END] 狂☆☆☆☆";\n'
+        "var LV08227W=\"<a href='/chunithm/end/08227end.htm'>狂</a>\";\n"
+    ),
+}
+
+
+@pytest_asyncio.fixture()
+async def sessionmaker(sessionmaker):
+    async with sessionmaker() as session, session.begin():
+        session.add_all([make_song(1, "Air"), make_song(8227, "Trackless wilderness")])
+        session.add_all(
+            [
+                Chart(song_id=1, difficulty="MAS", level="13"),
+                Chart(song_id=8227, difficulty="WE", level="狂☆☆☆☆"),
+            ]
+        )
+
+    return sessionmaker
+
+
+def recorded_cache(directory: Path) -> HttpCache:
+    cache = HttpCache(directory, offline=True)
+
+    for category in SDVXIN_CATEGORIES:
+        url = (
+            "https://sdvx.in/chunithm/end.htm"
+            if category == "end"
+            else f"https://sdvx.in/chunithm/sort/{category}.htm"
+        )
+        page = CATEGORY_PAGES.get(category, "<p>No songs</p>")
+        cache.store(CachedResponse(url=url, body=page.encode()))
+
+    for src, script in SCRIPTS.items():
+        cache.store(CachedResponse(url=f"https://sdvx.in{src}", body=script.encode()))
+
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_update_sdvxin_offline(tmp_path, sessionmaker):
+    cache = recorded_cache(tmp_path / "cache")
+
+    # Scripts of songs that aren't in the database are never fetched, or this
+    # would raise CacheMissError.
+    await update_sdvxin(logging.getLogger("dbutils"), sessionmaker, cache=cache)
+
+    async with sessionmaker() as session:
+        rows = (await session.execute(select(SdvxinChartView))).scalars().all()
+
+    assert {(x.id, x.song_id, x.difficulty, x.end_index) for x in rows} == {
+        ("01001", 1, "MAS", ""),
+        ("08227", 8227, "WE", ""),
+    }
+    assert cache.misses == 0
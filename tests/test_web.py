@@ -0,0 +1,35 @@
+from typing import Optional
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from web import init_app
+
+
+async def _get_metrics(
+    metrics_token: Optional[str], authorization: Optional[str]
+) -> int:
+    app = init_app(None, metrics_token=metrics_token)  # type: ignore[reportArgumentType]
+    headers = {"Authorization": authorization} if authorization is not None else {}
+
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.get("/metrics", headers=headers)
+        return resp.status
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("metrics_token", "authorization", "status"),
+    [
+        (None, None, 404),
+        (None, "Bearer ", 404),
+        ("secret", None, 401),
+        ("secret", "Bearer wrong", 401),
+        ("secret", "Bearer ãããã", 401),
+        ("secret", "Bearer secret", 200),
+    ],
+)
+async def test_metrics_require_token(
+    metrics_token: Optional[str], authorization: Optional[str], status: int
+):
+    assert await _get_metrics(metrics_token, authorization) == status
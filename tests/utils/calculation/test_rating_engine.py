@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from chunithm_net.consts import KEY_PLAY_RATING, KEY_SONG_ID
+from chunithm_net.models.enums import Difficulty
+from chunithm_net.models.record import PlaylogMarker, Record
+from utils.calculation.rating_engine import RatingEngine, RatingState
+
+
+def make_record(
+    song_id: int,
+    score: int,
+    rating: str,
+    difficulty: Difficulty = Difficulty.MASTER,
+) -> Record:
+    record = Record(title=str(song_id), difficulty=difficulty, score=score)
+    record.extras[KEY_SONG_ID] = song_id
+    record.extras[KEY_PLAY_RATING] = Decimal(rating)
+    return record
+
+
+def test_best_frame_is_bounded():
+    engine = RatingEngine.from_records(
+        [make_record(i, 1_000_000, f"{i}.00") for i in range(1, 41)]
+    )
+
+    best = engine.best()
+
+    assert len(best) == 30
+    assert [x.extras[KEY_SONG_ID] for x in best] == list(range(40, 10, -1))
+    assert engine.best_total() == sum(Decimal(i) for i in range(11, 41))
+
+
+def test_ingest_reports_new_best_and_displaced_records():
+    engine = RatingEngine.from_records(
+        [make_record(i, 1_000_000, f"{i}.00") for i in range(1, 31)]
+    )
+
+    delta = engine.ingest([make_record(100, 1_007_500, "50.00")])
+
+    assert [x.extras[KEY_SONG_ID] for x in delta.new_best] == [100]
+    assert [x.extras[KEY_SONG_ID] for x in delta.displaced] == [1]
+    assert delta.best == Decimal(49)
+
+
+def test_ingest_ignores_worse_scores():
+    engine = RatingEngine.from_records([make_record(1, 1_005_000, "15.00")])
+
+    delta = engine.ingest([make_record(1, 1_000_000, "14.50")])
+
+    assert delta.best == 0
+    assert engine.best()[0].score == 1_005_000
+
+
+def test_ingest_updates_chart_already_in_frame():
+    engine = RatingEngine.from_records(
+        [make_record(i, 1_000_000, f"{i}.00") for i in range(1, 31)]
+    )
+
+    delta = engine.ingest([make_record(5, 1_009_000, "40.00")])
+
+    assert delta.new_best == []
+    assert delta.displaced == []
+    assert delta.best == Decimal(35)
+    assert engine.best()[0].extras[KEY_SONG_ID] == 5
+    assert len(engine.best()) == 30
+
+
+def test_worlds_end_does_not_count():
+    engine = RatingEngine()
+    engine.ingest([make_record(8000, 1_010_000, "20.00", Difficulty.WORLDS_END)])
+
+    assert engine.best() == []
+    assert engine.recent() == []
+
+
+def test_recent_frame_uses_latest_plays():
+    engine = RatingEngine(recent_window=3, recent_size=2)
+    engine.ingest(
+        [
+            make_record(1, 1_000_000, "16.00"),
+            make_record(2, 1_000_000, "10.00"),
+            make_record(3, 1_000_000, "11.00"),
+            make_record(4, 1_000_000, "12.00"),
+        ]
+    )
+
+    assert [x.extras[KEY_SONG_ID] for x in engine.recent()] == [4, 3]
+    assert engine.recent_total() == Decimal(23)
+
+
+@pytest.mark.parametrize("order", ["sorted", "reversed"])
+def test_verify_against_scraped_best(order: str):
+    records = [make_record(i, 1_000_000, f"{i}.00") for i in range(1, 41)]
+    engine = RatingEngine.from_records(
+        reversed(records) if order == "reversed" else records
+    )
+
+    scraped = sorted(records, key=lambda x: x.extras[KEY_PLAY_RATING], reverse=True)
+    result = engine.verify(scraped[:30])
+
+    assert result.ok
+    assert result.missing == []
+    assert result.extra == []
+
+    result = engine.verify(scraped[1:31])
+
+    assert not result.ok
+    assert [x.extras[KEY_SONG_ID] for x in result.missing] == [10]
+    assert [x.extras[KEY_SONG_ID] for x in result.extra] == [40]
+
+
+def test_state_round_trip():
+    engine = RatingEngine.from_records(
+        [make_record(i, 1_000_000, f"{i}.00") for i in range(1, 41)],
+        [make_record(i, 990_000, f"{i}.00") for i in (3, 2, 1)],
+    )
+    engine.marker = PlaylogMarker(
+        date=datetime(2024, 1, 1, 12, 34, tzinfo=timezone(timedelta(hours=9))),
+        track=4,
+        title="1",
+        difficulty=Difficulty.MASTER,
+        score=990_000,
+    )
+
+    state = RatingState.loads(engine.state().dumps())
+
+    assert [x.extras[KEY_SONG_ID] for x in state.best] == list(range(40, 10, -1))
+    assert [x.extras[KEY_SONG_ID] for x in state.recent] == [3, 2, 1]
+    assert state.marker == engine.marker
+    assert state.synced_at is None
+
+    # Play ratings aren't persisted, they come from hydration.
+    for record in [*state.best, *state.recent]:
+        record.extras[KEY_PLAY_RATING] = Decimal(record.title)
+
+    restored = RatingEngine.from_state(state)
+
+    assert restored.best_total() == engine.best_total()
+    assert restored.recent_total() == engine.recent_total()
+    assert restored.marker == engine.marker
@@ -0,0 +1,50 @@
+from utils.alias_index import AliasIndex, IndexedAlias
+
+ENTRIES = [
+    (None, "Air", "Air", 1, -1),
+    (1, "AIR!", "Air", 1, -1),
+    (None, "ウソラセラ", "ウソラセラ", 2, -1),
+    (2, "usorasera", "ウソラセラ", 2, 1234),
+    (3, "uso", "ウソラセラ", 2, 5678),
+]
+
+
+def test_alias_index_rows():
+    index = AliasIndex(ENTRIES)
+
+    assert len(index) == 5
+    assert index.titles == ["Air", "ウソラセラ"]
+    assert index[1] == IndexedAlias(1, "air!", "Air", 1, -1)
+    assert index[0].id is None
+
+
+def test_alias_index_only_searches_visible_guilds():
+    index = AliasIndex(ENTRIES)
+
+    match = index.extract_one("USORASERA", 1234)
+    assert match is not None
+    assert match[0] == IndexedAlias(2, "usorasera", "ウソラセラ", 2, 1234)
+    assert match[1] == 100
+
+    match = index.extract_one("usorasera", 5678)
+    assert match is not None
+    assert match[0].guild_id != 1234
+
+    match = index.extract_one("usorasera", None)
+    assert match is not None
+    assert match[0].guild_id == -1
+
+
+def test_alias_index_extract():
+    index = AliasIndex(ENTRIES)
+
+    results = index.extract("air", 1234, limit=50, score_cutoff=70)
+
+    assert (results[0][0].id, results[0][1]) == (None, 100)
+    assert {alias.title for alias, _ in results} == {"Air"}
+    assert index.extract("air", None, limit=1, score_cutoff=0)[0][0].alias == "air"
+
+
+def test_empty_alias_index():
+    assert AliasIndex().extract_one("air", None) is None
+    assert AliasIndex().extract("air", None, limit=5, score_cutoff=0) == []
@@ -0,0 +1,67 @@
+from decimal import Decimal
+from io import BytesIO
+
+from PIL import Image
+
+from chunithm_net.consts import KEY_INTERNAL_LEVEL, KEY_PLAY_RATING
+from chunithm_net.models.enums import ClearType, ComboType, Difficulty, Rank
+from chunithm_net.models.record import Record
+from utils.b30_card import (
+    COLUMNS,
+    JACKET_SIZE,
+    TILE_WIDTH,
+    AssetCache,
+    jacket_key,
+    render_b30_card,
+)
+
+
+def make_record(i: int) -> Record:
+    record = Record(
+        title=f"Song {i}",
+        difficulty=Difficulty.MASTER,
+        score=1_007_500,
+        rank=Rank.from_score(1_007_500),
+        clear_lamp=ClearType.CLEAR,
+        combo_lamp=ComboType.FULL_COMBO,
+        jacket=f"https://chunithm-net-eng.com/mobile/img/{i}.jpg",
+    )
+    record.extras[KEY_INTERNAL_LEVEL] = 14.5
+    record.extras[KEY_PLAY_RATING] = Decimal("16.50")
+    return record
+
+
+def test_jacket_key():
+    assert jacket_key("https://chunithm-net-eng.com/mobile/img/abc.jpg") == "abc.jpg"
+    assert jacket_key("abc.jpg") == "abc.jpg"
+    assert jacket_key("") is None
+    assert jacket_key(None) is None
+
+
+def test_glyph_cache_fit(tmp_path):
+    font = AssetCache(tmp_path).fonts().text
+
+    assert font.fit("Air", 1000) == "Air"
+
+    fitted = font.fit("A very long song title " * 10, 100)
+    assert fitted.endswith("…")
+    assert font.length(fitted) <= 100
+
+
+def test_render_b30_card(tmp_path):
+    assets = AssetCache(tmp_path)
+    assets.jacket_directory.mkdir()
+    Image.new("RGB", (300, 300), (255, 0, 0)).save(assets.jacket_directory / "0.jpg")
+
+    best = [make_record(i) for i in range(7)]
+    jackets = assets.load_jackets(jacket_key(r.jacket) for r in best)
+    assert list(jackets) == ["0.jpg"]
+    assert jackets["0.jpg"].size == (JACKET_SIZE, JACKET_SIZE)
+
+    card = render_b30_card(
+        best, [], title="Test", jackets=jackets, fonts=assets.fonts()
+    )
+
+    with Image.open(BytesIO(card)) as image:
+        assert image.format == "PNG"
+        assert image.width >= COLUMNS * TILE_WIDTH
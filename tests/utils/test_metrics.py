@@ -0,0 +1,56 @@
+from utils.metrics import CallbackMetric, Counter, Histogram, Registry
+
+
+def test_counter_renders_labels():
+    registry = Registry()
+    counter = Counter("requests_total", "Requests", ["path"], registry=registry)
+
+    counter.labels("/mobile/").inc()
+    counter.labels("/mobile/").inc(2)
+    counter.labels('a"b').inc()
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/mobile/"} 3\n'
+        'requests_total{path="a\\"b"} 1\n'
+    )
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = Histogram(
+        "latency_seconds", "Latency", buckets=(0.1, 1), registry=registry
+    )
+
+    histogram.observe(0.05)
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 5.65" in lines
+    assert "latency_seconds_count 4" in lines
+
+
+def test_callback_metric_is_evaluated_on_render():
+    registry = Registry()
+    values = {"page": 0.5}
+
+    CallbackMetric(
+        "cache_hit_ratio",
+        "Hit ratio",
+        ["cache"],
+        lambda: [((k,), v) for k, v in values.items()],
+        registry=registry,
+    )
+
+    assert 'cache_hit_ratio{cache="page"} 0.5' in registry.render().splitlines()
+
+    values["page"] = 0.75
+
+    assert 'cache_hit_ratio{cache="page"} 0.75' in registry.render().splitlines()
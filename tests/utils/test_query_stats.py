@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils.query_stats import QueryStats, normalize_sql
+
+
+@pytest.mark.parametrize(
+    ("statement", "expected"),
+    [
+        (
+            "SELECT songs.id FROM songs\n  WHERE songs.id IN (?, ?, ?)",
+            "SELECT songs.id FROM songs WHERE songs.id IN (?, ...)",
+        ),
+        (
+            "SELECT * FROM aliases WHERE alias = 'it''s' AND guild_id = -1",
+            "SELECT * FROM aliases WHERE alias = ? AND guild_id = -?",
+        ),
+        (
+            "SELECT anon_1.id FROM t1 AS anon_1 LIMIT 10",
+            "SELECT anon_1.id FROM t1 AS anon_1 LIMIT ?",
+        ),
+    ],
+)
+def test_normalize_sql(statement: str, expected: str):
+    assert normalize_sql(statement) == expected
+
+
+def test_query_stats_aggregates_by_normalized_statement():
+    stats = QueryStats(logging.getLogger("tests.query_stats"))
+
+    stats.record("SELECT * FROM songs WHERE id IN (?, ?)", 0.5)
+    stats.record("SELECT * FROM songs WHERE id IN (?, ?, ?)", 1.5)
+    stats.record("SELECT * FROM aliases", 0.1)
+
+    top = stats.top(1)
+
+    assert len(top) == 1
+    assert top[0].statement == "SELECT * FROM songs WHERE id IN (?, ...)"
+    assert top[0].count == 2
+    assert top[0].total == 2.0
+    assert top[0].max == 1.5
+
+
+@pytest.mark.asyncio
+async def test_query_stats_explains_slow_queries():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    stats = QueryStats(logging.getLogger("tests.query_stats"), slow_threshold=0)
+    stats.install(engine)
+
+    async with engine.connect() as conn:
+        await conn.execute(text("CREATE TABLE songs (id INTEGER PRIMARY KEY, title)"))
+        await conn.execute(text("SELECT * FROM songs WHERE title = :t"), {"t": "Air"})
+        result = await conn.execute(text("SELECT * FROM songs WHERE id = 1"))
+
+        assert result.fetchall() == []
+
+    await engine.dispose()
+
+    by_statement = {x.statement: x for x in stats.top(10)}
+
+    assert by_statement["CREATE TABLE songs (id INTEGER PRIMARY KEY, title)"].plan == []
+    assert by_statement["SELECT * FROM songs WHERE title = ?"].plan == ["SCAN songs"]
+    assert by_statement["SELECT * FROM songs WHERE id = ?"].plan is not None
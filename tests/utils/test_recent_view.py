@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, cast
+
+import pytest
+import pytest_asyncio
+
+from utils.views import recent as recent_module
+from utils.views.recent import RecentRecordsView
+
+
+class FakeChuniNet:
+    def __init__(self) -> None:
+        self.fetched: list[int] = []
+        # Fetches of these indices wait until the event is set.
+        self.blocked: dict[int, asyncio.Event] = {}
+        self.failing: set[int] = set()
+
+    async def detailed_recent_record(self, score: Any) -> Any:
+        self.fetched.append(score.idx)
+
+        if (event := self.blocked.pop(score.idx, None)) is not None:
+            await event.wait()
+
+        if score.idx in self.failing:
+            self.failing.remove(score.idx)
+            msg = "CHUNITHM-NET is down"
+            raise RuntimeError(msg)
+
+        return SimpleNamespace(idx=score.idx, attempt=self.fetched.count(score.idx))
+
+
+class FakeUtils:
+    async def hydrate_record(self, record: Any) -> Any:
+        return record
+
+
+@pytest_asyncio.fixture()
+async def view():
+    # One credit, since tracks only go down.
+    scores = [
+        SimpleNamespace(
+            idx=idx, track=4 - idx, title=f"Song {idx}", difficulty="MAS", extras={}
+        )
+        for idx in range(4)
+    ]
+    view = RecentRecordsView(
+        cast("Any", SimpleNamespace(author=None)),
+        cast("Any", SimpleNamespace(get_cog=lambda _: FakeUtils())),
+        cast("Any", scores),
+        cast("Any", FakeChuniNet()),
+        cast("Any", None),
+        cast("Any", None),
+    )
+
+    yield view
+
+    for task in [*view._prefetches.values(), *view._detailed_records.values()]:
+        task.cancel()
+    view.stop()
+
+
+@pytest.mark.asyncio
+async def test_selecting_waits_for_an_in_flight_prefetch(view):
+    client: FakeChuniNet = view.chuni_client
+    release = client.blocked[0] = asyncio.Event()
+
+    view.prefetch_detailed_records()
+    await asyncio.sleep(0)
+    selected = asyncio.create_task(view.get_detailed_record(0))
+    await asyncio.sleep(0)
+    release.set()
+
+    record = await selected
+    assert (record.idx, record.attempt) == (0, 1)
+    assert client.fetched.count(0) == 1
+
+
+@pytest.mark.asyncio
+async def test_selecting_skips_a_queued_prefetch(view):
+    client: FakeChuniNet = view.chuni_client
+    for idx in range(recent_module.PREFETCH_CONCURRENCY):
+        client.blocked[idx] = asyncio.Event()
+
+    view.prefetch_detailed_records()
+    await asyncio.sleep(0)
+    queued = recent_module.PREFETCH_CONCURRENCY
+
+    record = await asyncio.wait_for(view.get_detailed_record(queued), timeout=1)
+
+    assert record.idx == queued
+    assert view._prefetches[queued].cancelled()
+    assert client.fetched.count(queued) == 1
+
+
+@pytest.mark.asyncio
+async def test_selecting_gives_up_on_a_slow_prefetch(view, monkeypatch):
+    monkeypatch.setattr(recent_module, "PREFETCH_WAIT", 0.01)
+    client: FakeChuniNet = view.chuni_client
+    client.blocked[0] = asyncio.Event()
+
+    view.prefetch_detailed_records()
+    await asyncio.sleep(0)
+
+    record = await asyncio.wait_for(view.get_detailed_record(0), timeout=1)
+
+    assert record.attempt == 2
+    assert view._prefetches[0].cancelled()
+
+
+@pytest.mark.asyncio
+async def test_selecting_refetches_a_failed_prefetch(view):
+    client: FakeChuniNet = view.chuni_client
+    client.failing.add(0)
+
+    view.prefetch_detailed_records()
+    await asyncio.sleep(0)
+
+    record = await asyncio.wait_for(view.get_detailed_record(0), timeout=1)
+
+    assert record.attempt == 2
+    # Later selections reuse the record that was fetched.
+    assert await view.get_detailed_record(0) is record
@@ -0,0 +1,33 @@
+import logging
+from pathlib import Path
+
+import pytest
+
+from utils.startup import StartupProfile
+
+
+def test_startup_profile_logs_phases_once(caplog: pytest.LogCaptureFixture):
+    logger = logging.getLogger("test_startup")
+    profile = StartupProfile(logger)
+
+    profile.record("imports", 0.5)
+    with profile.phase("cogs"):
+        pass
+
+    with caplog.at_level(logging.INFO, logger="test_startup"):
+        profile.finish()
+        profile.finish()
+
+    assert [name for name, _ in profile.phases] == ["imports", "cogs"]
+    assert len(caplog.records) == 1
+    assert "imports 0.500s" in caplog.records[0].getMessage()
+
+
+def test_startup_profile_dumps_stats(tmp_path: Path):
+    path = tmp_path / "startup.prof"
+    profile = StartupProfile(logging.getLogger("test_startup"), profile_path=path)
+
+    sum(range(1000))
+    profile.finish()
+
+    assert path.stat().st_size > 0
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+import pytest
+
+from utils import json_loads
+from utils.tracing import Tracer, current_trace, record_span, span, traced
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+@pytest.fixture
+def handler():
+    handler = ListHandler()
+    logger = logging.getLogger("tests.tracing")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+    yield handler
+
+    logger.removeHandler(handler)
+
+
+def test_span_is_noop_without_trace():
+    with span("nothing") as s:
+        assert s is None
+
+    assert current_trace() is None
+
+
+@pytest.mark.asyncio
+async def test_tracer_nests_spans(handler: ListHandler):
+    tracer = Tracer(logging.getLogger("tests.tracing"), sample_rate=1)
+
+    @traced("render")
+    def render():
+        pass
+
+    async def command():
+        trace = tracer.start("b30", user=1)
+
+        with span("fetch"):
+            record_span("chunithm_net.request", 0, 0.5, path="/mobile/")
+        render()
+
+        assert tracer.finish(trace)
+
+    await asyncio.create_task(command())
+
+    data = json_loads(handler.records[0].getMessage())
+
+    assert data["trace"] == "b30"
+    assert data["user"] == 1
+    assert data["slow"] is False
+    assert [(x["name"], x["parent"]) for x in data["spans"]] == [
+        ("fetch", 0),
+        ("chunithm_net.request", 1),
+        ("render", 0),
+    ]
+    assert data["spans"][1]["attributes"] == {"path": "/mobile/"}
+
+
+@pytest.mark.asyncio
+async def test_tracer_samples_but_keeps_slow_traces(handler: ListHandler):
+    tracer = Tracer(
+        logging.getLogger("tests.tracing"), sample_rate=0, slow_threshold=0.01
+    )
+
+    async def command(duration: float):
+        trace = tracer.start("b30")
+        await asyncio.sleep(duration)
+        return tracer.finish(trace)
+
+    assert not await asyncio.create_task(command(0))
+    assert await asyncio.create_task(command(0.02))
+    assert len(handler.records) == 1
+
+
+@pytest.mark.asyncio
+async def test_tracer_limits_spans(handler: ListHandler):
+    tracer = Tracer(logging.getLogger("tests.tracing"), sample_rate=1, max_spans=3)
+
+    async def command():
+        trace = tracer.start("top")
+        for _ in range(5):
+            with span("parse"):
+                pass
+        tracer.finish(trace)
+        return trace
+
+    trace = await asyncio.create_task(command())
+
+    assert len(trace.spans) == 3
+    assert trace.dropped == 3
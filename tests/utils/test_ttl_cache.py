@@ -0,0 +1,59 @@
+from utils.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache(10, clock=clock)
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    clock.now = 9.9
+    assert cache.get("a") == 1
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+    assert cache.hits == 2
+    assert cache.misses == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache: TTLCache[str, int] = TTLCache(10, maxsize=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_disabled_with_zero_ttl():
+    cache: TTLCache[str, int] = TTLCache(0)
+
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_invalidates_by_predicate():
+    cache: TTLCache[tuple[int, str], int] = TTLCache(10)
+
+    cache.set((1, "best30"), 1)
+    cache.set((1, "recent10"), 2)
+    cache.set((2, "best30"), 3)
+
+    assert cache.invalidate(lambda key: key[0] == 1) == 2
+    assert cache.get((2, "best30")) == 3
@@ -0,0 +1,179 @@
+"""Columnar storage for song aliases.
+
+Every alias is a row in a handful of parallel columns instead of an object
+of its own, so that tens of thousands of guild aliases stay compact in memory
+and can be handed to rapidfuzz without building a list for every search.
+
+Rows are grouped by guild, global aliases first, and every group keeps its
+lowercased aliases as one list. Searching from a guild only scores the global
+aliases and that guild's own.
+"""
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import NamedTuple, Optional
+
+from rapidfuzz import fuzz, process
+
+__all__ = ["AliasIndex", "IndexedAlias"]
+
+
+class IndexedAlias(NamedTuple):
+    # Alias row ID, or None if this is the title of the song.
+    id: Optional[int]
+    # Lowercased.
+    alias: str
+    title: str
+    song_id: int
+    # -1 for global aliases.
+    guild_id: int
+
+
+class AliasIndex:
+    __slots__ = (
+        "_groups",
+        "alias_ids",
+        "aliases",
+        "guild_ids",
+        "song_ids",
+        "title_ids",
+        "titles",
+    )
+
+    def __init__(
+        self, entries: Iterable[tuple[Optional[int], str, str, int, int]] = ()
+    ) -> None:
+        """
+        Parameters
+        ----------
+        entries: Iterable[tuple[Optional[int], str, str, int, int]]
+            (alias ID, alias, song title, song ID, guild ID) for every alias.
+            Within a guild, aliases keep their order, which decides ties
+            between equally good matches.
+        """
+        # key: guild ID
+        by_guild: dict[int, list[tuple[Optional[int], str, str, int, int]]] = {}
+        for entry in entries:
+            by_guild.setdefault(entry[4], []).append(entry)
+
+        self.aliases: list[str] = []
+        self.alias_ids = array("q")
+        self.song_ids = array("q")
+        self.guild_ids = array("q")
+        self.title_ids = array("L")
+        self.titles: list[str] = []
+
+        # key: guild ID
+        # value: index of the group's first row, and the group's aliases
+        self._groups: dict[int, tuple[int, list[str]]] = {}
+
+        # key: title
+        # value: index in self.titles
+        title_ids: dict[str, int] = {}
+
+        for guild_id in sorted(by_guild, key=lambda x: x != -1):
+            start = len(self.aliases)
+
+            for alias_id, alias, title, song_id, _ in by_guild[guild_id]:
+                if (title_id := title_ids.get(title)) is None:
+                    title_id = title_ids[title] = len(self.titles)
+                    self.titles.append(title)
+
+                # str.lower() always makes a copy, even if nothing changed.
+                lowered = alias.lower()
+                self.aliases.append(lowered if lowered != alias else alias)
+                self.alias_ids.append(alias_id if alias_id is not None else -1)
+                self.song_ids.append(song_id)
+                self.guild_ids.append(guild_id)
+                self.title_ids.append(title_id)
+
+            self._groups[guild_id] = (start, self.aliases[start:])
+
+    def __len__(self) -> int:
+        return len(self.aliases)
+
+    def __getitem__(self, row: int) -> IndexedAlias:
+        alias_id = self.alias_ids[row]
+
+        return IndexedAlias(
+            alias_id if alias_id != -1 else None,
+            self.aliases[row],
+            self.titles[self.title_ids[row]],
+            self.song_ids[row],
+            self.guild_ids[row],
+        )
+
+    def _visible_groups(
+        self, guild_id: Optional[int]
+    ) -> Iterator[tuple[int, list[str]]]:
+        if (group := self._groups.get(-1)) is not None:
+            yield group
+
+        if (
+            guild_id is not None
+            and guild_id != -1
+            and (group := self._groups.get(guild_id)) is not None
+        ):
+            yield group
+
+    def extract_one(
+        self, query: str, guild_id: Optional[int]
+    ) -> Optional[tuple[IndexedAlias, float]]:
+        """Finds the alias most similar to `query`.
+
+        Parameters
+        ----------
+        query: str
+            The query to search for.
+        guild_id: Optional[int]
+            The ID of the guild to search for aliases in. If None, only global
+            aliases are searched.
+
+        Returns
+        -------
+        Optional[tuple[IndexedAlias, float]]
+            The matched alias and its similarity, or None if there are no
+            aliases to search.
+        """
+        query = query.lower()
+        best: Optional[tuple[int, float]] = None
+
+        for start, choices in self._visible_groups(guild_id):
+            result = process.extractOne(query, choices, scorer=fuzz.QRatio)
+
+            # Global aliases win ties, since they are searched first.
+            if result is not None and (best is None or result[1] > best[1]):
+                best = (start + result[2], result[1])
+
+        if best is None:
+            return None
+
+        return self[best[0]], best[1]
+
+    def extract(
+        self,
+        query: str,
+        guild_id: Optional[int],
+        *,
+        limit: int,
+        score_cutoff: float,
+    ) -> list[tuple[IndexedAlias, float]]:
+        """Finds up to `limit` aliases at least `score_cutoff` similar to `query`,
+        most similar first. See `extract_one`."""
+        query = query.lower()
+        results: list[tuple[float, int]] = []
+
+        for start, choices in self._visible_groups(guild_id):
+            results.extend(
+                (score, start + index)
+                for _, score, index in process.extract(
+                    query,
+                    choices,
+                    scorer=fuzz.QRatio,
+                    limit=limit,
+                    score_cutoff=score_cutoff,
+                )
+            )
+
+        results.sort(key=lambda x: (-x[0], x[1]))
+
+        return [(self[row], score) for score, row in results[:limit]]
@@ -0,0 +1,446 @@
+"""Renders best 30 (and optionally recent 10) scores into a single image.
+
+`render_b30_card` is a pure function of the records, the jackets and the
+fonts, so that it can run in a thread pool and be benchmarked on its own.
+Jackets and fonts come from `AssetCache`, which keeps them on disk so that they
+are downloaded only once, and in memory once decoded.
+
+Pillow is slow to import, so it is only imported when a card is rendered.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
+
+from chunithm_net.consts import KEY_INTERNAL_LEVEL, KEY_LEVEL, KEY_PLAY_RATING
+from chunithm_net.models.enums import ClearType, ComboType
+from utils import floor_to_ndp
+
+if TYPE_CHECKING:
+    from decimal import Decimal
+
+    from PIL import Image, ImageDraw, ImageFont
+
+    from chunithm_net.models.record import Record
+
+__all__ = ["AssetCache", "CardFonts", "GlyphCache", "jacket_key", "render_b30_card"]
+
+logger = logging.getLogger("chuninewbot.b30_card")
+
+COLUMNS = 5
+TILE_WIDTH = 300
+TILE_HEIGHT = 96
+JACKET_SIZE = 80
+PADDING = 8
+HEADER_HEIGHT = 64
+SECTION_HEIGHT = 36
+
+# Seconds before a jacket that failed to download is tried again.
+JACKET_RETRY_INTERVAL = 600
+
+BACKGROUND = (30, 31, 34)
+TILE_BACKGROUND = (43, 45, 49)
+TEXT = (242, 243, 245)
+MUTED_TEXT = (181, 186, 193)
+PLACEHOLDER = (78, 80, 88)
+
+CLEAR_COLORS = {
+    ClearType.FAILED: MUTED_TEXT,
+    ClearType.CLEAR: (255, 209, 102),
+    ClearType.HARD: (255, 140, 105),
+    ClearType.ABSOLUTE: (255, 94, 160),
+    ClearType.ABSOLUTE_PLUS: (255, 94, 160),
+    ClearType.CATASTROPHY: (186, 104, 255),
+}
+COMBO_COLORS = {
+    ComboType.FULL_COMBO: (126, 231, 135),
+    ComboType.ALL_JUSTICE: (255, 230, 102),
+    ComboType.ALL_JUSTICE_CRITICAL: (255, 246, 197),
+}
+
+
+class GlyphCache:
+    """Draws text with a font, rasterizing each character only once.
+
+    Pillow rasterizes every glyph of every string it draws, which took most
+    of the time spent rendering a card. Characters are drawn one by one from
+    the cache instead, without kerning.
+    """
+
+    def __init__(self, font: "ImageFont.FreeTypeFont | ImageFont.ImageFont") -> None:
+        self.font = font
+        # key: character
+        # value: (mask, x offset, y offset, advance)
+        self._glyphs: dict[str, tuple[Optional["Image.Image"], int, int, float]] = {}
+
+    def _glyph(self, char: str) -> tuple[Optional["Image.Image"], int, int, float]:
+        if (glyph := self._glyphs.get(char)) is None:
+            from PIL import Image, ImageDraw
+
+            left, top, right, bottom = (int(x) for x in self.font.getbbox(char))
+            mask = None
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top))
+                ImageDraw.Draw(mask).text((-left, -top), char, font=self.font, fill=255)
+
+            # Races between threads only mean a glyph is rasterized twice.
+            glyph = self._glyphs[char] = (mask, left, top, self.font.getlength(char))
+
+        return glyph
+
+    def length(self, text: str) -> float:
+        return sum(self._glyph(char)[3] for char in text)
+
+    def fit(self, text: str, width: float) -> str:
+        """Truncates `text` with an ellipsis so that it is at most `width` wide."""
+        if self.length(text) <= width:
+            return text
+
+        width -= self.length("…")
+        used = 0.0
+        for i, char in enumerate(text):
+            used += self._glyph(char)[3]
+            if used > width:
+                return text[:i] + "…"
+
+        return text
+
+    def draw(
+        self,
+        image: "Image.Image",
+        xy: tuple[int, int],
+        text: str,
+        fill: tuple[int, int, int],
+    ) -> float:
+        """Draws `text` with its top left corner at `xy`, and returns its width."""
+        x, y = xy
+        start = x
+
+        for char in text:
+            mask, dx, dy, advance = self._glyph(char)
+            if mask is not None:
+                left = round(x) + dx
+                image.paste(
+                    fill, (left, y + dy, left + mask.width, y + dy + mask.height), mask
+                )
+            x += advance
+
+        return x - start
+
+
+@dataclass
+class CardFonts:
+    heading: GlyphCache
+    title: GlyphCache
+    text: GlyphCache
+    small: GlyphCache
+
+
+def jacket_key(url: Optional[str]) -> Optional[str]:
+    """The file name that a jacket is cached under."""
+    if not url:
+        return None
+    return Path(urlsplit(url).path).name or None
+
+
+def _hex_to_rgb(value: int) -> tuple[int, int, int]:
+    return ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+
+
+def _draw_tile(
+    card: "Image.Image",
+    draw: "ImageDraw.ImageDraw",
+    x: int,
+    y: int,
+    index: int,
+    record: "Record",
+    jacket: "Optional[Image.Image]",
+    fonts: CardFonts,
+) -> None:
+    draw.rectangle(
+        (x, y, x + TILE_WIDTH - 1, y + TILE_HEIGHT - 1), fill=TILE_BACKGROUND
+    )
+    draw.rectangle(
+        (x, y, x + 5, y + TILE_HEIGHT - 1),
+        fill=_hex_to_rgb(record.difficulty.color()),
+    )
+
+    jacket_x = x + 14
+    jacket_y = y + (TILE_HEIGHT - JACKET_SIZE) // 2
+    if jacket is not None:
+        card.paste(jacket, (jacket_x, jacket_y))
+    else:
+        draw.rectangle(
+            (
+                jacket_x,
+                jacket_y,
+                jacket_x + JACKET_SIZE - 1,
+                jacket_y + JACKET_SIZE - 1,
+            ),
+            fill=PLACEHOLDER,
+        )
+
+    text_x = jacket_x + JACKET_SIZE + 10
+    text_width = x + TILE_WIDTH - PADDING - text_x
+
+    fonts.title.draw(
+        card,
+        (text_x, y + 6),
+        fonts.title.fit(f"#{index} {record.title}", text_width),
+        TEXT,
+    )
+    fonts.text.draw(card, (text_x, y + 28), f"{record.score:,}  {record.rank}", TEXT)
+
+    level = record.extras.get(KEY_INTERNAL_LEVEL) or record.extras.get(KEY_LEVEL)
+    rating: "Optional[Decimal]" = record.extras.get(KEY_PLAY_RATING)
+    details = record.difficulty.short_form()
+    if level is not None:
+        details += f" {level}"
+    if rating is not None:
+        details += f"  /  {floor_to_ndp(rating, 2)}"
+    fonts.small.draw(card, (text_x, y + 50), details, MUTED_TEXT)
+
+    lamp_x = text_x
+    if record.clear_lamp != ClearType.FAILED:
+        lamp_x += 8 + int(
+            fonts.small.draw(
+                card,
+                (lamp_x, y + 70),
+                str(record.clear_lamp),
+                CLEAR_COLORS[record.clear_lamp],
+            )
+        )
+    if record.combo_lamp != ComboType.NONE:
+        fonts.small.draw(
+            card,
+            (lamp_x, y + 70),
+            str(record.combo_lamp),
+            COMBO_COLORS[record.combo_lamp],
+        )
+
+
+def render_b30_card(
+    best: Sequence["Record"],
+    recent: Sequence["Record"],
+    *,
+    title: str,
+    jackets: Mapping[str, "Image.Image"],
+    fonts: CardFonts,
+) -> bytes:
+    """Renders the scores into a PNG.
+
+    Parameters
+    ----------
+    best: Sequence[Record]
+        Hydrated best 30 records.
+    recent: Sequence[Record]
+        Hydrated recent 10 records, drawn below the best 30. Can be empty.
+    title: str
+        Heading of the card.
+    jackets: Mapping[str, Image.Image]
+        Jackets keyed by `jacket_key`, already resized to `JACKET_SIZE`.
+        Records without a jacket get a placeholder.
+    fonts: CardFonts
+
+    Returns
+    -------
+    bytes
+        The encoded PNG.
+    """
+    from PIL import Image, ImageDraw
+
+    sections = [("Best 30", best)]
+    if len(recent) > 0:
+        sections.append(("Recent 10", recent))
+
+    width = COLUMNS * TILE_WIDTH + (COLUMNS + 1) * PADDING
+    height = HEADER_HEIGHT
+    for _, records in sections:
+        rows = -(-len(records) // COLUMNS)
+        height += SECTION_HEIGHT + rows * (TILE_HEIGHT + PADDING)
+    height += PADDING
+
+    card = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(card)
+
+    fonts.heading.draw(card, (PADDING * 2, 16), title, TEXT)
+
+    y = HEADER_HEIGHT
+    for name, records in sections:
+        ratings = [
+            rating
+            for record in records
+            if (rating := record.extras.get(KEY_PLAY_RATING)) is not None
+        ]
+        heading = name
+        if len(ratings) > 0:
+            heading += f"  ·  average {floor_to_ndp(sum(ratings) / len(records), 2)}"
+        fonts.text.draw(card, (PADDING * 2, y + 8), heading, MUTED_TEXT)
+        y += SECTION_HEIGHT
+
+        for i, record in enumerate(records):
+            row, column = divmod(i, COLUMNS)
+            key = jacket_key(record.jacket)
+            _draw_tile(
+                card,
+                draw,
+                PADDING + column * (TILE_WIDTH + PADDING),
+                y + row * (TILE_HEIGHT + PADDING),
+                i + 1,
+                record,
+                jackets.get(key) if key is not None else None,
+                fonts,
+            )
+
+        y += -(-len(records) // COLUMNS) * (TILE_HEIGHT + PADDING)
+
+    buffer = BytesIO()
+    # Maximum compression takes several times longer for a few percent, and
+    # the card is uploaded once.
+    card.save(buffer, "png", compress_level=1)
+    return buffer.getvalue()
+
+
+class AssetCache:
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        font: Optional[Path] = None,
+        max_jackets: int = 512,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        directory: Path
+            Where downloaded jackets are stored.
+        font: Optional[Path]
+            Font to render text with. Should cover Japanese, since most song
+            titles are. Pillow's default font is used if unset.
+        max_jackets: int
+            Number of decoded jackets kept in memory.
+        """
+        self.directory = directory
+        self.font = font
+        self.max_jackets = max_jackets
+
+        # key: jacket_key
+        self._jackets: OrderedDict[str, "Image.Image"] = OrderedDict()
+        self._jackets_lock = threading.Lock()
+        self._fonts: Optional[CardFonts] = None
+        self._fonts_lock = threading.Lock()
+        # key: jacket_key
+        # value: time.monotonic() of the last failed download
+        self._failed_downloads: dict[str, float] = {}
+
+    @property
+    def jacket_directory(self) -> Path:
+        return self.directory / "jackets"
+
+    async def download_jackets(
+        self, urls: Iterable[Optional[str]], *, concurrency: int = 8
+    ) -> None:
+        """Downloads the jackets that aren't on disk yet. Jackets that fail to
+        download are skipped, drawn as a placeholder, and not retried for a
+        while, so an unreachable server doesn't hold up every card."""
+        import httpx
+
+        now = time.monotonic()
+        missing = {
+            key: url
+            for url in urls
+            if (key := jacket_key(url)) is not None
+            and url is not None
+            and now - self._failed_downloads.get(key, -math.inf) > JACKET_RETRY_INTERVAL
+            and not (self.jacket_directory / key).exists()
+        }
+        if len(missing) == 0:
+            return
+
+        self.jacket_directory.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(client: httpx.AsyncClient, key: str, url: str) -> None:
+            async with semaphore:
+                try:
+                    resp = await client.get(url)
+                    resp.raise_for_status()
+                except httpx.HTTPError as e:
+                    logger.debug(f"Could not download jacket {url}: {e}")
+                    self._failed_downloads[key] = time.monotonic()
+                    return
+
+            self._failed_downloads.pop(key, None)
+
+            path = self.jacket_directory / key
+            temp_path = path.with_name(f"{key}.tmp")
+            temp_path.write_bytes(resp.content)
+            temp_path.replace(path)
+
+        async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+            await asyncio.gather(
+                *(download(client, key, url) for key, url in missing.items())
+            )
+
+    def load_jackets(self, keys: Iterable[Optional[str]]) -> dict[str, "Image.Image"]:
+        """Decodes and resizes jackets from disk, or returns them from memory.
+        Blocks, so call it from a thread."""
+        from PIL import Image
+
+        jackets: dict[str, "Image.Image"] = {}
+
+        for key in keys:
+            if key is None or key in jackets:
+                continue
+
+            with self._jackets_lock:
+                if (jacket := self._jackets.get(key)) is not None:
+                    self._jackets.move_to_end(key)
+                    jackets[key] = jacket
+                    continue
+
+            path = self.jacket_directory / key
+            try:
+                with Image.open(path) as image:
+                    jacket = image.convert("RGB").resize(
+                        (JACKET_SIZE, JACKET_SIZE), Image.Resampling.LANCZOS
+                    )
+            except (OSError, ValueError):
+                continue
+
+            jackets[key] = jacket
+
+            with self._jackets_lock:
+                self._jackets[key] = jacket
+                while len(self._jackets) > self.max_jackets:
+                    self._jackets.popitem(last=False)
+
+        return jackets
+
+    def fonts(self) -> CardFonts:
+        from PIL import ImageFont
+
+        with self._fonts_lock:
+            if self._fonts is None:
+
+                def load(size: int):
+                    if self.font is not None:
+                        return ImageFont.truetype(self.font, size)
+                    return ImageFont.load_default(size)
+
+                self._fonts = CardFonts(
+                    heading=GlyphCache(load(28)),
+                    title=GlyphCache(load(17)),
+                    text=GlyphCache(load(16)),
+                    small=GlyphCache(load(13)),
+                )
+
+        return self._fonts
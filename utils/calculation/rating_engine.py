@@ -0,0 +1,355 @@
+import heapq
+import itertools
+from collections import deque
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from chunithm_net.consts import KEY_PLAY_RATING, KEY_SONG_ID
+from chunithm_net.models.enums import ClearType, ComboType, Difficulty, Rank
+from chunithm_net.models.record import PlaylogMarker, Record
+from utils import json_dumps, json_loads
+
+# (song ID, difficulty)
+ChartKey = tuple[int, Difficulty]
+
+
+@dataclass
+class RatingDelta:
+    best_before: Decimal
+    best_after: Decimal
+    recent_before: Decimal
+    recent_after: Decimal
+    rating_before: Decimal
+    rating_after: Decimal
+
+    # Records that entered the best frame during this update.
+    new_best: list[Record] = field(default_factory=list)
+    # Records that were pushed out of the best frame during this update.
+    displaced: list[Record] = field(default_factory=list)
+
+    @property
+    def best(self) -> Decimal:
+        return self.best_after - self.best_before
+
+    @property
+    def recent(self) -> Decimal:
+        return self.recent_after - self.recent_before
+
+    @property
+    def rating(self) -> Decimal:
+        return self.rating_after - self.rating_before
+
+
+@dataclass
+class VerificationResult:
+    missing: list[Record]
+    extra: list[Record]
+    expected_total: Decimal
+    actual_total: Decimal
+
+    @property
+    def ok(self) -> bool:
+        # Ties at the bottom of the frame can be ordered arbitrarily by
+        # CHUNITHM-NET, so only the rating total has to match exactly.
+        return self.expected_total == self.actual_total
+
+
+@dataclass
+class RatingState:
+    """What is persisted of a `RatingEngine`. The records are not hydrated
+    after `loads`, and have to be before the engine is restored with
+    `RatingEngine.from_state`."""
+
+    best: list[Record]
+    # Newest first.
+    recent: list[Record]
+    marker: Optional[PlaylogMarker] = None
+    synced_at: Optional[datetime] = None
+
+    def dumps(self) -> str:
+        return json_dumps(
+            {
+                "best": [_dump_record(x) for x in self.best],
+                "recent": [_dump_record(x) for x in self.recent],
+                "marker": None if self.marker is None else self.marker.to_dict(),
+                "synced_at": (
+                    None if self.synced_at is None else self.synced_at.isoformat()
+                ),
+            }
+        )
+
+    @staticmethod
+    def loads(data: str) -> "RatingState":
+        state = json_loads(data)
+        marker = state["marker"]
+        synced_at = state["synced_at"]
+
+        return RatingState(
+            best=[_load_record(x) for x in state["best"]],
+            recent=[_load_record(x) for x in state["recent"]],
+            marker=None if marker is None else PlaylogMarker.from_dict(marker),
+            synced_at=None if synced_at is None else datetime.fromisoformat(synced_at),
+        )
+
+
+def chart_key(record: Record) -> Optional[ChartKey]:
+    song_id = record.extras.get(KEY_SONG_ID)
+    if song_id is None:
+        return None
+    return song_id, record.difficulty
+
+
+class RatingEngine:
+    """Keeps a player's best and recent frames up to date from hydrated records.
+
+    Personal bests are tracked per chart, and the best frame is kept as a
+    bounded min-heap keyed by play rating, so ingesting a play is O(log n) in
+    the common case instead of re-sorting every personal best.
+
+    The recent frame is approximated as the top `recent_size` plays out of the
+    last `recent_window` plays, which matches CHUNITHM-NET as long as the
+    player is not deliberately abusing the recent frame replacement rules.
+
+    Records must be hydrated (see `UtilsCog.hydrate_records`), since the play
+    rating and song ID are read from `Record.extras`. WORLD'S END charts and
+    records without a song ID are ignored, because they do not count towards
+    rating.
+
+    The engine doesn't read the playlog itself. Whoever feeds it plays keeps
+    `marker` pointing at the newest ingested play (see
+    `chunithm_net.models.record.plays_since`), and `synced_at` at the last
+    time every play had been ingested.
+    """
+
+    def __init__(
+        self,
+        *,
+        best_size: int = 30,
+        recent_size: int = 10,
+        recent_window: int = 30,
+    ) -> None:
+        self.best_size = best_size
+        self.recent_size = recent_size
+
+        self._personal_bests: dict[ChartKey, Record] = {}
+        # min-heap of (play rating, insertion order, chart key)
+        self._heap: list[tuple[Decimal, int, ChartKey]] = []
+        self._in_heap: set[ChartKey] = set()
+        self._counter = itertools.count()
+
+        self._recent_plays: deque[Record] = deque(maxlen=recent_window)
+
+        self.marker: Optional[PlaylogMarker] = None
+        self.synced_at: Optional[datetime] = None
+
+    @classmethod
+    def from_records(
+        cls,
+        personal_bests: Iterable[Record],
+        recent_plays: Iterable[Record] = (),
+        **kwargs,
+    ) -> "RatingEngine":
+        engine = cls(**kwargs)
+
+        for record in personal_bests:
+            engine._update_personal_best(record)
+
+        # Playlogs are sorted newest first.
+        for record in reversed(list(recent_plays)):
+            if _rating(record) is not None:
+                engine._recent_plays.append(record)
+
+        return engine
+
+    @classmethod
+    def from_state(cls, state: RatingState, **kwargs) -> "RatingEngine":
+        engine = cls.from_records(state.best, state.recent, **kwargs)
+        engine.marker = state.marker
+        engine.synced_at = state.synced_at
+
+        return engine
+
+    def state(self) -> RatingState:
+        """The best frame and the plays the recent frame is picked from. Personal
+        bests outside of the best frame are left out, since a chart can only
+        enter the frame again by being played."""
+        return RatingState(
+            best=self.best(),
+            recent=self.recent_plays(),
+            marker=self.marker,
+            synced_at=self.synced_at,
+        )
+
+    def __len__(self) -> int:
+        return len(self._personal_bests)
+
+    def best(self) -> list[Record]:
+        """Records in the best frame, sorted by play rating descending."""
+        return sorted(
+            (self._personal_bests[key] for _, _, key in self._heap),
+            key=_sort_key,
+            reverse=True,
+        )
+
+    def recent(self) -> list[Record]:
+        """Records in the (approximated) recent frame, sorted by play rating descending."""
+        return heapq.nlargest(self.recent_size, self._recent_plays, key=_sort_key)
+
+    def recent_plays(self) -> list[Record]:
+        """Plays the recent frame is picked from, newest first."""
+        return list(reversed(self._recent_plays))
+
+    def best_total(self) -> Decimal:
+        return sum((rating for rating, _, _ in self._heap), Decimal(0))
+
+    def recent_total(self) -> Decimal:
+        return sum((_rating(x) or Decimal(0) for x in self.recent()), Decimal(0))
+
+    def best_average(self) -> Decimal:
+        if len(self._heap) == 0:
+            return Decimal(0)
+        return self.best_total() / len(self._heap)
+
+    def rating(self) -> Decimal:
+        """Player rating, which is the average of the best and recent frames."""
+        return (self.best_total() + self.recent_total()) / (
+            self.best_size + self.recent_size
+        )
+
+    def ingest(self, plays: Iterable[Record]) -> RatingDelta:
+        """Ingests plays from the playlog, oldest first.
+
+        Returns the change in both frames caused by these plays.
+        """
+        delta = RatingDelta(
+            best_before=self.best_total(),
+            best_after=Decimal(0),
+            recent_before=self.recent_total(),
+            recent_after=Decimal(0),
+            rating_before=self.rating(),
+            rating_after=Decimal(0),
+        )
+
+        for play in plays:
+            if _rating(play) is None:
+                continue
+
+            self._recent_plays.append(play)
+
+            entered, displaced = self._update_personal_best(play)
+            if entered is not None:
+                delta.new_best.append(entered)
+            if displaced is not None:
+                delta.displaced.append(displaced)
+
+        delta.best_after = self.best_total()
+        delta.recent_after = self.recent_total()
+        delta.rating_after = self.rating()
+
+        return delta
+
+    def verify(self, scraped_best: Sequence[Record]) -> VerificationResult:
+        """Compares the computed best frame against the one scraped from CHUNITHM-NET.
+
+        `scraped_best` must be hydrated so that play ratings are available.
+        """
+        expected = {
+            (key, record.score): record
+            for record in scraped_best
+            if (key := chart_key(record)) is not None
+        }
+        actual = {
+            (key, record.score): record
+            for record in self.best()
+            if (key := chart_key(record)) is not None
+        }
+
+        return VerificationResult(
+            missing=[v for k, v in expected.items() if k not in actual],
+            extra=[v for k, v in actual.items() if k not in expected],
+            expected_total=sum(
+                (_rating(x) or Decimal(0) for x in scraped_best), Decimal(0)
+            ),
+            actual_total=self.best_total(),
+        )
+
+    def _update_personal_best(
+        self, record: Record
+    ) -> tuple[Optional[Record], Optional[Record]]:
+        key = chart_key(record)
+        rating = _rating(record)
+
+        if key is None or rating is None:
+            return None, None
+
+        existing = self._personal_bests.get(key)
+        if existing is not None and existing.score >= record.score:
+            return None, None
+
+        self._personal_bests[key] = record
+
+        if key in self._in_heap:
+            # The chart is already in the frame, so only its rating changes.
+            # The heap is small enough that rebuilding it is cheaper than
+            # keeping an index of positions.
+            self._heap = [
+                (rating, order, k) if k == key else (r, order, k)
+                for r, order, k in self._heap
+            ]
+            heapq.heapify(self._heap)
+            return None, None
+
+        entry = (rating, next(self._counter), key)
+
+        if len(self._heap) < self.best_size:
+            heapq.heappush(self._heap, entry)
+            self._in_heap.add(key)
+            return record, None
+
+        if rating <= self._heap[0][0]:
+            return None, None
+
+        _, _, displaced_key = heapq.heapreplace(self._heap, entry)
+        self._in_heap.discard(displaced_key)
+        self._in_heap.add(key)
+
+        return record, self._personal_bests[displaced_key]
+
+
+def _rating(record: Record) -> Optional[Decimal]:
+    if record.difficulty == Difficulty.WORLDS_END:
+        return None
+    return record.extras.get(KEY_PLAY_RATING)
+
+
+def _sort_key(record: Record) -> tuple[Decimal, int]:
+    return _rating(record) or Decimal(0), record.score
+
+
+def _dump_record(record: Record) -> dict[str, Any]:
+    return {
+        "title": record.title,
+        "song_id": record.extras[KEY_SONG_ID],
+        "difficulty": record.difficulty.value,
+        "score": record.score,
+        "clear_lamp": record.clear_lamp.value,
+        "combo_lamp": record.combo_lamp.value,
+    }
+
+
+def _load_record(data: dict[str, Any]) -> Record:
+    record = Record(
+        title=data["title"],
+        difficulty=Difficulty(data["difficulty"]),
+        score=data["score"],
+        rank=Rank.from_score(data["score"]),
+        clear_lamp=ClearType(data["clear_lamp"]),
+        combo_lamp=ComboType(data["combo_lamp"]),
+    )
+
+    record.extras[KEY_SONG_ID] = data["song_id"]
+
+    return record
@@ -20,9 +20,11 @@ from chunithm_net.models.record import (
 from utils import floor_to_ndp
 from utils.calculation.overpower import calculate_play_overpower
 from utils.ranks import rank_icon
+from utils.tracing import traced
 
 
 class ScoreCardEmbed(discord.Embed):
+    @traced("render.score_card")
     def __init__(
         self,
         record: Record,
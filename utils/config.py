@@ -1,3 +1,4 @@
+import os
 from configparser import ConfigParser
 from pathlib import Path
 from typing import TYPE_CHECKING, Optional
@@ -25,6 +26,18 @@ class BotConfig:
             fallback="sqlite+aiosqlite:///database/database.sqlite3",
         )
 
+    @property
+    def db_read_connections(self) -> int:
+        return self.__section.getint("db_read_connections", fallback=5)
+
+    @property
+    def wal_checkpoint_interval(self) -> float:
+        return self.__section.getfloat("wal_checkpoint_interval", fallback=300)
+
+    @property
+    def slow_query_threshold(self) -> float:
+        return self.__section.getfloat("slow_query_threshold", fallback=0.1)
+
     @property
     def error_reporting_webhook(self) -> Optional[str]:
         return self.__section.get("error_reporting_webhook")
@@ -62,6 +75,10 @@ class WebConfig:
     def goatcounter(self) -> Optional[str]:
         return self.__section.get("goatcounter")
 
+    @property
+    def metrics_token(self) -> Optional[str]:
+        return self.__section.get("metrics_token")
+
 
 class CredentialsConfig:
     def __init__(self, section: "SectionProxy") -> None:
@@ -127,6 +144,96 @@ class LegalConfig:
         )
 
 
+class PrefetchConfig:
+    def __init__(self, section: "SectionProxy") -> None:
+        self.__section = section
+
+    @property
+    def enable(self) -> bool:
+        return self.__section.getboolean("enable", fallback=False)
+
+    @property
+    def workers(self) -> int:
+        return self.__section.getint("workers", fallback=2)
+
+    @property
+    def interval(self) -> float:
+        return self.__section.getfloat("interval", fallback=120.0)
+
+    @property
+    def jitter(self) -> float:
+        return self.__section.getfloat("jitter", fallback=0.25)
+
+    @property
+    def active_window(self) -> float:
+        return self.__section.getfloat("active_window", fallback=1800.0)
+
+    @property
+    def cache_ttl(self) -> float:
+        return self.__section.getfloat("cache_ttl", fallback=300.0)
+
+
+class RateLimitConfig:
+    def __init__(self, section: "SectionProxy") -> None:
+        self.__section = section
+
+    @property
+    def rate(self) -> float:
+        return self.__section.getfloat("rate", fallback=5.0)
+
+    @property
+    def burst(self) -> int:
+        return self.__section.getint("burst", fallback=10)
+
+
+class TracingConfig:
+    def __init__(self, section: "SectionProxy") -> None:
+        self.__section = section
+
+    @property
+    def enable(self) -> bool:
+        return self.__section.getboolean("enable", fallback=False)
+
+    @property
+    def sample_rate(self) -> float:
+        return self.__section.getfloat("sample_rate", fallback=0.01)
+
+    @property
+    def slow_threshold(self) -> float:
+        return self.__section.getfloat("slow_threshold", fallback=5.0)
+
+
+class RenderingConfig:
+    def __init__(self, section: "SectionProxy") -> None:
+        self.__section = section
+
+    @property
+    def asset_dir(self) -> Path:
+        return Path(self.__section.get("asset_dir", fallback="assets"))
+
+    @property
+    def font(self) -> Optional[Path]:
+        font = self.__section.get("font", fallback=None)
+        return Path(font) if font else None
+
+    @property
+    def workers(self) -> int:
+        return self.__section.getint("workers", fallback=2)
+
+
+class CatalogConfig:
+    def __init__(self, section: "SectionProxy") -> None:
+        self.__section = section
+
+    @property
+    def refresh(self) -> bool:
+        return self.__section.getboolean("refresh", fallback=False)
+
+    @property
+    def cache_dir(self) -> Path:
+        return Path(self.__section.get("cache_dir", fallback=".cache/dbutils"))
+
+
 class DangerousConfig:
     def __init__(self, section: "SectionProxy") -> None:
         self.__section = section
@@ -145,6 +252,18 @@ class Config:
         self.icons = IconsConfig(self.__config["icons"])
         self.legal = LegalConfig(self.__config["legal"])
         self.dangerous = DangerousConfig(self.__config["dangerous"])
+        self.prefetch = PrefetchConfig(self._optional_section("prefetch"))
+        self.ratelimit = RateLimitConfig(self._optional_section("ratelimit"))
+        self.tracing = TracingConfig(self._optional_section("tracing"))
+        self.rendering = RenderingConfig(self._optional_section("rendering"))
+        self.catalog = CatalogConfig(self._optional_section("catalog"))
+
+    def _optional_section(self, name: str) -> "SectionProxy":
+        # Sections added after the initial release are optional, so that
+        # existing configuration files keep working.
+        if not self.__config.has_section(name):
+            self.__config.add_section(name)
+        return self.__config[name]
 
     @classmethod
     def from_file(cls, path: "str | Path") -> "Config":
@@ -153,4 +272,8 @@ class Config:
         return cls(cfg)
 
 
-config = Config.from_file(Path(__file__).parent.parent / "bot.ini")
+# CHUNINEWBOT_CONFIG points the bot at a different configuration file, e.g. for
+# benchmarks that run against a throwaway database.
+config = Config.from_file(
+    os.environ.get("CHUNINEWBOT_CONFIG", Path(__file__).parent.parent / "bot.ini")
+)
@@ -0,0 +1,375 @@
+"""A minimal metrics registry that renders the Prometheus text exposition format.
+
+Recording a sample is a dict lookup and an addition, so it is cheap enough to
+leave on in production. Metrics are meant to be defined at module level:
+
+    COMMANDS = Counter("chuninewbot_commands_total", "Commands invoked", ["command"])
+    COMMANDS.labels("b30").inc()
+"""
+import asyncio
+import bisect
+import time
+from collections.abc import Callable, Iterable, Sequence
+from typing import TYPE_CHECKING, Optional
+
+from chunithm_net import coalesced_requests, instrumentation
+from chunithm_net.limiter import get_default_limiter
+from database.instrumentation import add_statement_listener
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from database.instrumentation import StatementEvent
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "REGISTRY",
+    "CallbackMetric",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "instrument_chunithm_net",
+    "instrument_engine",
+    "monitor_event_loop_lag",
+]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = tuple[str, ...]
+Sample = tuple[str, dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ""
+
+    inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return f"{{{inner}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    type: str = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        *,
+        registry: Optional["Registry"] = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        (registry or REGISTRY).register(self)
+
+    def _label_dict(self, values: LabelValues) -> dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def _check_labels(self, values: LabelValues) -> LabelValues:
+        if len(values) != len(self.labelnames):
+            msg = f"{self.name} expects labels {self.labelnames}, got {values}"
+            raise ValueError(msg)
+        return tuple(str(v) for v in values)
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._children: dict[LabelValues, _CounterChild] = {}
+
+    def labels(self, *values: object) -> _CounterChild:
+        key = self._check_labels(values)  # type: ignore[reportArgumentType]
+        if (child := self._children.get(key)) is None:
+            child = self._children[key] = _CounterChild()
+        return child
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in self._children.items():
+            yield self.name, self._label_dict(key), child.value
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._children: dict[LabelValues, _GaugeChild] = {}
+
+    def labels(self, *values: object) -> _GaugeChild:
+        key = self._check_labels(values)  # type: ignore[reportArgumentType]
+        if (child := self._children.get(key)) is None:
+            child = self._children[key] = _GaugeChild()
+        return child
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in self._children.items():
+            yield self.name, self._label_dict(key), child.value
+
+
+class CallbackMetric(Metric):
+    """A metric whose values are computed when the metrics are scraped, for
+    values that are already tracked elsewhere.
+
+    `callback` returns (label values, value) pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[tuple[Sequence[object], float]]],
+        *,
+        type: str = "gauge",
+        **kwargs,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.type = type
+        self.callback = callback
+
+    def samples(self) -> Iterable[Sample]:
+        for values, value in self.callback():
+            yield self.name, self._label_dict(tuple(str(v) for v in values)), value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        # The last slot is the +Inf bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **kwargs,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._children: dict[LabelValues, _HistogramChild] = {}
+
+    def labels(self, *values: object) -> _HistogramChild:
+        key = self._check_labels(values)  # type: ignore[reportArgumentType]
+        if (child := self._children.get(key)) is None:
+            child = self._children[key] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, child in self._children.items():
+            labels = self._label_dict(key)
+
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+
+            yield f"{self.name}_sum", labels, child.sum
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        # Replacing instead of raising on duplicates keeps metrics defined in
+        # cogs working across hot reloads.
+        self._metrics[metric.name] = metric
+
+    def unregister(self, name: str) -> None:
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+EVENT_LOOP_LAG = Histogram(
+    "chuninewbot_event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Measures event loop lag forever. Run this as a background task."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+CHUNITHM_NET_REQUEST_DURATION = Histogram(
+    "chuninewbot_chunithm_net_request_duration_seconds",
+    "CHUNITHM-NET request latency, including time spent waiting on the rate limiter",
+    ["method", "path", "status", "error"],
+)
+CHUNITHM_NET_PARSE_DURATION = Histogram(
+    "chuninewbot_chunithm_net_parse_duration_seconds",
+    "Time spent in CHUNITHM-NET parser functions",
+    ["parser"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+DB_QUERY_DURATION = Histogram(
+    "chuninewbot_db_query_duration_seconds",
+    "Database statement execution time",
+    ["statement"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+def _limiter_queue_depth():
+    for priority, depth in get_default_limiter().stats().queue_depth.items():
+        yield (priority.name.lower(),), depth
+
+
+def _limiter_wait_seconds():
+    for priority, stats in get_default_limiter().stats().priorities.items():
+        yield (priority.name.lower(),), stats.total_wait
+
+
+def _limiter_requests():
+    for priority, stats in get_default_limiter().stats().priorities.items():
+        yield (priority.name.lower(),), stats.acquired
+
+
+CallbackMetric(
+    "chuninewbot_chunithm_net_ratelimit_queue_depth",
+    "Requests waiting on the CHUNITHM-NET rate limiter",
+    ["priority"],
+    _limiter_queue_depth,
+)
+CallbackMetric(
+    "chuninewbot_chunithm_net_ratelimit_wait_seconds_total",
+    "Total time requests spent waiting on the CHUNITHM-NET rate limiter",
+    ["priority"],
+    _limiter_wait_seconds,
+    type="counter",
+)
+CallbackMetric(
+    "chuninewbot_chunithm_net_ratelimit_requests_total",
+    "Requests that went through the CHUNITHM-NET rate limiter",
+    ["priority"],
+    _limiter_requests,
+    type="counter",
+)
+CallbackMetric(
+    "chuninewbot_chunithm_net_coalesced_requests_total",
+    "CHUNITHM-NET page requests that were served by an identical in-flight request",
+    [],
+    lambda: [((), coalesced_requests())],
+    type="counter",
+)
+
+
+def _on_request(event: instrumentation.RequestEvent) -> None:
+    CHUNITHM_NET_REQUEST_DURATION.labels(
+        event.method,
+        event.path,
+        event.status if event.status is not None else "",
+        event.error or "",
+    ).observe(event.duration)
+
+
+def _on_parse(event: instrumentation.ParseEvent) -> None:
+    CHUNITHM_NET_PARSE_DURATION.labels(event.parser).observe(event.duration)
+
+
+def instrument_chunithm_net() -> None:
+    instrumentation.add_request_listener(_on_request)
+    instrumentation.add_parse_listener(_on_parse)
+
+
+def instrument_engine(engine: "AsyncEngine") -> None:
+    def on_statement(event: "StatementEvent"):
+        DB_QUERY_DURATION.labels(event.verb).observe(event.duration)
+
+    add_statement_listener(engine, on_statement)
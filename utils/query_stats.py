@@ -0,0 +1,138 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from database.instrumentation import add_statement_listener
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from database.instrumentation import StatementEvent
+
+__all__ = ["QueryStats", "StatementStats", "normalize_sql"]
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Expanding IN parameters produce a different statement for every list length.
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+# Statements that EXPLAIN QUERY PLAN can be run on without side effects.
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def normalize_sql(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _PARAMETER_LIST.sub("(?, ...)", statement)
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    plan: Optional[list[str]] = None
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+
+class QueryStats:
+    """Aggregates statement execution times by normalized SQL.
+
+    The first time a statement takes longer than `slow_threshold` seconds,
+    its SQLite query plan is captured and logged.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        *,
+        slow_threshold: float = 0.1,
+    ) -> None:
+        self.logger = logger
+        self.slow_threshold = slow_threshold
+
+        # key: normalized statement
+        self.statements: dict[str, StatementStats] = {}
+        # Compiled statements are mostly identical strings, so normalizing can
+        # be skipped for statements that have been seen before.
+        self._normalized: dict[str, str] = {}
+
+    def top(self, n: int = 10, *, key: str = "total") -> list[StatementStats]:
+        return sorted(
+            self.statements.values(),
+            key=lambda x: getattr(x, key),
+            reverse=True,
+        )[:n]
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+    def record(self, statement: str, duration: float) -> StatementStats:
+        if (normalized := self._normalized.get(statement)) is None:
+            normalized = normalize_sql(statement)
+
+            # Statements with inlined literals could make this grow without
+            # bound, so stop remembering them at some point.
+            if len(self._normalized) < 4096:
+                self._normalized[statement] = normalized
+
+        if (stats := self.statements.get(normalized)) is None:
+            stats = self.statements[normalized] = StatementStats(normalized)
+
+        stats.count += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+
+        return stats
+
+    def install(self, engine: "AsyncEngine") -> None:
+        def on_statement(event: "StatementEvent"):
+            stats = self.record(event.statement, event.duration)
+
+            if (
+                event.duration >= self.slow_threshold
+                and event.error is None
+                and stats.plan is None
+                and not event.executemany
+                and engine.dialect.name == "sqlite"
+            ):
+                self._explain(
+                    event.connection,
+                    event.statement,
+                    event.parameters,
+                    stats,
+                    event.duration,
+                )
+
+        add_statement_listener(engine, on_statement)
+
+    def _explain(self, conn, statement, parameters, stats: StatementStats, duration):
+        stats.plan = []
+
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return
+
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            # (id, parent, notused, detail)
+            stats.plan = [row[3] for row in cursor.fetchall()]
+        except Exception as e:  # noqa: BLE001
+            self.logger.warning(f"Could not explain slow query: {e!r}")
+            return
+        finally:
+            cursor.close()
+
+        self.logger.warning(
+            "Slow query (%.0fms): %s\nQuery plan:\n%s",
+            duration * 1000,
+            stats.statement,
+            "\n".join(stats.plan),
+        )
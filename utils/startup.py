@@ -0,0 +1,87 @@
+"""Startup timing.
+
+Every startup records how long each phase took and logs a one-line summary
+once the bot can serve every command. Running the bot with `--profile-startup`
+additionally profiles startup with cProfile, dumps the stats to a file and
+logs the most expensive functions.
+"""
+import contextlib
+import cProfile
+import io
+import logging
+import pstats
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["StartupProfile"]
+
+
+class StartupProfile:
+    def __init__(
+        self,
+        logger: logging.Logger,
+        *,
+        start: Optional[float] = None,
+        profile_path: Optional[Path] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        logger: logging.Logger
+            Logger that the summary is written to.
+        start: Optional[float]
+            `time.perf_counter()` when startup began. Defaults to now.
+        profile_path: Optional[Path]
+            If set, startup is profiled with cProfile and the stats are
+            written here.
+        """
+        self.logger = logger
+        self.start = start if start is not None else time.perf_counter()
+        self.profile_path = profile_path
+
+        # (phase name, duration)
+        self.phases: list[tuple[str, float]] = []
+        self.finished = False
+
+        self._profiler: Optional[cProfile.Profile] = None
+        if profile_path is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, duration: float) -> None:
+        self.phases.append((name, duration))
+
+    def finish(self) -> float:
+        """Logs the summary, and returns the total startup time in seconds."""
+        total = time.perf_counter() - self.start
+
+        if self.finished:
+            return total
+        self.finished = True
+
+        phases = ", ".join(f"{name} {duration:.3f}s" for name, duration in self.phases)
+        self.logger.info(f"Ready to serve all commands after {total:.3f}s ({phases})")
+
+        if self._profiler is not None and self.profile_path is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+
+            buffer = io.StringIO()
+            pstats.Stats(self._profiler, stream=buffer).sort_stats(
+                pstats.SortKey.CUMULATIVE
+            ).print_stats(30)
+            self.logger.info(
+                f"Startup profile written to {self.profile_path}\n{buffer.getvalue()}"
+            )
+
+        return total
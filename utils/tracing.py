@@ -0,0 +1,274 @@
+"""Lightweight per-command tracing.
+
+A trace is started for every command, and the current span is tracked in a
+context variable, so code anywhere below the command can open child spans
+without passing anything around:
+
+    with span("hydrate_records", count=len(records)):
+        ...
+
+When there is no trace in the current context, opening a span is a single
+context variable lookup.
+"""
+import contextlib
+import functools
+import itertools
+import logging
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar, Token
+from typing import TYPE_CHECKING, Any, Optional, TypeVar
+
+from discord.ext import commands
+
+from chunithm_net import instrumentation
+from database.instrumentation import add_statement_listener
+from utils import json_dumps
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from database.instrumentation import StatementEvent
+
+__all__ = [
+    "Span",
+    "Trace",
+    "TracedContext",
+    "Tracer",
+    "current_trace",
+    "install_listeners",
+    "record_span",
+    "span",
+    "traced",
+]
+
+F = TypeVar("F", bound=Callable)
+
+
+class Span:
+    __slots__ = ("attributes", "duration", "id", "name", "parent_id", "start", "trace")
+
+    def __init__(
+        self,
+        trace: "Trace",
+        id: int,
+        parent_id: Optional[int],
+        name: str,
+        start: float,
+        attributes: dict[str, Any],
+    ) -> None:
+        self.trace = trace
+        self.id = id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 3),
+            "duration_ms": (
+                round(self.duration * 1000, 3) if self.duration is not None else None
+            ),
+            **({"attributes": self.attributes} if self.attributes else {}),
+        }
+
+
+class Trace:
+    def __init__(self, name: str, *, max_spans: int = 500, **attributes) -> None:
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        # Spans that were not recorded because the trace was full.
+        self.dropped = 0
+
+        self._ids = itertools.count()
+        self.root = Span(
+            self, next(self._ids), None, name, time.perf_counter(), attributes
+        )
+        self.spans.append(self.root)
+
+        self._token: Optional[Token] = None
+
+    @property
+    def duration(self) -> float:
+        if self.root.duration is not None:
+            return self.root.duration
+        return time.perf_counter() - self.root.start
+
+    def new_span(
+        self,
+        parent: Span,
+        name: str,
+        start: float,
+        attributes: dict[str, Any],
+    ) -> Optional[Span]:
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+
+        span = Span(self, next(self._ids), parent.id, name, start, attributes)
+        self.spans.append(span)
+        return span
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace": self.root.name,
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.root.attributes,
+            "dropped_spans": self.dropped,
+            "spans": [span.to_dict() for span in self.spans[1:]],
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "chuninewbot_current_span", default=None
+)
+
+
+def current_trace() -> Optional[Trace]:
+    if (current := _current_span.get()) is None:
+        return None
+    return current.trace
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Opens a child span of the current span, if there is a trace going on."""
+    if (parent := _current_span.get()) is None:
+        yield None
+        return
+
+    child = parent.trace.new_span(parent, name, time.perf_counter(), attributes)
+    if child is None:
+        yield None
+        return
+
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.duration = time.perf_counter() - child.start
+        _current_span.reset(token)
+
+
+def record_span(name: str, start: float, duration: float, **attributes) -> None:
+    """Records a span that has already finished, e.g. from an event listener."""
+    if (parent := _current_span.get()) is None:
+        return
+
+    child = parent.trace.new_span(parent, name, start, attributes)
+    if child is not None:
+        child.duration = duration
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Wraps every call to a synchronous function in a span."""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[reportReturnType]
+
+    return decorator
+
+
+class TracedContext(commands.Context):
+    """Context that records replies as spans."""
+
+    async def send(self, *args, **kwargs):
+        with span("discord.send"):
+            return await super().send(*args, **kwargs)
+
+
+class Tracer:
+    """Starts traces, and logs finished ones as JSON lines.
+
+    Parameters
+    ----------
+    logger: logging.Logger
+        Logger that finished traces are written to.
+    sample_rate: float
+        Fraction of traces that are logged.
+    slow_threshold: float
+        Traces that take at least this many seconds are always logged.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        *,
+        sample_rate: float = 0.01,
+        slow_threshold: float = 5.0,
+        max_spans: int = 500,
+    ) -> None:
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_spans = max_spans
+
+    def start(self, name: str, **attributes) -> Trace:
+        trace = Trace(name, max_spans=self.max_spans, **attributes)
+        trace._token = _current_span.set(trace.root)
+        return trace
+
+    def finish(self, trace: Trace) -> bool:
+        """Ends a trace, returning whether it was logged."""
+        trace.root.duration = time.perf_counter() - trace.root.start
+
+        if trace._token is not None:
+            # The token can't be used if the trace is finished from a different
+            # context than it was started in, and there is nothing to clean up
+            # in that case anyways.
+            with contextlib.suppress(ValueError):
+                _current_span.reset(trace._token)
+            trace._token = None
+
+        slow = trace.root.duration >= self.slow_threshold
+        if not slow and random.random() >= self.sample_rate:
+            return False
+
+        data = trace.to_dict()
+        data["slow"] = slow
+        self.logger.info(json_dumps(data))
+        return True
+
+
+def _on_request(event: instrumentation.RequestEvent) -> None:
+    record_span(
+        "chunithm_net.request",
+        event.start,
+        event.duration,
+        method=event.method,
+        path=event.path,
+        status=event.status,
+        error=event.error,
+    )
+
+
+def _on_parse(event: instrumentation.ParseEvent) -> None:
+    record_span(f"parse.{event.parser}", event.start, event.duration)
+
+
+def install_listeners(*engines: "AsyncEngine") -> None:
+    """Records CHUNITHM-NET requests, parser calls and database statements as
+    spans of the current trace."""
+    instrumentation.add_request_listener(_on_request)
+    instrumentation.add_parse_listener(_on_parse)
+
+    def on_statement(event: "StatementEvent"):
+        attributes = {"statement": event.verb}
+        if event.error is not None:
+            attributes["error"] = type(event.error).__name__
+
+        record_span("db.query", event.start, event.duration, **attributes)
+
+    for engine in engines:
+        add_statement_listener(engine, on_statement)
@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Generic, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """A small LRU cache whose entries expire after a fixed amount of time.
+
+    A `ttl` of 0 disables the cache entirely: nothing is stored and every
+    lookup is a miss.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 1024,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+
+        # value: (expiry time, value)
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._data.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expiry, value = entry
+        if expiry <= self.clock():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.ttl <= 0:
+            return
+
+        self._data[key] = (self.clock() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[K], bool]) -> int:
+        """Removes every entry whose key matches `predicate`.
+
+        Returns the number of removed entries.
+        """
+        keys = [k for k in self._data if predicate(k)]
+        for k in keys:
+            del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
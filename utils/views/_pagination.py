@@ -1,6 +1,7 @@
 from abc import abstractmethod
 from collections.abc import Sequence
 from math import ceil
+from typing import Any, Optional
 
 import discord.ui
 from discord import Interaction
@@ -18,6 +19,10 @@ class PaginationView(discord.ui.View):
         self.per_page = per_page
         self.max_index = ceil(len(self.items) / per_page) - 1
 
+        # key: page number
+        # value: keyword arguments to send or edit the message with
+        self._rendered_pages: dict[int, dict[str, Any]] = {}
+
         if self.max_index == 0:
             for item in self.children:
                 if isinstance(item, discord.ui.Button):
@@ -52,9 +57,36 @@ class PaginationView(discord.ui.View):
         )
 
     @abstractmethod
-    async def callback(self, interaction: discord.Interaction):
+    def render_page(self, page: int) -> dict[str, Any]:
+        """Renders a page as keyword arguments for sending or editing the
+        message, e.g. `{"embeds": [...]}`.
+
+        Pages are only rendered once, so this should only depend on `page`.
+        """
         ...
 
+    def get_page(self, page: Optional[int] = None) -> dict[str, Any]:
+        """Returns the rendered page, which is the current page by default."""
+        if page is None:
+            page = self.page
+
+        if (rendered := self._rendered_pages.get(page)) is None:
+            rendered = self._rendered_pages[page] = self.render_page(page)
+
+        return rendered
+
+    def prerender_adjacent_pages(self) -> None:
+        """Renders the pages before and after the current one, so that flipping
+        to them only has to send what is already rendered. Call this after the
+        current page has been sent, so that it doesn't delay it."""
+        for page in (self.page + 1, self.page - 1):
+            if 0 <= page <= self.max_index:
+                self.get_page(page)
+
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(**self.get_page(), view=self)
+        self.prerender_adjacent_pages()
+
     @discord.ui.button(label="<<", style=discord.ButtonStyle.grey, disabled=True)
     async def to_first_page(
         self, interaction: discord.Interaction, _: discord.ui.Button
@@ -1,5 +1,5 @@
 from collections.abc import Sequence
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 import discord
 import discord.ui
@@ -41,23 +41,16 @@ class B30View(PaginationView):
             else ""
         )
 
-    def format_page(
-        self, items: Sequence["Record"], start_index: int = 0
-    ) -> Sequence[discord.Embed]:
+    def render_page(self, page: int) -> dict[str, Any]:
+        begin = page * self.per_page
+        end = (page + 1) * self.per_page
+
         embeds: list[discord.Embed] = [
-            ScoreCardEmbed(item, index=start_index + idx + 1, show_lamps=False)
-            for idx, item in enumerate(items)
+            ScoreCardEmbed(item, index=begin + idx + 1, show_lamps=False)
+            for idx, item in enumerate(self.items[begin:end])
         ]
         embeds.append(
-            discord.Embed(description=f"Page {self.page + 1}/{self.max_index + 1}")
-        )
-        return embeds
-
-    async def callback(self, interaction: discord.Interaction):
-        begin = self.page * self.per_page
-        end = (self.page + 1) * self.per_page
-        await interaction.response.edit_message(
-            content=self.format_content(),
-            embeds=self.format_page(self.items[begin:end], begin),
-            view=self,
+            discord.Embed(description=f"Page {page + 1}/{self.max_index + 1}")
         )
+
+        return {"content": self.format_content(), "embeds": embeds}
@@ -1,7 +1,6 @@
 from collections.abc import Sequence
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-import discord
 from discord.ext.commands import Context
 
 from utils.components import ScoreCardEmbed
@@ -24,6 +23,5 @@ class CompareView(PaginationView):
         self.player_data = player_data
         super().__init__(ctx, items, per_page)
 
-    async def callback(self, interaction: discord.Interaction):
-        score = self.items[self.page]
-        await interaction.response.edit_message(embed=ScoreCardEmbed(score), view=self)
+    def render_page(self, page: int) -> dict[str, Any]:
+        return {"embed": ScoreCardEmbed(self.items[page])}
@@ -1,6 +1,5 @@
-from typing import Sequence
+from typing import Any, Sequence
 
-import discord
 from discord import Embed
 from discord.ext.commands import Context
 
@@ -11,7 +10,7 @@ class EmbedPaginationView(PaginationView):
     def __init__(self, ctx: Context, items: Sequence[Embed], per_page: int = 1):
         super().__init__(ctx, items, per_page)
 
-    async def callback(self, interaction: discord.Interaction):
-        begin = self.page * self.per_page
-        end = (self.page + 1) * self.per_page
-        await interaction.response.edit_message(embeds=self.items[begin:end], view=self)
+    def render_page(self, page: int) -> dict[str, Any]:
+        begin = page * self.per_page
+        end = (page + 1) * self.per_page
+        return {"embeds": self.items[begin:end]}
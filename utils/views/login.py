@@ -1,4 +1,6 @@
-from discord import Embed, Interaction
+from typing import Any
+
+from discord import Embed
 from discord.ext.commands import Context
 from discord.utils import escape_markdown
 
@@ -58,10 +60,8 @@ class LoginFlowView(PaginationView):
             description=item,
         )
 
-    async def callback(self, interaction: Interaction):
-        description = self.items[self.page]
-        await interaction.response.edit_message(
-            content=self.script if self.page == 2 else None,
-            embed=self.format_embed(description),
-            view=self,
-        )
+    def render_page(self, page: int) -> dict[str, Any]:
+        return {
+            "content": self.script if page == 2 else None,
+            "embed": self.format_embed(self.items[page]),
+        }
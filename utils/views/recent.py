@@ -1,9 +1,21 @@
+import asyncio
+import logging
 from collections.abc import Sequence
-from typing import TYPE_CHECKING, AsyncContextManager
+from typing import TYPE_CHECKING, Any, AsyncContextManager
 
 import discord.ui
 from discord.ext.commands import Context
 
+from chunithm_net.consts import (
+    KEY_INTERNAL_LEVEL,
+    KEY_LEVEL,
+    KEY_OVERPOWER_BASE,
+    KEY_OVERPOWER_MAX,
+    KEY_PLAY_RATING,
+    KEY_TOTAL_COMBO,
+)
+from chunithm_net.limiter import Priority, request_priority
+from chunithm_net.models.enums import Rank
 from utils.components import ScoreCardEmbed
 
 from ._pagination import PaginationView
@@ -12,9 +24,33 @@ if TYPE_CHECKING:
     from bot import ChuniBot
     from chunithm_net import ChuniNet
     from chunithm_net.models.player_data import PlayerData
-    from chunithm_net.models.record import RecentRecord
+    from chunithm_net.models.record import DetailedRecentRecord, RecentRecord
+    from chunithm_net.models.type_paired_dict import TypePairedDictKey
     from cogs.botutils import UtilsCog
 
+logger = logging.getLogger("chuninewbot.views.recent")
+
+# Detailed records fetched at once in the background, so that prefetching
+# doesn't take the whole rate limit from the user's own requests.
+PREFETCH_CONCURRENCY = 2
+# Seconds before a prefetch is given up on. The record is then fetched when
+# selected, like it would be without prefetching.
+PREFETCH_TIMEOUT = 15
+# Seconds a selection waits for a prefetch that is already in flight, before
+# fetching the record itself.
+PREFETCH_WAIT = 5
+
+# Extras set by UtilsCog.hydrate_records, which are the same for the detailed
+# record.
+HYDRATED_KEYS: "tuple[TypePairedDictKey[Any], ...]" = (
+    KEY_LEVEL,
+    KEY_INTERNAL_LEVEL,
+    KEY_PLAY_RATING,
+    KEY_OVERPOWER_BASE,
+    KEY_OVERPOWER_MAX,
+    KEY_TOTAL_COMBO,
+)
+
 
 def split_scores_into_credits(
     scores: Sequence["RecentRecord"],
@@ -66,23 +102,110 @@ class RecentRecordsView(PaginationView):
         ]
         self.dropdown.options = self._dropdown_options[:25]
 
+        # key: index in self.scores
+        self._prefetches: dict[int, asyncio.Task["DetailedRecentRecord"]] = {}
+        # Records fetched when they were selected, also by index.
+        self._detailed_records: dict[int, asyncio.Task["DetailedRecentRecord"]] = {}
+        self._prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        # Indices whose prefetch got past the semaphore and started fetching.
+        self._prefetch_started: set[int] = set()
+
     async def on_timeout(self):
+        for task in [*self._prefetches.values(), *self._detailed_records.values()]:
+            task.cancel()
+
         await self.chuni_client_manager.__aexit__(None, None, None)
         return await super().on_timeout()
 
-    def format_score_page(
-        self, scores: Sequence["RecentRecord"]
-    ) -> Sequence[discord.Embed]:
-        embeds: list[discord.Embed] = [ScoreCardEmbed(score) for score in scores]
-        embeds.append(
-            discord.Embed(description=f"Page {self.page + 1}/{self.max_index + 1}")
-        )
-        return embeds
-
     async def callback(self, interaction: discord.Interaction):
-        await interaction.response.edit_message(
-            embeds=self.format_score_page(self.items[self.page]), view=self
+        await super().callback(interaction)
+        self.prefetch_detailed_records()
+
+    def prefetch_detailed_records(self) -> None:
+        """Starts fetching the detailed records of the credit on the current
+        page in the background, so that selecting one of them from the dropdown
+        doesn't have to wait on CHUNITHM-NET. Call this after the page has been
+        sent."""
+        start = sum(len(credit) for credit in self.items[: self.page])
+
+        for idx in range(start, start + len(self.items[self.page])):
+            if idx in self._prefetches or idx in self._detailed_records:
+                continue
+
+            task = asyncio.create_task(self._prefetch_detailed_record(idx))
+            task.add_done_callback(self._log_prefetch_failure)
+            self._prefetches[idx] = task
+
+    async def _prefetch_detailed_record(self, idx: int) -> "DetailedRecentRecord":
+        async def prefetch():
+            async with self._prefetch_semaphore:
+                self._prefetch_started.add(idx)
+                with request_priority(Priority.BACKGROUND):
+                    return await self._fetch_detailed_record(idx)
+
+        # The coroutine is only created once the task runs, since a prefetch
+        # that is cancelled before it starts would never await it.
+        return await asyncio.wait_for(prefetch(), PREFETCH_TIMEOUT)
+
+    async def _fetch_detailed_record(self, idx: int) -> "DetailedRecentRecord":
+        score = self.scores[idx]
+        detailed = await self.chuni_client.detailed_recent_record(score)
+
+        # The list has already been hydrated, so only go back to the database
+        # if that didn't work the first time.
+        if KEY_LEVEL not in score.extras:
+            return await self.utils.hydrate_record(detailed)
+
+        for key in HYDRATED_KEYS:
+            if (value := score.extras.get(key)) is not None:
+                detailed.extras[key] = value
+
+        if detailed.jacket is None:
+            detailed.jacket = score.jacket
+        if detailed.rank == Rank.D:
+            detailed.rank = score.rank
+
+        return detailed
+
+    def _log_prefetch_failure(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logger.debug("Could not prefetch detailed record", exc_info=e)
+
+    async def get_detailed_record(self, idx: int) -> "DetailedRecentRecord":
+        """Returns the prefetched detailed record of `self.scores[idx]`, or
+        fetches it if it wasn't prefetched yet, or prefetching failed or is
+        taking too long."""
+        if (prefetch := self._prefetches.get(idx)) is not None:
+            # One that is still waiting for its turn hasn't sent anything yet,
+            # so nothing is lost by fetching the record now instead.
+            if not prefetch.done() and idx not in self._prefetch_started:
+                prefetch.cancel()
+
+            # One that is in flight is usually almost done, but runs at
+            # background priority, so it's only waited on for a while.
+            await asyncio.wait((prefetch,), timeout=PREFETCH_WAIT)
+
+            if not prefetch.done():
+                prefetch.cancel()
+            elif not prefetch.cancelled() and prefetch.exception() is None:
+                return prefetch.result()
+
+        if (task := self._detailed_records.get(idx)) is None or (
+            task.done() and (task.cancelled() or task.exception() is not None)
+        ):
+            task = self._detailed_records[idx] = asyncio.create_task(
+                self._fetch_detailed_record(idx)
+            )
+        return await task
+
+    def render_page(self, page: int) -> dict[str, Any]:
+        embeds: list[discord.Embed] = [
+            ScoreCardEmbed(score) for score in self.items[page]
+        ]
+        embeds.append(
+            discord.Embed(description=f"Page {page + 1}/{self.max_index + 1}")
         )
+        return {"embeds": embeds}
 
     @discord.ui.button(label="26-50")
     async def switch_to_26_50(
@@ -104,9 +227,7 @@ class RecentRecordsView(PaginationView):
             return
         await interaction.response.defer()
 
-        idx = int(select.values[0])
-        score = await self.chuni_client.detailed_recent_record(self.scores[idx])
-        score = await self.utils.hydrate_record(score)
+        score = await self.get_detailed_record(int(select.values[0]))
 
         if interaction.message is not None:
             await interaction.message.edit(
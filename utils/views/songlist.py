@@ -1,4 +1,5 @@
 from collections.abc import Sequence
+from typing import Any
 
 import discord
 import discord.ui
@@ -16,24 +17,20 @@ class SonglistView(PaginationView):
     def __init__(self, ctx: Context, charts: Sequence[Chart]):
         super().__init__(ctx, items=charts, per_page=15)
 
-    def format_songlist(
-        self, charts: Sequence[Chart], start_index: int = 0
-    ) -> discord.Embed:
+    def render_page(self, page: int) -> dict[str, Any]:
+        begin = page * self.per_page
+        end = (page + 1) * self.per_page
+
         songlist = ""
-        for idx, chart in enumerate(charts):
+        for idx, chart in enumerate(self.items[begin:end]):
             url = (
                 chart.sdvxin_chart_view.url
                 if chart.sdvxin_chart_view is not None
                 else yt_search_link(chart.song.title, chart.difficulty, chart.level)
             )
-            songlist += f"{idx + start_index + 1}. {escape_markdown(chart.song.title)} [[{chart.difficulty}]]({url})\n"
-        return discord.Embed(
+            songlist += f"{idx + begin + 1}. {escape_markdown(chart.song.title)} [[{chart.difficulty}]]({url})\n"
+
+        embed = discord.Embed(
             description=songlist,
-        ).set_footer(text=f"Page {self.page + 1}/{self.max_index + 1}")
-
-    async def callback(self, interaction: discord.Interaction):
-        begin = self.page * self.per_page
-        end = (self.page + 1) * self.per_page
-        await interaction.response.edit_message(
-            embed=self.format_songlist(self.items[begin:end], begin), view=self
-        )
+        ).set_footer(text=f"Page {page + 1}/{self.max_index + 1}")
+        return {"embed": embed}
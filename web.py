@@ -1,3 +1,4 @@
+import hmac
 import string
 import sys
 from html import escape
@@ -11,6 +12,7 @@ from sqlalchemy import select
 
 from database.models import Cookie
 from utils import json_loads
+from utils.metrics import REGISTRY
 
 if TYPE_CHECKING:
     from bot import ChuniBot
@@ -33,6 +35,27 @@ async def index(request: web.Request) -> web.Response:
     )
 
 
+@router.get("/metrics")
+async def metrics(request: web.Request) -> web.Response:
+    # This server is public, so metrics are only served to whoever has the
+    # token, if one is configured.
+    if (token := request.config_dict["metrics_token"]) is None:
+        raise web.HTTPNotFound
+
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(),
+        f"Bearer {token}".encode(),
+    ):
+        raise web.HTTPUnauthorized(headers={"WWW-Authenticate": "Bearer"})
+
+    return web.Response(
+        text=REGISTRY.render(),
+        content_type="text/plain",
+        charset="utf-8",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
 @router.get("/kamaitachi/oauth")
 async def kamaitachi_oauth(request: web.Request) -> web.Response:
     if (
@@ -56,7 +79,7 @@ async def kamaitachi_oauth(request: web.Request) -> web.Response:
         raise web.HTTPBadRequest(reason="Invalid context parameter") from None
 
     bot: ChuniBot = request.config_dict["bot"]
-    async with bot.begin_db_session() as db_session:
+    async with bot.begin_read_session() as db_session:
         stmt = select(Cookie).where(Cookie.discord_id == discord_id)
         cookie = (await db_session.execute(stmt)).scalar_one_or_none()
         if cookie is None:
@@ -93,6 +116,8 @@ async def kamaitachi_oauth(request: web.Request) -> web.Response:
         raise web.HTTPInternalServerError
 
     cookie.kamaitachi_token = token
+    # Syncing starts over, since this may be a different account.
+    cookie.kamaitachi_marker = None
     async with bot.begin_db_session() as db_session, db_session.begin():
         await db_session.merge(cookie)
 
@@ -207,6 +232,7 @@ def init_app(
     goatcounter: Optional[str] = None,
     kamaitachi_client_id: Optional[str] = None,
     kamaitachi_client_secret: Optional[str] = None,
+    metrics_token: Optional[str] = None,
 ) -> web.Application:
     app = web.Application()
     app.on_response_prepare.append(on_response_prepare)
@@ -227,5 +253,6 @@ def init_app(
     app["goatcounter"] = goatcounter
     app["kamaitachi_client_id"] = kamaitachi_client_id
     app["kamaitachi_client_secret"] = kamaitachi_client_secret
+    app["metrics_token"] = metrics_token
 
     return app